@@ -0,0 +1,467 @@
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from CandleArchive import CandleArchive
+from CandleRingBuffer import LOCAL_TZ
+from DecisionEngine import Decisionmaker
+from ML_Signal import Signal
+from PositionAfterCare import PositionAfterCare
+
+
+def load_candles(source="Candles/Candles.csv", start=None, end=None):
+    """1m candles from Candles.csv, a Parquet file or a CandleArchive directory.
+
+    The stored open_time is local time; it is converted to naive UTC like the live
+    kline timestamps, so hour/weekday filters see the same values.
+    """
+    source = Path(source)
+    if source.is_dir():
+        df = CandleArchive(source).read(start, end)
+    elif source.suffix == ".parquet":
+        df = pd.read_parquet(source)
+    else:
+        df = pd.read_csv(source)
+    if df.empty:
+        return pd.DataFrame(columns=["timestamp", "open", "high", "low", "close", "volume"])
+    local = pd.to_datetime(df["open_time"])
+    df = df.assign(timestamp=local.dt.tz_localize(LOCAL_TZ).dt.tz_convert("UTC").dt.tz_localize(None))
+    if start is not None:
+        df = df[local >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[local <= pd.Timestamp(end)]
+    df = df.drop_duplicates(subset="timestamp", keep="last").sort_values("timestamp")
+    return df[["timestamp", "open", "high", "low", "close", "volume"]].astype(
+        {"open": float, "high": float, "low": float, "close": float, "volume": float}).reset_index(drop=True)
+
+
+class OnlineSGD:
+    """SGDClassifier.partial_fit on one sample at a time, in plain Python floats.
+
+    Reproduces sklearn's plain SGD step for loss='log_loss', learning_rate='optimal'
+    and an elasticnet/l2/l1 penalty (weight decay via wscale, truncated-gradient L1),
+    without the ~100 µs per-call overhead of sklearn on a 3-feature model.
+    """
+
+    MAX_DLOSS = 1e12
+
+    def __init__(self, sgd: SGDClassifier):
+        if sgd.loss != "log_loss" or sgd.learning_rate != "optimal" or sgd.average or sgd.class_weight:
+            raise ValueError("OnlineSGD only mirrors log_loss / optimal learning rate without averaging or class weights")
+        self.alpha = sgd.alpha
+        self.l1_ratio = {"l2": 0.0, "l1": 1.0}.get(sgd.penalty, sgd.l1_ratio)
+        self.penalty = sgd.penalty
+        self.fit_intercept = sgd.fit_intercept
+        self.coef = [float(w) for w in sgd.coef_[0]]
+        self.intercept = float(sgd.intercept_[0])
+        self.t = float(sgd.t_)
+        typw = math.sqrt(1.0 / math.sqrt(self.alpha))
+        self.optimal_init = 1.0 / (typw * self.alpha)  # initial eta0 is typw for log loss
+
+    def decision(self, x):
+        return sum(w * xi for w, xi in zip(self.coef, x)) + self.intercept
+
+    def predict_proba(self, x):
+        return _expit(self.decision(x))
+
+    def partial_fit(self, x, y: int):
+        alpha, l1_ratio = self.alpha, self.l1_ratio
+        eta = 1.0 / (alpha * (self.optimal_init + self.t - 1))
+        dloss = min(max(_expit(self.decision(x)) - y, -self.MAX_DLOSS), self.MAX_DLOSS)
+        update = -eta * dloss
+
+        w = list(self.coef)
+        wscale = 1.0
+        if self.penalty in ("l2", "elasticnet"):
+            wscale *= max(0.0, 1.0 - (1.0 - l1_ratio) * eta * alpha)
+        if update != 0.0:
+            w = [wj + xj * update / wscale for wj, xj in zip(w, x)]
+        if self.fit_intercept and update != 0.0:
+            self.intercept += update
+        if self.penalty in ("l1", "elasticnet"):
+            u = l1_ratio * eta * alpha
+            for j, z in enumerate(w):
+                if wscale * z > 0.0:
+                    w[j] = max(0.0, z - u / wscale)
+                elif wscale * z < 0.0:
+                    w[j] = min(0.0, z + u / wscale)
+        self.coef = [wj * wscale for wj in w]
+        self.t += 1
+
+
+def _expit(z):
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+class Backtester:
+    """Offline replay of the live pipeline on stored 1m candles.
+
+    Features come from the same Signal.calculate_* functions, the model is trained and
+    updated bar by bar exactly like Signal.get_signal, entries follow
+    Decisionmaker.decide_order sizing, and exits follow PositionAfterCare's ROI-based
+    SL / TP / trailing rules with ROUND_TRIP_FEE_RATE charged per trade.
+    Everything without path dependence is vectorized; the SGD loop runs on plain floats.
+    """
+
+    def __init__(self, signal: Signal = None, aftercare: PositionAfterCare = None,
+                 decision: Decisionmaker = None, initial_equity: float = None):
+        self.signal = signal or Signal(MARKETDATA=None)
+        self.aftercare = aftercare or PositionAfterCare()
+        self.decision = decision or Decisionmaker(MARKETDATA=None, riskMgr=None)
+        self.initial_equity = initial_equity if initial_equity is not None else self.signal.INITIAL_EQUITY
+
+    # ---- features / signals -------------------------------------------------
+    def features(self, candles):
+        s = self.signal
+        df = candles.copy()
+        df["bar"] = np.arange(len(df))  # position in the candle arrays, for entries/exits
+        df["entropy"] = s.calculate_entropy(df["close"])
+        df["vwap"] = s.calculate_vwap(df)
+        df["ofi"] = s.calculate_ofi(df)
+        df["vwap_dev"] = df["close"] - df["vwap"]
+        df["adx"] = s.calculate_adx(df)
+        df["weekday"] = df["timestamp"].dt.day_name()
+        return df.dropna().reset_index(drop=True)
+
+    def signals(self, feats):
+        """+1 BUY / -1 SELL / 0 per feature row, plus the model probability (NaN when not asked)."""
+        s = self.signal
+        blocked = (feats["adx"] <= s.ADX_THRESHOLD).to_numpy()
+        if s.TRADE_HOURS_UTC:
+            blocked |= ~feats["timestamp"].dt.hour.isin(s.TRADE_HOURS_UTC).to_numpy()
+        if s.EXCLUDE_WEEKDAYS:
+            blocked |= feats["weekday"].isin(s.EXCLUDE_WEEKDAYS).to_numpy()
+        return self.signals_from_arrays(feats["close"].to_numpy(dtype=float),
+                                        feats[s.FEATURES].to_numpy(dtype=float), blocked)
+
+    def signals_from_arrays(self, close, raw, blocked):
+        """signals() on plain arrays: closes, raw FEATURES matrix and the ADX/time filter mask."""
+        s = self.signal
+        n = len(close)
+        lookback = s.CIRCUIT_BREAKER_LOOKBACK
+        breaker = np.zeros(n, dtype=bool)
+        if n >= lookback:
+            start_price = close[:n - lookback + 1]
+            breaker[lookback - 1:] = (start_price - close[lookback - 1:]) / start_price >= s.CIRCUIT_BREAKER_DROP
+
+        out = np.zeros(n, dtype=np.int8)
+        probs = np.full(n, np.nan)
+        model, scaled, last_close = None, None, None
+        breaker_active, skipped = False, 0
+        for i in range(n):
+            if breaker_active:
+                if skipped < s.CIRCUIT_BREAKER_SKIP_NO_TRADES:
+                    skipped += 1
+                    continue
+                skipped, breaker_active = 0, False
+            if breaker[i]:
+                breaker_active, skipped = True, skipped + 1
+                continue
+            if blocked[i]:
+                continue
+            if model is None:
+                if i + 1 >= s.ML_MIN_BARS + 1:
+                    model, scaled = self._initial_fit(raw, close, i)
+                continue
+            prob = model.predict_proba(scaled[i])
+            if last_close is not None:
+                model.partial_fit(scaled[i - 1], int(close[i] > last_close))
+            last_close = close[i]
+            probs[i] = prob
+            out[i] = 1 if prob > s.BUY_PROB else (-1 if prob < s.SELL_PROB else 0)
+        return out, probs
+
+    def _initial_fit(self, raw, close, i):
+        # same slices as the first pass of Signal.get_signal
+        s = self.signal
+        closes = close[i - s.ML_MIN_BARS:i + 1]
+        y_init = (closes[1:] > closes[:-1]).astype(int)
+        X_init = pd.DataFrame(raw[i - s.ML_MIN_BARS + 1:i + 1], columns=s.FEATURES)
+        scaler = StandardScaler().fit(X_init)
+        sgd = clone(s.sgd)
+        sgd.partial_fit(scaler.transform(X_init), y_init[:len(X_init)], classes=[0, 1])
+        scaled = ((raw - scaler.mean_) / scaler.scale_).tolist()
+        return OnlineSGD(sgd), scaled
+
+    # ---- position simulation -----------------------------------------------
+    def _exit(self, o, h, l, c, entry_bar, entry, side, chunk=4096):
+        """First PositionAfterCare exit after entering at o[entry_bar]: (bar, price, reason)."""
+        ac = self.aftercare
+        lev100 = ac.LEVERAGE * 100
+        sl_roi = -(ac.STOP_LOSS_PCT * lev100)
+        tp_roi = ac.TAKE_PROFIT_PCT * lev100
+        peak = -np.inf  # best ROI seen before the current bar
+        n = len(o)
+        for begin in range(entry_bar, n, chunk):
+            end = min(begin + chunk, n)
+            if side > 0:
+                fav, adv = h[begin:end], l[begin:end]
+            else:
+                fav, adv = l[begin:end], h[begin:end]
+            roi = lambda p: side * (p / entry - 1) * lev100
+            roi_open, roi_fav, roi_adv, roi_close = roi(o[begin:end]), roi(fav), roi(adv), roi(c[begin:end])
+
+            # within a bar: open -> adverse extreme -> favourable extreme -> close (conservative)
+            peak_before = np.maximum.accumulate(np.concatenate([[peak], roi_fav[:-1]]))
+            trailing = peak_before >= ac.TRAIL_START_ROI
+            trail_level = peak_before - ac.TRAIL_GIVEBACK
+            peak_after = np.maximum(peak_before, roi_fav)
+            trail_close_level = peak_after - ac.TRAIL_GIVEBACK
+
+            # (mask, ROI level, reason, how a bar opening beyond the level fills)
+            hits = [
+                (trailing & (roi_adv < trail_level), trail_level, "TRAIL", np.minimum),
+                (roi_adv <= sl_roi, np.full(end - begin, sl_roi), "SL", np.minimum),
+                (roi_fav >= tp_roi, np.full(end - begin, tp_roi), "TP", np.maximum),
+                ((peak_after >= ac.TRAIL_START_ROI) & (roi_close < trail_close_level), trail_close_level, "TRAIL", None),
+            ]
+            first = [int(np.argmax(mask)) if mask.any() else n for mask, _, _, _ in hits]
+            k = min(first)
+            if k < n:
+                mask, level, reason, gap = hits[first.index(k)]
+                level_roi = gap(level[k], roi_open[k]) if gap is not None else level[k]
+                return begin + k, entry * (1 + side * level_roi / lev100), reason
+            peak = peak_after[-1]
+        return n - 1, c[-1], "END"
+
+    def run(self, candles):
+        started = time.perf_counter()
+        feats = self.features(candles)
+        signals, probs = self.signals(feats)
+        o, h, l, c = (candles[col].to_numpy(dtype=float) for col in ("open", "high", "low", "close"))
+        trades = self.simulate(o, h, l, c, candles["timestamp"].to_numpy(), feats["bar"].to_numpy(), signals, probs)
+        return trades, self.summary(trades, len(candles), time.perf_counter() - started)
+
+    def simulate(self, o, h, l, c, times, bars, signals, probs):
+        """Trades from per-row signals; bars maps each signal row to its candle index."""
+        cfg = self.decision.config
+        fee_rate = self.signal.ROUND_TRIP_FEE_RATE
+
+        equity = self.initial_equity
+        trades = []
+        free_from = 0  # first bar at which decide_order sees a flat position
+        for row in np.flatnonzero(signals):
+            bar = bars[row]
+            if bar < free_from or bar + 1 >= len(o):
+                continue
+            qty = round(cfg['trade_size'] * equity * cfg['LEVERAGE'] / c[bar], cfg['quantityDecimal'])
+            if qty <= 0:
+                continue
+            side = int(signals[row])
+            entry_bar = bar + 1  # market order at the next bar's open
+            entry = o[entry_bar]
+            exit_bar, exit_price, reason = self._exit(o, h, l, c, entry_bar, entry, side)
+            gross = side * (exit_price - entry) * qty
+            fee = fee_rate * qty * entry
+            equity += gross - fee
+            trades.append({
+                "entry_time": times[entry_bar], "exit_time": times[exit_bar],
+                "side": "LONG" if side > 0 else "SHORT", "quantity": qty,
+                "entry_price": entry, "exit_price": exit_price, "reason": reason,
+                "prob": probs[row], "gross_pnl": gross, "fee": fee, "pnl": gross - fee, "equity": equity,
+            })
+            free_from = exit_bar
+        return pd.DataFrame(trades)
+
+    def summary(self, trades, n_bars, elapsed):
+        result = {"bars": n_bars, "seconds": round(elapsed, 3), "trades": len(trades)}
+        if trades.empty:
+            return result
+        curve = np.concatenate([[self.initial_equity], trades["equity"].to_numpy()])
+        drawdown = curve - np.maximum.accumulate(curve)
+        result.update({
+            "win_rate_pct": round(100 * (trades["pnl"] > 0).mean(), 2),
+            "total_pnl": round(trades["pnl"].sum(), 2),
+            "fees": round(trades["fee"].sum(), 2),
+            "return_pct": round(100 * (curve[-1] / self.initial_equity - 1), 2),
+            "max_drawdown": round(drawdown.min(), 2),
+            "max_drawdown_pct": round(100 * (drawdown / np.maximum.accumulate(curve)).min(), 2),
+            "exits": trades["reason"].value_counts().to_dict(),
+        })
+        return result
+
+
+class ExitReplay:
+    """Replays trades tick by tick to compare PositionAfterCare's two exit modes.
+
+    Each 1m bar is walked as a straight-line path open -> adverse extreme -> favourable
+    extreme -> close (the order _exit assumes) in tick_ms steps.
+      exchange  resident STOP / TAKE_PROFIT / TRAILING_STOP orders from exit_levels(),
+                filled at the first tick through the level
+      local     the 5 s monitor: ROI from a price stale_s old, checked every poll_s
+                (phase drawn at random), MARKET order filled order_ms after the check
+    """
+
+    def __init__(self, aftercare: PositionAfterCare = None, tick_ms: int = 100, poll_s: float = 5.0,
+                 stale_s: float = 1.0, order_ms: int = 200, seed: int = 0):
+        self.aftercare = aftercare or PositionAfterCare()
+        self.ticks_per_bar = 60_000 // tick_ms
+        self.poll_ticks = int(poll_s * 1000 // tick_ms)
+        self.stale_ticks = int(stale_s * 1000 // tick_ms)
+        self.order_ticks = int(order_ms // tick_ms)
+        self.rng = np.random.default_rng(seed)
+
+    def path(self, o, h, l, c, side):
+        """Prices at every tick of the given bars, flattened."""
+        fav, adv = (h, l) if side > 0 else (l, h)
+        knots = np.stack([o, adv, fav, c], axis=1)
+        position = np.arange(self.ticks_per_bar) * 3 / self.ticks_per_bar
+        segment = position.astype(int)
+        weight = position - segment
+        return (knots[:, segment] * (1 - weight) + knots[:, segment + 1] * weight).ravel()
+
+    def exchange_exit(self, prices, entry, side):
+        """(tick, fill price, reason) of the first resident order to trigger, or None."""
+        levels = self.aftercare.exit_levels(entry, "LONG" if side > 0 else "SHORT")
+        signed = side * prices  # favourable moves are increases for both sides
+        hits = {
+            "SL": signed <= side * levels["stop"],
+            "TP": signed >= side * levels["take_profit"],
+        }
+        active = signed >= side * levels["trailing"]
+        if active.any():
+            start = int(np.argmax(active))
+            peak = np.maximum.accumulate(signed[start:])
+            retrace = np.zeros(len(prices), dtype=bool)
+            retrace[start:] = signed[start:] <= peak * (1 - side * levels["callback_rate"] / 100)
+            hits["TRAIL"] = retrace
+        first = {reason: int(np.argmax(mask)) for reason, mask in hits.items() if mask.any()}
+        if not first:
+            return None
+        reason = min(first, key=first.get)
+        return first[reason], prices[first[reason]], reason
+
+    def local_exit(self, prices, entry, side, phase):
+        """(tick, fill price, reason) of the polling monitor, or None; mirrors monitor_sl_tp_trailing."""
+        ac = self.aftercare
+        lev100 = ac.LEVERAGE * 100
+        polls = np.arange(phase, len(prices) - self.order_ticks, self.poll_ticks)
+        seen = prices[np.maximum(polls - self.stale_ticks, 0)]
+        roi = side * (seen / entry - 1) * lev100
+        hit = (roi <= -ac.STOP_LOSS_PCT * lev100) | (roi >= ac.TAKE_PROFIT_PCT * lev100)
+        reasons = np.where(roi <= -ac.STOP_LOSS_PCT * lev100, "SL", "TP").astype(object)
+        started = roi >= ac.TRAIL_START_ROI
+        if started.any():
+            first = int(np.argmax(started))
+            peak = np.maximum.accumulate(roi[first:])
+            trail = np.zeros(len(roi), dtype=bool)
+            trail[first + 1:] = (roi[first:] < peak - ac.TRAIL_GIVEBACK)[1:]  # the activating poll only sets the peak
+            reasons[trail] = "TRAIL"
+            hit |= trail
+        if not hit.any():
+            return None
+        k = int(np.argmax(hit))
+        tick = polls[k] + self.order_ticks
+        return tick, prices[tick], reasons[k]
+
+    def replay(self, o, h, l, c, entry_bar, side, horizon=32):
+        """Both exits of one trade entered at o[entry_bar]; the path grows until both have fired."""
+        entry = o[entry_bar]
+        phase = int(self.rng.integers(self.poll_ticks))
+        while True:
+            end = min(entry_bar + horizon, len(o))
+            prices = self.path(o[entry_bar:end], h[entry_bar:end], l[entry_bar:end], c[entry_bar:end], side)
+            exchange, local = self.exchange_exit(prices, entry, side), self.local_exit(prices, entry, side, phase)
+            if (exchange is not None and local is not None) or end == len(o):
+                last = (len(prices) - 1, prices[-1], "END")
+                return entry, exchange or last, local or last
+            horizon *= 2
+
+    def compare(self, candles, trades):
+        """Per-trade exits of both modes for the Backtester trade log, plus a summary per mode."""
+        o, h, l, c = (candles[col].to_numpy(dtype=float) for col in ("open", "high", "low", "close"))
+        entry_bars = pd.Index(candles["timestamp"]).get_indexer(trades["entry_time"])
+        lev100 = self.aftercare.LEVERAGE * 100
+        rows = []
+        for bar, side_name in zip(entry_bars, trades["side"]):
+            side = 1 if side_name == "LONG" else -1
+            entry, exchange, local = self.replay(o, h, l, c, bar, side)
+            row = {"entry_bar": bar, "side": side_name}
+            for mode, (tick, price, reason) in (("exchange", exchange), ("local", local)):
+                row.update({f"{mode}_reason": reason, f"{mode}_roi": side * (price / entry - 1) * lev100,
+                            f"{mode}_seconds": tick * 60 / self.ticks_per_bar})
+            rows.append(row)
+        result = pd.DataFrame(rows)
+        summary = {}
+        for mode in ("exchange", "local"):
+            summary[mode] = {
+                "mean_roi_pct": round(result[f"{mode}_roi"].mean(), 3),
+                "worst_roi_pct": round(result[f"{mode}_roi"].min(), 3),
+                "mean_hold_s": round(result[f"{mode}_seconds"].mean(), 1),
+                "exits": result[f"{mode}_reason"].value_counts().to_dict(),
+            }
+        sl_roi = -self.aftercare.STOP_LOSS_PCT * lev100
+        for mode in ("exchange", "local"):
+            stops = result[result[f"{mode}_reason"] == "SL"]
+            summary[mode]["sl_overshoot_roi"] = round((sl_roi - stops[f"{mode}_roi"]).median(), 3) if len(stops) else None
+        return result, summary
+
+
+def check_online_sgd(steps=2000, seed=0):
+    """Max coefficient / probability difference between OnlineSGD and sklearn's partial_fit."""
+    rng = np.random.default_rng(seed)
+    signal = Signal(MARKETDATA=None)
+    X = rng.normal(size=(steps + 90, len(signal.FEATURES)))
+    y = (X @ np.array([0.8, -0.5, 0.3]) + rng.normal(size=len(X)) > 0).astype(int)
+    reference = clone(signal.sgd)
+    reference.partial_fit(X[:90], y[:90], classes=[0, 1])
+    online = OnlineSGD(reference)
+    worst = 0.0
+    for i in range(90, len(X)):
+        p_ref = reference.predict_proba(X[i:i + 1])[0, 1]
+        worst = max(worst, abs(p_ref - online.predict_proba(X[i])))
+        reference.partial_fit(X[i:i + 1], [y[i]])
+        online.partial_fit(X[i], y[i])
+        worst = max(worst, float(np.max(np.abs(reference.coef_[0] - online.coef))))
+    return worst
+
+
+def _synthetic_candles(minutes=525_600, seed=1):
+    rng = np.random.default_rng(seed)
+    close = 60_000 * np.exp(np.cumsum(rng.normal(0, 0.0007, minutes)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = rng.uniform(0, 0.0006, (2, minutes))
+    return pd.DataFrame({
+        "timestamp": pd.date_range("2024-01-01", periods=minutes, freq="min"),
+        "open": open_, "high": np.maximum(open_, close) * (1 + spread[0]),
+        "low": np.minimum(open_, close) * (1 - spread[1]), "close": close,
+        "volume": rng.gamma(2.0, 20.0, minutes),
+    })
+
+
+if __name__ == "__main__":
+    # python Backtester.py [Candles/Candles.csv | Candles/archive | file.parquet | synthetic] [start] [end] [--exits]
+    compare_exits = "--exits" in sys.argv
+    if compare_exits:
+        sys.argv.remove("--exits")
+    print(f"OnlineSGD vs sklearn partial_fit, max abs diff: {check_online_sgd():.2e}")
+    source = sys.argv[1] if len(sys.argv) > 1 else "Candles/Candles.csv"
+    if source == "synthetic":
+        data = _synthetic_candles()
+    else:
+        data = load_candles(source, *(sys.argv[2:4]))
+    print(f"Replaying {len(data)} bars from {source}")
+    trade_log, stats = Backtester().run(data)
+    for key, value in stats.items():
+        print(f"  {key:18s} {value}")
+    if not trade_log.empty:
+        print(trade_log.tail(10).to_string(index=False))
+    if compare_exits and not trade_log.empty:
+        started = time.perf_counter()
+        exits, by_mode = ExitReplay().compare(data, trade_log)
+        print(f"Exit replay, exchange-resident orders vs 5 s local monitor "
+              f"({len(exits)} trades, {time.perf_counter() - started:.1f}s)")
+        for mode, stats in by_mode.items():
+            print(f"  {mode}")
+            for key, value in stats.items():
+                print(f"    {key:18s} {value}")
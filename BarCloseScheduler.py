@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+from LatencyTracer import tracer
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BarCloseScheduler:
+    """Runs the trading pipeline as soon as the exchange closes a bar (kline k.x == True).
+
+    The collector calls _on_bar_close synchronously from the kline handler, after the
+    closed bar is in kline_store, so the pipeline always sees that bar. The pipeline is
+    an async callable taking the bar and the perf_counter_ns of the kline event.
+    If the pipeline runs long, bars that closed meanwhile are skipped, not replayed.
+
+    Latencies go to the shared tracer, all measured on this host:
+      bar_close.exchange_to_receive   bar close_time on the exchange clock -> kline event handled
+      bar_close.to_decision           kline event handled -> pipeline returned
+      bar_close.to_order              kline event handled -> order handed to the gateway
+                                      (recorded by the execution module from the event time)
+    """
+
+    def __init__(self, collector, pipeline, stale_after: float = 90.0, report_every: int = 15):
+        self.collector = collector
+        self.pipeline = pipeline
+        self.stale_after = stale_after  # seconds without a bar close before warning
+        self.report_every = report_every  # bars between latency printouts
+        self.bars = 0
+        self.skipped = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self.collector.add_bar_close_listener(self._on_bar_close)
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    def _on_bar_close(self, bar, received_ns: int):
+        # close_time is the last ms of the bar, so the bar closed at close_time + 1
+        # clock skew can make this negative; the histogram counts it as 0
+        tracer.record("bar_close.exchange_to_receive", (time.time() * 1000 - (bar[6] + 1)) * 1e6)
+        self._queue.put_nowait((bar, received_ns))
+
+    async def _next_bar(self):
+        try:
+            item = await asyncio.wait_for(self._queue.get(), self.stale_after)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ No bar close from the kline stream for {self.stale_after:.0f}s, not trading")
+            return None
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            self.skipped += 1
+        return item
+
+    async def _run(self):
+        while True:
+            item = await self._next_bar()
+            if item is None:
+                continue
+            bar, received_ns = item
+            try:
+                await self.pipeline(bar, received_ns)
+            except Exception as e:
+                logger.exception(f"[Main Loop Error] {e}")
+                continue
+            tracer.since("bar_close.to_decision", received_ns)
+            self.bars += 1
+            if self.report_every and self.bars % self.report_every == 0:
+                self.report()
+
+    def report(self):
+        skipped = f", {self.skipped} skipped" if self.skipped else ""
+        logger.info(f"⏱️ Bar-close latency over {self.bars} bars{skipped}")
+        for stage, row in tracer.summary().items():
+            if stage.startswith("bar_close."):
+                logger.info(f"   {stage:30s} p50 {row['p50_us'] / 1e3:.1f} p90 {row['p90_us'] / 1e3:.1f} "
+                            f"p99 {row['p99_us'] / 1e3:.1f} max {row['max_us'] / 1e3:.1f} ms (n={row['count']})")
+
+    def close_to_order_ms(self):
+        """Median bar close -> order latency so far, or None before the first order."""
+        histogram = tracer.histograms.get("bar_close.to_order")
+        if histogram is None or not histogram.total:
+            return None
+        return histogram.percentiles((50,))[50] / 1e6
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.collector.remove_bar_close_listener(self._on_bar_close)
@@ -0,0 +1,139 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; falls back to one CSV per day
+    pa = None
+    pq = None
+
+COLUMNS = ["open_time", "open", "high", "low", "close", "volume", "close_time",
+           "Signal", "SignalTrade", "AfterCare", "RiskTrigger"]
+ANNOTATIONS = ["Signal", "SignalTrade", "AfterCare", "RiskTrigger"]
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("open_time", pa.timestamp("ns")),
+        ("open", pa.float64()), ("high", pa.float64()), ("low", pa.float64()),
+        ("close", pa.float64()), ("volume", pa.float64()),
+        ("close_time", pa.timestamp("ns")),
+    ] + [(col, pa.string()) for col in ANNOTATIONS])
+
+
+class CandleArchive:
+    """Candle history partitioned by day: <root>/<YYYY-MM-DD>.parquet (or .csv without pyarrow).
+
+    A write only rewrites the days it touches, and reads only open the days inside the
+    requested time range (with row filters pushed into the Parquet reader).
+    """
+
+    def __init__(self, root="Candles/archive", fmt: str = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        if fmt is None:
+            fmt = "parquet" if pq is not None else "csv"
+        if fmt == "parquet" and pq is None:
+            raise ImportError("pyarrow is required for the parquet archive")
+        self.fmt = fmt
+
+    def _path(self, day):
+        return self.root / f"{day.isoformat()}.{self.fmt}"
+
+    def days(self):
+        """Archived days, oldest first."""
+        found = []
+        for path in self.root.glob(f"*.{self.fmt}"):
+            try:
+                found.append(pd.Timestamp(path.stem).date())
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def _read_day(self, day, start=None, end=None):
+        path = self._path(day)
+        if not path.exists():
+            return pd.DataFrame(columns=COLUMNS)
+        if self.fmt == "parquet":
+            filters = []
+            if start is not None:
+                filters.append(("open_time", ">=", pd.Timestamp(start)))
+            if end is not None:
+                filters.append(("open_time", "<=", pd.Timestamp(end)))
+            return pq.read_table(path, filters=filters or None).to_pandas()
+        df = pd.read_csv(path, parse_dates=["open_time", "close_time"])
+        if start is not None:
+            df = df[df["open_time"] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df["open_time"] <= pd.Timestamp(end)]
+        return df
+
+    def _write_day(self, day, df):
+        path = self._path(day)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        if self.fmt == "parquet":
+            pq.write_table(pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False), tmp_path)
+        else:
+            df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _normalise(df):
+        df = df.reindex(columns=COLUMNS).copy()
+        df["open_time"] = pd.to_datetime(df["open_time"])
+        df["close_time"] = pd.to_datetime(df["close_time"], errors="coerce")
+        for col in ["open", "high", "low", "close", "volume"]:
+            df[col] = df[col].astype(float)
+        for col in ANNOTATIONS:
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+        return df.dropna(subset=["open_time"])
+
+    def write(self, candles):
+        """Merge candles into their day partitions; the latest non-null value per open_time wins."""
+        if candles is None or len(candles) == 0:
+            return
+        candles = self._normalise(candles)
+        for day, incoming in candles.groupby(candles["open_time"].dt.date):
+            existing = self._read_day(day)
+            combined = pd.concat([existing, incoming], ignore_index=True) if not existing.empty else incoming
+            combined = combined.sort_values("open_time", kind="stable")
+            # groupby.last keeps the newest non-null per column, so older annotations survive
+            merged = combined.groupby("open_time", as_index=False).last()
+            self._write_day(day, self._normalise(merged))
+
+    def read(self, start=None, end=None):
+        """Candles with start <= open_time <= end (either bound optional)."""
+        first = pd.Timestamp(start).date() if start is not None else None
+        last = pd.Timestamp(end).date() if end is not None else None
+        frames = [self._read_day(day, start, end) for day in self.days()
+                  if (first is None or day >= first) and (last is None or day <= last)]
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.concat(frames, ignore_index=True).sort_values("open_time").reset_index(drop=True)
+
+    def tail(self, n: int):
+        """The latest n candles, reading back only as many days as needed."""
+        frames, count = [], 0
+        for day in reversed(self.days()):
+            df = self._read_day(day)
+            frames.append(df)
+            count += len(df)
+            if count >= n:
+                break
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.concat(frames[::-1], ignore_index=True).sort_values("open_time").tail(n).reset_index(drop=True)
+
+    def import_csv(self, csv_path):
+        """One-off migration of the old single Candles.csv into day partitions."""
+        df = pd.read_csv(csv_path)
+        if df.empty:
+            return 0
+        df["open_time"] = pd.to_datetime(df["open_time"])
+        df["close_time"] = pd.to_datetime(df["close_time"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+        self.write(df)
+        return len(df)
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Local zone used by the old datetime.fromtimestamp() candles
+LOCAL_TZ = datetime.now().astimezone().tzinfo
+
+
+def epoch_ms_to_local(values):
+    """Epoch-ms integers -> naive local datetimes, matching datetime.fromtimestamp(ms / 1000)."""
+    times = pd.DatetimeIndex(pd.to_datetime(np.asarray(values, dtype=np.int64), unit='ms', utc=True))
+    return times.tz_convert(LOCAL_TZ).tz_localize(None)
+
+
+class CandleRingBuffer:
+    """Fixed-capacity OHLCV ring buffer for the live (developing) candlesticks.
+
+    Every bar is written twice, at slot i and i + capacity, so the buffered bars
+    are always one contiguous slice and view() can hand out zero-copy arrays.
+    """
+
+    FIELDS = ("open_time", "open", "high", "low", "close", "volume", "close_time")
+    TIME_FIELDS = ("open_time", "close_time")
+
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        self._data = {
+            field: np.zeros(2 * capacity, dtype=np.int64 if field in self.TIME_FIELDS else np.float64)
+            for field in self.FIELDS
+        }
+        self._start = 0  # slot of the oldest bar
+        self._size = 0
+        self.version = 0  # bumped on every change, lets readers skip unchanged snapshots
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+        self.version += 1
+
+    @property
+    def last_open_time(self):
+        if not self._size:
+            return None
+        return int(self._data["open_time"][self._start + self._size - 1])
+
+    def _write(self, slot, values):
+        for field, value in zip(self.FIELDS, values):
+            column = self._data[field]
+            column[slot] = value
+            column[slot + self.capacity] = value
+
+    def update(self, open_time: int, open_: float, high: float, low: float, close: float,
+               volume: float, close_time: int):
+        """Replace the developing bar or append a newer one in O(1). Older bars are ignored."""
+        values = (open_time, open_, high, low, close, volume, close_time)
+        last = self.last_open_time
+
+        if last is not None and open_time == last:
+            slot = (self._start + self._size - 1) % self.capacity
+        elif last is None or open_time > last:
+            if self._size < self.capacity:
+                slot = (self._start + self._size) % self.capacity
+                self._size += 1
+            else:
+                slot = self._start
+                self._start = (self._start + 1) % self.capacity
+        else:
+            return False
+
+        self._write(slot, values)
+        self.version += 1
+        return True
+
+    def view(self):
+        """Read-only, zero-copy arrays of the buffered bars, oldest first.
+
+        The developing bar is updated in place, so take what you need before the next await.
+        """
+        views = {}
+        for field, column in self._data.items():
+            v = column[self._start:self._start + self._size]
+            v.flags.writeable = False
+            views[field] = v
+        return views
+
+    def last(self):
+        if not self._size:
+            return None
+        slot = self._start + self._size - 1
+        return {field: column[slot].item() for field, column in self._data.items()}
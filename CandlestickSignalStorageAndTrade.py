@@ -1,12 +1,22 @@
 import os
 import csv
 import datetime
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from CandleRingBuffer import epoch_ms_to_local
+from CandleArchive import CandleArchive
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
 class CandlestickDataStorage:
+    OHLCV = ["open", "high", "low", "close", "volume"]
+
     def __init__(self, history_dir="Candles", max_minutes=120):
         self.max_minutes = max_minutes
+        self._last_open_ms = None  # epoch-ms open time of the last buffered bar, for the in-place path
         self.history_path = Path(history_dir)
         self.history_path.mkdir(parents=True, exist_ok=True)
 
@@ -23,25 +33,97 @@ class CandlestickDataStorage:
             "RiskTrigger": "object"
         })
 
+        # Day-partitioned history; the old single Candles.csv is migrated into it once
+        self.archive = CandleArchive(self.history_path / "archive")
         self.filename = self.history_path / "Candles.csv"
-        if self.filename.exists():
-            self.read_from_csv()
-        else:
-            pd.DataFrame(columns=self.headers()).to_csv(self.filename, index=False)
+        if not self.archive.days() and self.filename.exists():
+            migrated = self.archive.import_csv(self.filename)
+            logger.info(f"📦 Migrated {migrated} candles from {self.filename} into {self.archive.root}")
+        self.read_from_archive()
 
     def headers(self):
         return ["open_time", "open", "high", "low", "close", "volume", "close_time",
                 "Signal", "SignalTrade", "AfterCare", "RiskTrigger"]
 
     def append_candlesticks(self, candlestick_list):
-        if not candlestick_list:
+        # Accepts a list of candle dicts or the column arrays of CandleRingBuffer.view()
+        if candlestick_list is None or len(candlestick_list) == 0:
             return
 
+        # Usually only the developing bar moved: patch it in place instead of re-merging the window
+        if isinstance(candlestick_list, dict) and self._update_in_place(candlestick_list):
+            return
+        self._merge_frame(candlestick_list)
+        self._last_open_ms = self._buffer_tail_ms(candlestick_list)
+
+    def _buffer_tail_ms(self, view):
+        """Raw open time of the last buffered bar if it came from this view, else None (stay on the full merge)."""
+        if not isinstance(view, dict) or len(view["open_time"]) == 0 or self.candlestickBuffer.empty:
+            return None
+        last_ms = int(view["open_time"][-1])
+        if self.candlestickBuffer["open_time"].iloc[-1] != epoch_ms_to_local([last_ms])[0]:
+            return None
+        return last_ms
+
+    def _update_in_place(self, view):
+        """Fast path for ring-buffer views; returns False when the full merge is needed."""
+        if self._last_open_ms is None or self.candlestickBuffer is None or self.candlestickBuffer.empty:
+            return False
+        open_times = view["open_time"]
+        if len(open_times) == 0:
+            return True
+        start = int(np.searchsorted(open_times, self._last_open_ms))
+        if start == len(open_times):
+            return True  # nothing at or after the last buffered bar
+
+        if int(open_times[start]) == self._last_open_ms:
+            # the last buffered bar: refresh OHLCV only, annotations stay as they are
+            # (scalar iat writes; a multi-column .loc assignment costs ~2 ms on this mixed-dtype frame)
+            buffer = self.candlestickBuffer
+            for col, value in zip(self.OHLCV, self._rounded_ohlcv(view, start)):
+                pos = buffer.columns.get_loc(col)
+                if buffer.iat[-1, pos] != value:
+                    buffer.iat[-1, pos] = value
+            start += 1
+
+        if start == len(open_times):
+            return True
+        if int(open_times[start]) - self._last_open_ms >= self.max_minutes * 60_000:
+            return False  # gap too large: let the full merge replace the buffer
+
+        # new bars (at most one or two per minute)
+        new_rows = pd.DataFrame({
+            "open_time": epoch_ms_to_local(open_times[start:]),
+            **{col: np.round(view[col][start:].astype(float), 3 if col == "volume" else 1) for col in self.OHLCV},
+            "close_time": epoch_ms_to_local(view["close_time"][start:]),
+        })
+        new_rows[["Signal", "SignalTrade", "AfterCare", "RiskTrigger"]] = None
+        self.candlestickBuffer = pd.concat([self.candlestickBuffer, new_rows], ignore_index=True)
+        self._last_open_ms = int(open_times[-1])
+
+        # Save if exceeded buffer
+        if len(self.candlestickBuffer) > self.max_minutes:
+            self.write_to_archive()
+            self.candlestickBuffer = self.candlestickBuffer.iloc[-60:].copy()
+        return True
+
+    def _rounded_ohlcv(self, view, i):
+        return (round(float(view["open"][i]), 1), round(float(view["high"][i]), 1),
+                round(float(view["low"][i]), 1), round(float(view["close"][i]), 1),
+                round(float(view["volume"][i]), 3))
+
+    def _merge_frame(self, candlestick_list):
+        """Full merge: frame from all incoming bars, combined with the buffer."""
         df = pd.DataFrame(candlestick_list)[
             ["open_time", "open", "high", "low", "close", "volume", "close_time"]].copy()
+        if df.empty:
+            return
         df = df.dropna(subset=["open_time", "close_time"])
-        df["open_time"] = pd.to_datetime(df["open_time"])
-        df["close_time"] = pd.to_datetime(df["close_time"])
+        for col in ["open_time", "close_time"]:
+            if pd.api.types.is_integer_dtype(df[col]):
+                df[col] = epoch_ms_to_local(df[col])
+            else:
+                df[col] = pd.to_datetime(df[col])
         df[["open", "high", "low", "close"]] = df[["open", "high", "low", "close"]].astype(float).round(1)
         df["volume"] = df["volume"].astype(float).round(3)
         df[["Signal", "SignalTrade", "AfterCare", "RiskTrigger"]] = None
@@ -62,7 +144,7 @@ class CandlestickDataStorage:
 
         if gap_minutes >= self.max_minutes:
             # Gap is too large, use incoming as replacement
-            self.write_to_csv()
+            self.write_to_archive()
             self.candlestickBuffer = df.tail(self.max_minutes).copy()
         elif gap_minutes > 0:
             # Gap is small (partial gap), just append missing candles
@@ -81,75 +163,109 @@ class CandlestickDataStorage:
 
         # Save if exceeded buffer
         if len(self.candlestickBuffer) > self.max_minutes:
-            self.write_to_csv()
+            self.write_to_archive()
             self.candlestickBuffer = self.candlestickBuffer.iloc[-60:].copy()
 
-    def update_signal(self, signal=None, trade=None, aftercare=None, risk=None):
-        if self.candlestickBuffer is None or len(self.candlestickBuffer) < 2:
+    def update_signal(self, signal=None, trade=None, aftercare=None, risk=None, open_time=None):
+        # open_time (epoch ms) tags that bar; without it the signal goes on the last closed bar
+        # and the rest on the developing one, as laid out by the 1 s append loop
+        if self.candlestickBuffer is None or self.candlestickBuffer.empty:
             return
 
+        index = self.candlestickBuffer.index
+        if open_time is not None:
+            rows = index[self.candlestickBuffer["open_time"] == epoch_ms_to_local([open_time])[0]]
+            if len(rows) == 0:
+                return
+            signal_row = current_row = rows[-1]
+        elif len(index) < 2:
+            return
+        else:
+            signal_row, current_row = index[-2], index[-1]
+
         if signal in ["BUY", "SELL"]:
             tag = "B" if signal == "BUY" else "S"
-            self.candlestickBuffer.at[self.candlestickBuffer.index[-2], "Signal"] = tag
+            self.candlestickBuffer.at[signal_row, "Signal"] = tag
 
         if trade is not None:
-            self.candlestickBuffer.at[self.candlestickBuffer.index[-1], "SignalTrade"] = trade
+            self.candlestickBuffer.at[current_row, "SignalTrade"] = trade
 
         if aftercare is not None:
-            self.candlestickBuffer.at[self.candlestickBuffer.index[-1], "AfterCare"] = aftercare
+            self.candlestickBuffer.at[current_row, "AfterCare"] = aftercare
 
         if risk is not None:
-            self.candlestickBuffer.at[self.candlestickBuffer.index[-1], "RiskTrigger"] = risk
+            self.candlestickBuffer.at[current_row, "RiskTrigger"] = risk
 
-    def write_to_csv(self):
-        if self.candlestickBuffer is None:
+    def write_to_archive(self):
+        """Merge the buffer into the archive; only the days it covers are rewritten."""
+        if self.candlestickBuffer is None or self.candlestickBuffer.empty:
             return
+        self.archive.write(self.candlestickBuffer)
 
-        # Load existing file
-        if self.filename.exists():
-            existing_df = pd.read_csv(self.filename)
-            existing_df["open_time"] = pd.to_datetime(existing_df["open_time"])
-        else:
-            existing_df = pd.DataFrame(columns=self.headers())
-
-        new_df = self.candlestickBuffer.copy()
-        new_df["open_time"] = pd.to_datetime(new_df["open_time"])
-
-        # Combine both and group by open_time, taking non-null values with priority
-        combined = pd.concat([existing_df, new_df], ignore_index=True)
-        combined.sort_values("open_time", inplace=True)
-
-        deduped = combined.groupby("open_time", as_index=False).agg({
-            "open": "last",
-            "high": "last",
-            "low": "last",
-            "close": "last",
-            "volume": "last",
-            "close_time": "last",
-            "Signal": "last",           # <- change to custom priority if needed
-            "SignalTrade": "last",
-            "AfterCare": "last",
-            "RiskTrigger": "last"
-        })
-
-        deduped.to_csv(self.filename, index=False)
-
-    def read_from_csv(self):
-        if not self.filename.exists():
-            self.candlestickBuffer = pd.DataFrame(columns=self.headers())
+    def read_from_archive(self):
+        df = self.archive.tail(60)
+        if df.empty:
             return
 
-        df = pd.read_csv(self.filename)
-
-        # Convert to datetime directly instead of int
-        df["open_time"] = pd.to_datetime(df["open_time"])
-        df["close_time"] = pd.to_datetime(df["close_time"], format="%Y-%m-%d %H:%M:%S", errors='coerce')
-
         df[["open", "high", "low", "close"]] = df[["open", "high", "low", "close"]].astype(float).round(1)
         df["volume"] = df["volume"].astype(float).round(3)
 
-        self.candlestickBuffer = df.tail(60).copy()
+        self.candlestickBuffer = df.copy()
+
+    def read_range(self, start=None, end=None):
+        """Archived candles (with annotations) whose open_time falls in [start, end]."""
+        return self.archive.read(start, end)
 
     def get_latest_candles(self):
         return self.candlestickBuffer.copy() if self.candlestickBuffer is not None else pd.DataFrame(columns=self.headers())
 
+
+
+def _benchmark(calls=600, bars=200):
+    """Per-call cost of append_candlesticks for a ring-buffer view: full merge vs in-place path."""
+    import tempfile
+    import time
+    from CandleRingBuffer import CandleRingBuffer
+
+    start_ms = 1_750_000_000_000
+    ring = CandleRingBuffer(bars)
+    for i in range(bars):
+        ring.update(start_ms + i * 60_000, 100.0, 101.0, 99.0, 100.5, 1.0, start_ms + i * 60_000 + 59_999)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("full merge", "in place"):
+            storage = CandlestickDataStorage(history_dir=tmp + "/" + name.replace(" ", "_"))
+            storage.append_candlesticks(ring.view())
+            storage.update_signal(signal="BUY", trade="T")
+            open_time = start_ms + (bars - 1) * 60_000
+            elapsed = 0.0
+            for i in range(calls):
+                if i % 60 == 59:  # a new bar every "minute" of calls
+                    open_time += 60_000
+                ring.update(open_time, 100.0, 101.0 + i * 0.01, 99.0, 100.5 + i * 0.01, 1.0 + i, open_time + 59_999)
+                view = ring.view()
+                t0 = time.perf_counter()
+                if name == "full merge":
+                    storage._merge_frame(view)
+                else:
+                    storage.append_candlesticks(view)
+                elapsed += time.perf_counter() - t0
+            results[name] = (elapsed / calls * 1e6, storage.get_latest_candles())
+            ring = CandleRingBuffer(bars)
+            for i in range(bars):
+                ring.update(start_ms + i * 60_000, 100.0, 101.0, 99.0, 100.5, 1.0, start_ms + i * 60_000 + 59_999)
+    return results
+
+
+if __name__ == "__main__":
+    results = _benchmark()
+    for name, (us, _) in results.items():
+        print(f"  {name:10s} {us:10.1f} µs/call")
+    full, fast = results["full merge"][1], results["in place"][1]
+    # both paths must leave the same bars and annotations behind
+    cols = ["open_time", "open", "high", "low", "close", "volume", "Signal", "SignalTrade"]
+    common = fast["open_time"].isin(full["open_time"])
+    a = full.set_index("open_time").loc[fast.loc[common, "open_time"], cols[1:]].reset_index(drop=True)
+    b = fast.loc[common, cols[1:]].reset_index(drop=True)
+    print("  parity:", "ok" if a.astype(str).equals(b.astype(str)) else "MISMATCH")
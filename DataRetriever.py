@@ -13,13 +13,45 @@ from urllib.parse import urlencode
 
 import aiohttp
 import asyncio
-import json
 import websockets
 from binance import AsyncClient
 
 import pandas as pd
 from datetime import datetime, timezone
 
+from KlineStore import ClosedKlineStore
+from CandleRingBuffer import CandleRingBuffer
+from OrderBook import LocalOrderBook
+from MessageDecoder import get_decoder
+from RequestScheduler import PRIORITY_POLL
+from LatencyTracer import tracer, perf_counter_ns
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
+
+async def _gather_with_timeout(calls: dict, timeout: float):
+    """Await independent REST calls concurrently; each result is the response or the exception raised."""
+    names = list(calls)
+    results = await asyncio.gather(
+        *(asyncio.wait_for(calls[name], timeout) for name in names),
+        return_exceptions=True
+    )
+    return dict(zip(names, results))
+
+
+def _scheduled(scheduler, endpoint, call, weight=1):
+    """Route a background REST call through the shared RequestScheduler when one is attached."""
+    if scheduler is None:
+        return call()
+    return scheduler.run(endpoint, call, weight=weight, priority=PRIORITY_POLL)
+
+
+def _append_record(path, msg):
+    # raw ws messages, one per line, replayable by the MessageDecoder benchmark
+    with open(path, "a", encoding="utf-8") as f:
+        f.write((msg.decode() if isinstance(msg, bytes) else msg) + "\n")
+
 
 class BinanceTestnetDataCollector:
     def __init__(self, symbol: str, api_key: str, api_secret: str):
@@ -28,11 +60,14 @@ class BinanceTestnetDataCollector:
         self.api_secret = api_secret
 
         self.client: AsyncClient = None
-        self.ws_url = f"wss://stream.binancefuture.com/ws/{self.symbol.lower()}@depth5@100ms"
+        self.decoder = get_decoder()  # msgspec -> orjson -> json
+        self.record_path = None  # set to a file path to record raw ws messages for MessageDecoder benchmarks
+        self.ws_url = f"wss://stream.binancefuture.com/ws/{self.symbol.lower()}@depth@100ms"
         self.kline_url = f"wss://stream.binancefuture.com/ws/{self.symbol.lower()}@kline_1m"
 
         # Data containers
-        self.depth_data = None
+        self.order_book = LocalOrderBook(self.symbol)
+        self._book_sync_task = None
         self.cash_balance = 0.0
         self.totalMarginBalance = 0.0
         self.availableBalance = 0.0
@@ -42,11 +77,28 @@ class BinanceTestnetDataCollector:
         self.side = None
         self.open_orders = []
         self.current_price = 0.0
-        self.candlesticks = []
         self.candle_limit = 200  # Adjustable buffer length
+        self.candlesticks = CandleRingBuffer(self.candle_limit)
         self.initial_margin = 0.0
         self.maint_margin = 0.0
-        self.developedCandlesticks = None
+        self.kline_store = ClosedKlineStore(limit=self.candle_limit - 1)
+        self._backfill_task = None
+
+        # Set by UserDataStream while connected; REST then only reconciles
+        self.user_stream_active = False
+        self.reconcile_interval = 10  # seconds between account/position/order REST refreshes when streaming
+        self._last_reconcile = 0.0
+
+        # Bumped once per applied refresh, so readers can tell whether two reads came from one snapshot
+        self.snapshot_generation = 0
+        self.rest_timeout = 2.0  # seconds, per REST call in the refresh fan-out
+        self.scheduler = None  # optional RequestScheduler shared with the order gateway
+        self.bus = None  # optional MarketDataBus; candles, top of book and account go to shared memory
+        self._bar_close_listeners = []  # callables(bar, received_ns) run when the exchange closes a bar
+        self._book_listeners = []  # callables(order_book) run on every in-sync depth update
+        self._order_listeners = []  # callables(order) run on every order update from the user data stream
+        self._algo_order_listeners = []  # callables(algo_order) run on every conditional order update
+        self._position_listeners = []  # callables() run after the position was refreshed (stream or REST)
 
         # Update flags
         # self.updated = {
@@ -66,55 +118,146 @@ class BinanceTestnetDataCollector:
         # Override base URL for REST endpoints
         self.client.FUTURES_URL = "https://testnet.binancefuture.com"
 
-        await self._init_candlestick_buffer()
-        self._standardize_candlestick_times()
+        await self._prepare_candles()
 
         asyncio.create_task(self._depth_websocket())
         asyncio.create_task(self._poll_rest_forever())
         asyncio.create_task(self._kline_websocket())
 
-        while self.depth_data is None or not self.depth_data.get("bids") or not self.depth_data.get("asks"):
-            print("⏳ Waiting for depth data (bids/asks)...")
+        await self._wait_until_ready()
+
+    async def _prepare_candles(self):
+        await self._init_candlestick_buffer()
+        await self._backfill_closed_klines()
+
+    async def _wait_until_ready(self):
+        while self.order_book.best_bid() is None or self.order_book.best_ask() is None:
+            logger.info(f"⏳ [{self.symbol}] Waiting for depth data (bids/asks)...")
             await asyncio.sleep(0.1)
 
-        while self.developedCandlesticks is None:
-            print("⏳ Waiting for Candlesticks...")
+        while not self.kline_store.ready:
+            logger.info(f"⏳ [{self.symbol}] Waiting for Candlesticks...")
             await asyncio.sleep(0.1)
 
-        print("✅ Depth data ready. Collector fully initialized.")
+        logger.info(f"✅ [{self.symbol}] Depth data ready. Collector fully initialized.")
 
 
 
     async def _depth_websocket(self):
         async with websockets.connect(self.ws_url) as ws:
             async for msg in ws:
-                data = json.loads(msg)
-                self.depth_data = {
-                    "bids": data.get("b", []),
-                    "asks": data.get("a", []),
-                    "timestamp": data.get("E")
-                }
-                # self.updated["depth"] = True
-                # await self._try_push()
+                received_ns = perf_counter_ns()
+                self._record(msg)
+                self._on_depth_update(self.decoder.decode_depth(msg))
+                tracer.since("ws.depth", received_ns)
+
+    def _on_depth_update(self, update):
+        # Events are buffered by the book until the snapshot is loaded
+        in_sync = self.order_book.apply_diff(update.first_update_id, update.final_update_id,
+                                             update.prev_final_update_id, update.bids, update.asks,
+                                             update.event_time)
+        if not in_sync or not self.order_book.synced:
+            self._schedule_book_sync()
+            return
+        if self.bus is not None:
+            self.bus.publish_book(self.order_book)
+        for callback in self._book_listeners:
+            try:
+                callback(self.order_book)
+            except Exception as e:
+                logger.error(f"❌ [{self.symbol}] Book listener failed: {e}")
+
+    async def _sync_order_book(self):
+        try:
+            snapshot = await self.client.futures_order_book(symbol=self.symbol, limit=1000)
+            if self.order_book.load_snapshot(snapshot):
+                logger.info(f"📗 Order book synced at update id {self.order_book.last_update_id}")
+            else:
+                logger.warning("⚠️ Order book snapshot too old for buffered events, resyncing")
+                await asyncio.sleep(1)
+        except Exception as e:
+            logger.error(f"❌ Failed to sync order book snapshot: {e}")
+            await asyncio.sleep(1)
+
+    def _schedule_book_sync(self):
+        if self._book_sync_task is None or self._book_sync_task.done():
+            self._book_sync_task = asyncio.create_task(self._sync_order_book())
+
+    @property
+    def depth_data(self):
+        """Top five levels of the local book as (price, qty) floats, for existing callers."""
+        if not self.order_book.synced:
+            return None
+        return self.order_book.depth_snapshot(5)
 
     async def _poll_rest_forever(self):
-        while self.depth_data is None:
+        while not self.order_book.synced:
            await asyncio.sleep(0.1)
 
         while True:
-            await self._get_account_balance()
-            await self._get_position()
-            await self._get_open_orders()
-            await self._get_current_price()
-            await self._get_developedCandlesticks()
-            '''await self._get_candlesticks()'''
-
+            await self._refresh_snapshot()
             '''self._push_data()'''
             await asyncio.sleep(1)
 
-    async def _get_account_balance(self):
-        account_info = await self.client.futures_account()
-
+    async def _refresh_snapshot(self):
+        client, scheduler = self.client, self.scheduler
+        calls = {"price": _scheduled(scheduler, "ticker", lambda: client.futures_symbol_ticker(symbol=self.symbol))}
+        reconcile = self._reconcile_due()
+        if reconcile:
+            calls["account"] = _scheduled(scheduler, "account", client.futures_account, weight=5)
+            calls["position"] = _scheduled(scheduler, "positionRisk",
+                                           lambda: client.futures_position_information(symbol=self.symbol), weight=5)
+            calls["orders"] = _scheduled(scheduler, "openOrders",
+                                         lambda: client.futures_get_open_orders(symbol=self.symbol))
+
+        results = await _gather_with_timeout(calls, self.rest_timeout)
+
+        # Apply everything with no await in between, so no reader sees a half-applied refresh
+        self._apply_results(results)
+        if reconcile:
+            self._last_reconcile = time.monotonic()
+
+    def _apply_results(self, results: dict):
+        for name, result in results.items():
+            if isinstance(result, BaseException):
+                logger.error(f"❌ [{self.symbol}] REST {name} refresh failed: {result!r}")
+                continue
+            if name == "price":
+                self.current_price = round(float(result["price"]), 1)
+            elif name == "account":
+                self._apply_account(result)
+            elif name == "position":
+                self._apply_position(result)
+            elif name == "orders":
+                self.open_orders = result
+        self.snapshot_generation += 1
+        if self.bus is not None:
+            self.bus.publish_account(self.account_snapshot())
+        if "position" in results and not isinstance(results["position"], BaseException):
+            self._notify(self._position_listeners)
+
+    def account_snapshot(self):
+        """Account/position/price fields from one refresh, tagged with its generation."""
+        return {
+            "generation": self.snapshot_generation,
+            "totalMarginBalance": self.totalMarginBalance,
+            "availableBalance": self.availableBalance,
+            "cash_balance": self.cash_balance,
+            "positions": self.positions,
+            "entryPrice": self.entryPrice,
+            "unRealizedProfit": self.unRealizedProfit,
+            "side": self.side,
+            "initial_margin": self.initial_margin,
+            "maint_margin": self.maint_margin,
+            "current_price": self.current_price,
+        }
+
+    def _reconcile_due(self):
+        if not self.user_stream_active:
+            return True
+        return time.monotonic() - self._last_reconcile >= self.reconcile_interval
+
+    def _apply_account(self, account_info):
         self.totalMarginBalance = float(account_info["totalMarginBalance"])
         self.availableBalance = float(account_info["availableBalance"])
 
@@ -124,9 +267,7 @@ class BinanceTestnetDataCollector:
                 break
         # self.updated["wallet"] = True
 
-    async def _get_position(self):
-        pos_info = await self.client.futures_position_information(symbol=self.symbol)
-
+    def _apply_position(self, pos_info):
         if pos_info:
             self.positions = round(float(pos_info[0]["positionAmt"]),3)
             self.initial_margin = float(pos_info[0]["initialMargin"])
@@ -151,147 +292,310 @@ class BinanceTestnetDataCollector:
 
         # print("✅ [Position Cleared] No open position found.")
 
-    async def _get_open_orders(self):
-        self.open_orders = await self.client.futures_get_open_orders(symbol=self.symbol)
+    def _apply_stream_position(self, amount: float, entry_price: float, unrealized_profit: float):
+        # ACCOUNT_UPDATE carries no margin figures; those come from the REST reconciliation
+        self.positions = round(amount, 3)
+        self.entryPrice = entry_price
+        self.unRealizedProfit = unrealized_profit
+        if self.positions > 0:
+            self.side = 'LONG'
+        elif self.positions < 0:
+            self.side = 'SHORT'
+        else:
+            self.side = None
+        self.snapshot_generation += 1
+        if self.bus is not None:
+            self.bus.publish_account(self.account_snapshot())
+        self._notify(self._position_listeners)
+
+    def _apply_stream_order(self, order: dict):
+        others = [o for o in self.open_orders if o.get("orderId") != order["orderId"]]
+        if order["status"] in ["NEW", "PARTIALLY_FILLED"]:
+            others.append(order)
+        self.open_orders = others
+        self._notify(self._order_listeners, order)
+
+    def add_order_listener(self, callback):
+        """callback(order) for each ORDER_TRADE_UPDATE, after open_orders was updated; REST field names."""
+        self._order_listeners.append(callback)
+
+    def _apply_stream_algo_order(self, order: dict):
+        self._notify(self._algo_order_listeners, order)
+
+    def add_algo_order_listener(self, callback):
+        """callback(algo_order) for each ALGO_UPDATE (conditional orders); REST algo order field names."""
+        self._algo_order_listeners.append(callback)
+
+    def add_position_listener(self, callback):
+        """callback() whenever positions/entryPrice were refreshed, from the user data stream or REST."""
+        self._position_listeners.append(callback)
+
+    def _notify(self, listeners, *args):
+        for callback in listeners:
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.error(f"❌ [{self.symbol}] Listener failed: {e}")
 
 
     async def _init_candlestick_buffer(self):
-        print("📦 Initializing candlestick buffer from REST")
+        logger.info("📦 Initializing candlestick buffer from REST")
         try:
             raw = await self.client.futures_klines(
                 symbol=self.symbol,
                 interval="1m",
                 limit=self.candle_limit
             )
-            self.candlesticks = [
-                {
-                    "open_time": datetime.fromtimestamp(k[0] / 1000),
-                    "open": float(k[1]),
-                    "high": float(k[2]),
-                    "low": float(k[3]),
-                    "close": float(k[4]),
-                    "volume": float(k[5]),
-                    "close_time": datetime.fromtimestamp(k[6] / 1000),
-                }
-                for k in raw
-            ]
+            for k in raw:
+                self.candlesticks.update(int(k[0]), float(k[1]), float(k[2]), float(k[3]),
+                                         float(k[4]), float(k[5]), int(k[6]))
         except Exception as e:
-            print(f"❌ Failed to initialize candles from REST: {e}")
-            self.candlesticks = []
+            logger.error(f"❌ Failed to initialize candles from REST: {e}")
+            self.candlesticks.clear()
 
     async def _kline_websocket(self):
         async with websockets.connect(self.kline_url) as ws:
             async for msg in ws:
-                data = json.loads(msg)
-                k = data.get("k", {})
-
-                candle = {
-                    "open_time": datetime.fromtimestamp(k["t"] / 1000),
-                    "open": float(k["o"]),
-                    "high": float(k["h"]),
-                    "low": float(k["l"]),
-                    "close": float(k["c"]),
-                    "volume": float(k["v"]),
-                    "close_time": datetime.fromtimestamp(k["T"] / 1000),
-                }
-
-                # Initialize if needed
-                if not self.candlesticks:
-                    self.candlesticks.append(candle)
-
-                # Replace developing candle
-                elif self.candlesticks[-1]["open_time"] == candle["open_time"]:
-                    self.candlesticks[-1] = candle
-
-                # Append new candle only if strictly newer
-                elif candle["open_time"] > self.candlesticks[-1]["open_time"]:
-                    self.candlesticks.append(candle)
-
-                # Trim to maintain fixed buffer
-                if len(self.candlesticks) > self.candle_limit:
-                    self.candlesticks.pop(0)
-
-    async def _get_developedCandlesticks(self):
+                received_ns = perf_counter_ns()
+                self._record(msg)
+                self._on_kline_event(self.decoder.decode_kline(msg), received_ns)
+                tracer.since("ws.kline", received_ns)
+
+    def add_bar_close_listener(self, callback):
+        """callback(bar, received_ns) after each closed kline is stored; bar is a ClosedKlineStore tuple."""
+        self._bar_close_listeners.append(callback)
+
+    def remove_bar_close_listener(self, callback):
+        if callback in self._bar_close_listeners:
+            self._bar_close_listeners.remove(callback)
+
+    def add_book_listener(self, callback):
+        """callback(order_book) after each depth update applied to an in-sync book; keep it cheap."""
+        self._book_listeners.append(callback)
+
+    def remove_book_listener(self, callback):
+        if callback in self._book_listeners:
+            self._book_listeners.remove(callback)
+
+    def _on_kline_event(self, event, received_ns: int = None):
+        received_ns = received_ns or perf_counter_ns()
+        k = event.kline
+
+        # Replaces the developing candle, appends strictly newer ones
+        self.candlesticks.update(k.open_time, k.open, k.high, k.low, k.close, k.volume, k.close_time)
+        if self.bus is not None:
+            self.bus.publish_candles(self.candlesticks)
+
+        # Closed bar: append to the store, backfill from REST only on a gap
+        if k.closed:
+            bar = ClosedKlineStore.bar_from_ws(k)
+            if self.kline_store.has_gap(bar[0]):
+                self._schedule_backfill(self.kline_store.last_open_time + self.kline_store.interval_ms)
+            self.kline_store.append(bar)
+            for callback in self._bar_close_listeners:
+                try:
+                    callback(bar, received_ns)
+                except Exception as e:
+                    logger.error(f"❌ [{self.symbol}] Bar close listener failed: {e}")
+
+    def _record(self, msg):
+        if self.record_path:
+            _append_record(self.record_path, msg)
+
+    @property
+    def developedCandlesticks(self):
+        """Closed bars only, served from the websocket-fed kline store."""
+        if not self.kline_store.ready:
+            return None
+        return self.kline_store.to_frame()
+
+    async def _backfill_closed_klines(self, start_time: int = None):
         try:
-            raw = await self.client.futures_klines(
-                symbol=self.symbol,
-                interval="1m",
-                limit=self.candle_limit-1
-            )
-
-            self.developedCandlesticks = pd.DataFrame(raw, columns=[
-                'timestamp', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_asset_volume', 'number_of_trades',
-                'taker_buy_base_volume', 'taker_buy_quote_volume', 'ignore'])
-
-            self.developedCandlesticks['close'] = self.developedCandlesticks['close'].astype(float)
-            self.developedCandlesticks['volume'] = self.developedCandlesticks['volume'].astype(float)
-            self.developedCandlesticks['high'] = self.developedCandlesticks['high'].astype(float)
-            self.developedCandlesticks['low'] = self.developedCandlesticks['low'].astype(float)
-            self.developedCandlesticks['open'] = self.developedCandlesticks['open'].astype(float)
-            self.developedCandlesticks['timestamp'] = pd.to_datetime(self.developedCandlesticks['timestamp'], unit='ms')
+            if start_time is None and self.kline_store.ready:
+                start_time = self.kline_store.last_open_time + self.kline_store.interval_ms
+
+            if start_time is None:
+                raw = await self.client.futures_klines(
+                    symbol=self.symbol,
+                    interval="1m",
+                    limit=self.candle_limit
+                )
+            else:
+                raw = await self.client.futures_klines(
+                    symbol=self.symbol,
+                    interval="1m",
+                    startTime=start_time,
+                    limit=1500
+                )
+
+            # The last REST bar is usually still developing; keep closed bars only
+            now_ms = int(time.time() * 1000)
+            bars = [ClosedKlineStore.bar_from_rest(k) for k in raw if int(k[6]) < now_ms]
+            self.kline_store.merge(bars)
+            if bars:
+                logger.info(f"📦 Backfilled {len(bars)} closed candles from REST")
 
         except Exception as e:
-            print(f"❌ Failed to get developed candles from REST: {e}")
-            self.developedCandlesticks = []
+            logger.error(f"❌ Failed to backfill closed candles from REST: {e}")
 
-    async def _get_current_price(self):
-        try:
-            ticker = await self.client.futures_symbol_ticker(symbol=self.symbol)
-            self.current_price = round(float(ticker["price"]),1)
-        except Exception as e:
-            print("❌ Failed to get current price:", str(e))
-            self.current_price = None
+    def _schedule_backfill(self, start_time: int):
+        if self._backfill_task is None or self._backfill_task.done():
+            self._backfill_task = asyncio.create_task(self._backfill_closed_klines(start_time))
 
     def get_mid_price(self):
         try:
-            if self.depth_data and self.depth_data["bids"] and self.depth_data["asks"]:
-                best_bid = float(self.depth_data["bids"][0][0])
-                best_ask = float(self.depth_data["asks"][0][0])
-                return round((best_bid + best_ask) / 2,1)
+            mid = self.order_book.mid_price() if self.order_book.synced else None
+            if mid is not None:
+                return round(mid, 1)
         except Exception as e:
-            print("❌ Failed to calculate mid price:", str(e))
+            logger.error("❌ Failed to calculate mid price: %s", e)
         return None
 
-    async def get_ad_hoc_candlesticks(self, symbol: str, interval: str, limit: int = 366):
+    async def get_ad_hoc_candlesticks(self, symbol: str, interval: str, limit: int = 366, start_time: int = None):
 
         try:
-            candles = await self.client.futures_klines(
-                symbol=symbol.upper(),
-                interval=interval,
-                limit=limit
-            )
+            params = {"symbol": symbol.upper(), "interval": interval, "limit": limit}
+            if start_time is not None:
+                params["startTime"] = int(start_time)
+            candles = await self.client.futures_klines(**params)
             return candles
         except Exception as e:
-            print(f"❌ Failed to get candlesticks for {symbol} [{interval}]: {e}")
+            logger.error(f"❌ Failed to get candlesticks for {symbol} [{interval}]: {e}")
             return []
 
 
     def _push_data(self):
-        print("✅ Testnet Push:")
+        logger.info("✅ Testnet Push:")
         if self.depth_data:
-            print(f"  Bids (Top 5): {self.depth_data['bids'][:5]}")
-            print(f"  Asks (Top 5): {self.depth_data['asks'][:5]}")
-            print(f"  Order book time: {datetime.fromtimestamp(self.depth_data['timestamp'] / 1000)}")
-
-        print(f"  Wallet Balance: {self.cash_balance}")
-        print(f"  Position: {self.positions}")
-        print(f"  Initial Margin: {self.initial_margin}")
-        print(f"  Maintenance Margin: {self.maint_margin}")
-        print(f"  Current Price: {self.current_price}")
-        print(f"  Mid Price: {self.get_mid_price()}")
-        print(f"  Available Margin: {self.availableBalance}")
-
-        if self.candlesticks:
-            candle = self.candlesticks[-1]
-            print(f"  Last Candle [Open: {candle['open']}, High: {candle['high']}, Low: {candle['low']}, Close: {candle['close']}] at {candle['open_time']}")
-
-        print("-" * 60)
-
-    def _standardize_candlestick_times(self):
-        """Ensure all candlesticks have datetime for open_time and close_time."""
-        for i, candle in enumerate(self.candlesticks):
-            if isinstance(candle.get("open_time"), int):
-                self.candlesticks[i]["open_time"] = datetime.fromtimestamp(candle["open_time"] / 1000)
-            if isinstance(candle.get("close_time"), int):
-                self.candlesticks[i]["close_time"] = datetime.fromtimestamp(candle["close_time"] / 1000)
\ No newline at end of file
+            logger.info(f"  Bids (Top 5): {self.depth_data['bids'][:5]}")
+            logger.info(f"  Asks (Top 5): {self.depth_data['asks'][:5]}")
+            logger.info(f"  Order book time: {datetime.fromtimestamp(self.depth_data['timestamp'] / 1000)}")
+
+        logger.info(f"  Wallet Balance: {self.cash_balance}")
+        logger.info(f"  Position: {self.positions}")
+        logger.info(f"  Initial Margin: {self.initial_margin}")
+        logger.info(f"  Maintenance Margin: {self.maint_margin}")
+        logger.info(f"  Current Price: {self.current_price}")
+        logger.info(f"  Mid Price: {self.get_mid_price()}")
+        logger.info(f"  Available Margin: {self.availableBalance}")
+
+        candle = self.candlesticks.last()
+        if candle:
+            logger.info(f"  Last Candle [Open: {candle['open']}, High: {candle['high']}, Low: {candle['low']}, Close: {candle['close']}] at {datetime.fromtimestamp(candle['open_time'] / 1000)}")
+
+        logger.info("-" * 60)
+
+
+class MultiSymbolDataCollector:
+    """Several symbols over one combined-stream websocket and one shared REST poller.
+
+    Each symbol keeps a BinanceTestnetDataCollector (same attribute API as before);
+    this class only owns the client, the socket and the polling, and demultiplexes
+    messages into the per-symbol collectors.
+    """
+
+    def __init__(self, symbols, api_key: str, api_secret: str):
+        self.symbols = [s.upper() for s in symbols]
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.client: AsyncClient = None
+        self.decoder = get_decoder()
+        self.record_path = None
+        self.scheduler = None  # optional RequestScheduler shared with the order gateway
+
+        self.collectors = {s: BinanceTestnetDataCollector(s, api_key, api_secret) for s in self.symbols}
+        streams = []
+        for s in self.symbols:
+            streams += [f"{s.lower()}@depth@100ms", f"{s.lower()}@kline_1m"]
+        self.stream_url = "wss://stream.binancefuture.com/stream?streams=" + "/".join(streams)
+
+    def __getitem__(self, symbol: str):
+        return self.collectors[symbol.upper()]
+
+    def __iter__(self):
+        return iter(self.collectors.values())
+
+    async def start(self):
+        self.client = await AsyncClient.create(
+            self.api_key,
+            self.api_secret,
+            testnet=True
+        )
+        self.client.FUTURES_URL = "https://testnet.binancefuture.com"
+
+        for collector in self:
+            collector.client = self.client
+            collector.decoder = self.decoder
+            await collector._prepare_candles()
+
+        asyncio.create_task(self._combined_websocket())
+        asyncio.create_task(self._poll_rest_forever())
+
+        for collector in self:
+            await collector._wait_until_ready()
+
+    async def _combined_websocket(self):
+        async with websockets.connect(self.stream_url) as ws:
+            async for msg in ws:
+                received_ns = perf_counter_ns()
+                if self.record_path:
+                    _append_record(self.record_path, msg)
+                stream, payload = self.decoder.decode_stream(msg)
+                collector = self.collectors.get(stream.split("@", 1)[0].upper())
+                if collector is None:
+                    continue
+                if "@depth" in stream:
+                    collector._on_depth_update(payload)
+                    tracer.since("ws.depth", received_ns)
+                elif "@kline" in stream:
+                    collector._on_kline_event(payload, received_ns)
+                    tracer.since("ws.kline", received_ns)
+
+    async def _poll_rest_forever(self):
+        while not all(c.order_book.synced for c in self):
+            await asyncio.sleep(0.1)
+
+        while True:
+            try:
+                await self._refresh_snapshot()
+            except Exception as e:
+                logger.error(f"❌ Failed to poll REST for {self.symbols}: {e}")
+
+            await asyncio.sleep(1)
+
+    async def _refresh_snapshot(self):
+        # One account-wide call per endpoint, issued concurrently and fanned out by symbol
+        client, scheduler = self.client, self.scheduler
+        calls = {"tickers": _scheduled(scheduler, "ticker", client.futures_symbol_ticker, weight=2)}
+        reconcile = any(c._reconcile_due() for c in self)
+        if reconcile:
+            calls["account"] = _scheduled(scheduler, "account", client.futures_account, weight=5)
+            calls["positions"] = _scheduled(scheduler, "positionRisk", client.futures_position_information, weight=5)
+            # openOrders costs 40 weight without a symbol but 1 with one; polled every second without
+            # the user stream, the all-symbol call alone would use most of the 2400/min IP budget
+            for collector in self:
+                calls[f"orders:{collector.symbol}"] = _scheduled(
+                    scheduler, "openOrders",
+                    lambda symbol=collector.symbol: client.futures_get_open_orders(symbol=symbol))
+
+        results = await _gather_with_timeout(calls, min(c.rest_timeout for c in self))
+
+        for collector in self:
+            per_symbol = {}
+            for name, result in results.items():
+                if name.startswith("orders:"):
+                    if name == f"orders:{collector.symbol}":
+                        per_symbol["orders"] = result
+                elif isinstance(result, BaseException):
+                    per_symbol[name] = result
+                elif name == "tickers":
+                    price = next((t for t in result if t["symbol"] == collector.symbol), None)
+                    if price is not None:
+                        per_symbol["price"] = price
+                elif name == "account":
+                    per_symbol["account"] = result
+                elif name == "positions":
+                    per_symbol["position"] = [p for p in result if p["symbol"] == collector.symbol]
+            collector._apply_results(per_symbol)
+            if reconcile:
+                collector._last_reconcile = time.monotonic()
@@ -1,6 +1,10 @@
 # decision_maker.py
 from DataRetriever import *
 from RiskEngine import *
+from LatencyTracer import tracer, perf_counter_ns
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
 
 class Decisionmaker:
     def __init__(self, MARKETDATA: BinanceTestnetDataCollector, riskMgr:RiskManager):
@@ -15,38 +19,46 @@ class Decisionmaker:
         }
 
     def decide_order(self, signal: str):
+        start = perf_counter_ns()
+        try:
+            return self._decide_order(signal)
+        finally:
+            tracer.since("decision.decide_order", start)
 
+    def _decide_order(self, signal: str):
 
-        position_amt = self.MARKETDATA.positions
+        # Read the account once; the same snapshot is handed to the pre-trade check
+        snapshot = self.MARKETDATA.account_snapshot()
+        position_amt = snapshot['positions']
 
         if position_amt != 0:
-            print(f"Already in position({position_amt}), ignoring signal:{signal}")
+            logger.info(f"Already in position({position_amt}), ignoring signal:{signal}")
             return None
 
         if signal not in ["BUY","SELL"]:
-            print(f"Ignored signal:{signal}")
+            logger.info(f"Ignored signal:{signal}")
             return None
 
 
-        totalAsset = self.MARKETDATA.totalMarginBalance
-        tradeQty = round(self.config['trade_size']*totalAsset*self.config['LEVERAGE']/self.MARKETDATA.current_price,self.config['quantityDecimal'])
+        totalAsset = snapshot['totalMarginBalance']
+        tradeQty = round(self.config['trade_size']*totalAsset*self.config['LEVERAGE']/snapshot['current_price'],self.config['quantityDecimal'])
 
         if signal == "BUY":
             signal = "BUY"
         elif signal == "SELL":
             signal = "SELL"
         else:
-            print(f"ℹ️ Ignored signal: {signal}")
+            logger.info(f"ℹ️ Ignored signal: {signal}")
             return None
 
 
-        if self.riskMgr.pre_trade_check(signal,tradeQty):
+        if self.riskMgr.pre_trade_check(signal,tradeQty,snapshot=snapshot):
             return {
                 'side': signal,
                 'quantity': tradeQty,
             }
         else:
-            print(f"ℹ️ Ignored signal: {signal}")
+            logger.info(f"ℹ️ Ignored signal: {signal}")
             return None
 
 
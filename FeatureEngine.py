@@ -0,0 +1,280 @@
+import math
+import sys
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from KlineStore import ClosedKlineStore
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+class RollingSum:
+    """Sum over the last `window` values in O(1) per update.
+
+    Like pandas rolling(window), the result is NaN until the window is full or while
+    any value in it is NaN, and a window of identical values gives that value exactly
+    (so all-zero volume stays 0/0 = NaN). The sum is rebuilt from the window every
+    `window` updates so floating-point drift from add/subtract never accumulates.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.nans = 0
+        self._same = 0  # run length of identical trailing values
+        self._updates = 0
+
+    def update(self, x: float):
+        self._same = self._same + 1 if self.values and self.values[-1] == x else 1
+        if len(self.values) == self.window:
+            old = self.values[0]
+            if old != old:
+                self.nans -= 1
+            else:
+                self.total -= old
+        self.values.append(x)
+        if x != x:
+            self.nans += 1
+        else:
+            self.total += x
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self.total = math.fsum(v for v in self.values if v == v)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.values) < self.window or self.nans:
+            return math.nan
+        if self._same >= self.window:
+            return self.values[-1] * self.window
+        return self.total
+
+
+class RollingStd:
+    """Sample standard deviation (ddof=1) over a sliding window, Welford add/remove updates."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.nans = 0
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._same = 0
+        self._updates = 0
+
+    def _add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def _remove(self, x):
+        if self.n == 1:
+            self.n, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        self.n -= 1
+        delta = x - self.mean
+        self.mean -= delta / self.n
+        self.m2 -= delta * (x - self.mean)
+
+    def _rebuild(self):
+        valid = [v for v in self.values if v == v]
+        self.n = len(valid)
+        self.mean = math.fsum(valid) / self.n if valid else 0.0
+        self.m2 = math.fsum((v - self.mean) ** 2 for v in valid)
+
+    def update(self, x: float):
+        self._same = self._same + 1 if self.values and self.values[-1] == x else 1
+        if len(self.values) == self.window:
+            old = self.values[0]
+            if old != old:
+                self.nans -= 1
+            else:
+                self._remove(old)
+        self.values.append(x)
+        if x != x:
+            self.nans += 1
+        else:
+            self._add(x)
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self._rebuild()
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.values) < self.window or self.nans or self.n < 2:
+            return math.nan
+        if self._same >= self.window:
+            return 0.0
+        return math.sqrt(max(self.m2, 0.0) / (self.n - 1))
+
+
+class IncrementalFeatureEngine:
+    """ML_Signal features updated once per closed bar with O(1) rolling state.
+
+    Matches Signal.calculate_entropy / calculate_vwap / calculate_ofi / calculate_adx
+    (the ADX there uses simple rolling means, so this does too). Only bars with every
+    feature available are kept, like get_feature_df's dropna().
+    """
+
+    FEATURE_COLUMNS = ["entropy", "vwap", "ofi", "vwap_dev", "adx", "weekday"]
+
+    def __init__(self, entropy_window: int = 10, vwap_period: int = 15, adx_window: int = 14,
+                 history: int = 199):
+        self.entropy_window = entropy_window
+        self.vwap_period = vwap_period
+        self.adx_window = adx_window
+        self.history = history
+        self.reset()
+
+    def reset(self):
+        self.rows = deque(maxlen=self.history)  # bar tuple (ClosedKlineStore.COLUMNS) + FEATURE_COLUMNS
+        self.last_open_time = None
+        self.version = 0
+        self._prev = None  # (high, low, close) of the previous bar
+        self._returns = RollingStd(self.entropy_window)
+        self._pv = RollingSum(self.vwap_period)
+        self._v_vwap = RollingSum(self.vwap_period)
+        self._ofi = RollingSum(self.entropy_window)
+        self._v_ofi = RollingSum(self.entropy_window)
+        self._tr = RollingSum(self.adx_window)
+        self._plus_dm = RollingSum(self.adx_window)
+        self._minus_dm = RollingSum(self.adx_window)
+        self._dx = RollingSum(self.adx_window)
+        self._frame = None
+        self._frame_version = -1
+        self._store_rewrites = None
+
+    def update(self, bar: tuple):
+        """Feed one closed bar (ClosedKlineStore tuple); returns its features or None while warming up."""
+        open_time, open_, high, low, close, volume = bar[:6]
+        nan = math.nan
+
+        if self._prev is None:
+            ret = plus_dm = minus_dm = nan
+            tr = high - low  # max(axis=1) skips the NaN shifted terms on the first bar
+        else:
+            prev_high, prev_low, prev_close = self._prev
+            ret = math.log(close / prev_close)
+            plus_dm = max(high - prev_high, 0.0)
+            minus_dm = max(prev_low - low, 0.0)
+            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        self._prev = (high, low, close)
+        self.last_open_time = open_time
+
+        entropy = self._returns.update(ret)
+        vwap = _div(self._pv.update(close * volume), self._v_vwap.update(volume))
+        ofi = _div(self._ofi.update((close - open_) * volume), self._v_ofi.update(volume))
+
+        atr = self._tr.update(tr) / self.adx_window
+        plus_di = 100 * _div(self._plus_dm.update(plus_dm), atr)
+        minus_di = 100 * _div(self._minus_dm.update(minus_dm), atr)
+        dx = _div(abs(plus_di - minus_di), plus_di + minus_di) * 100
+        adx = self._dx.update(dx) / self.adx_window
+
+        features = (entropy, vwap, ofi, close - vwap, adx)
+        if any(f != f for f in features):
+            return None
+        weekday = WEEKDAYS[time.gmtime(open_time / 1000).tm_wday]
+        self.rows.append(tuple(bar) + features + (weekday,))
+        self.version += 1
+        return dict(zip(self.FEATURE_COLUMNS, features + (weekday,)))
+
+    def sync(self, store: ClosedKlineStore):
+        """Feed the store's bars newer than the last one seen; replay the store after a backfill rewrote it."""
+        if store.rewrites != self._store_rewrites:
+            self.reset()
+            self._store_rewrites = store.rewrites
+        if not store.bars or store.last_open_time == self.last_open_time:
+            return
+        pending = []
+        for bar in reversed(store.bars):  # new bars are at the end
+            if self.last_open_time is not None and bar[0] <= self.last_open_time:
+                break
+            pending.append(bar)
+        for bar in reversed(pending):
+            self.update(bar)
+
+    def to_frame(self):
+        """Feature frame in the layout get_feature_df used to return; rebuilt once per closed bar."""
+        if self._frame_version != self.version:
+            frame = pd.DataFrame(list(self.rows), columns=ClosedKlineStore.COLUMNS + self.FEATURE_COLUMNS)
+            frame['timestamp'] = pd.to_datetime(frame['timestamp'], unit='ms')
+            self._frame = frame
+            self._frame_version = self.version
+        return self._frame
+
+
+def _div(a, b):
+    if a != a or b != b or b == 0:
+        return math.nan
+    return a / b
+
+
+def _random_bars(n=5000, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100_000 * np.exp(np.cumsum(rng.normal(0, 0.0008, n)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.0005, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.0005, n))
+    volume = rng.gamma(2.0, 20.0, n)
+    volume[rng.random(n) < 0.01] = 0.0  # empty minutes happen on testnet
+    start = 1_750_000_000_000
+    return [(start + i * 60_000, float(open_[i]), float(high[i]), float(low[i]), float(close[i]),
+             float(volume[i]), start + i * 60_000 + 59_999, 0.0, 0, 0.0, 0.0) for i in range(n)]
+
+
+def parity_check(bars, atol=1e-6, rtol=1e-9):
+    """Compare the engine with ML_Signal's pandas formulas over the same bars."""
+    from ML_Signal import Signal
+
+    signal = Signal(MARKETDATA=None)
+    df = pd.DataFrame(bars, columns=ClosedKlineStore.COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df['entropy'] = signal.calculate_entropy(df['close'])
+    df['vwap'] = signal.calculate_vwap(df)
+    df['ofi'] = signal.calculate_ofi(df)
+    df['vwap_dev'] = df['close'] - df['vwap']
+    df['adx'] = signal.calculate_adx(df)
+    df['weekday'] = df['timestamp'].dt.day_name()
+    expected = df.dropna().reset_index(drop=True)
+
+    engine = IncrementalFeatureEngine(signal.ENTROPY_WINDOW, signal.VWAP_PERIOD, signal.ADX_WINDOW, history=len(bars))
+    start = time.perf_counter()
+    for bar in bars:
+        engine.update(bar)
+    per_bar_us = (time.perf_counter() - start) / len(bars) * 1e6
+    got = engine.to_frame()
+
+    report = {"rows": (len(expected), len(got)), "per_bar_us": per_bar_us}
+    ok = len(expected) == len(got) and (expected['timestamp'].values == got['timestamp'].values).all()
+    for col in ["entropy", "vwap", "ofi", "vwap_dev", "adx"]:
+        if ok:
+            diff = np.abs(expected[col].to_numpy() - got[col].to_numpy())
+            report[col] = float(diff.max())
+            ok &= bool(np.allclose(got[col], expected[col], rtol=rtol, atol=atol))
+    ok &= bool((expected['weekday'] == got['weekday']).all()) if len(expected) == len(got) else False
+    report["ok"] = ok
+    return report
+
+
+if __name__ == "__main__":
+    # python FeatureEngine.py [Candles.csv]
+    if len(sys.argv) > 1:
+        candles = pd.read_csv(sys.argv[1])
+        times = pd.to_datetime(candles['open_time']).astype('datetime64[ms]').astype('int64')
+        test_bars = [(int(t), float(r.open), float(r.high), float(r.low), float(r.close), float(r.volume),
+                      int(t) + 59_999, 0.0, 0, 0.0, 0.0) for t, r in zip(times, candles.itertuples())]
+        print(f"Parity check on {len(test_bars)} bars from {sys.argv[1]}")
+    else:
+        test_bars = _random_bars()
+        print(f"Parity check on {len(test_bars)} synthetic bars")
+    for key, value in parity_check(test_bars).items():
+        print(f"  {key:10s} {value}")
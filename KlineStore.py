@@ -0,0 +1,82 @@
+from collections import deque
+
+import pandas as pd
+
+
+class ClosedKlineStore:
+    """Closed 1m bars fed by the kline websocket (k.x == True).
+
+    REST is only used to backfill when a gap is detected, instead of re-fetching
+    the whole window every second.
+    """
+
+    COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume',
+               'close_time', 'quote_asset_volume', 'number_of_trades',
+               'taker_buy_base_volume', 'taker_buy_quote_volume']
+
+    def __init__(self, limit: int = 199, interval_ms: int = 60_000):
+        self.limit = limit
+        self.interval_ms = interval_ms
+        self.bars = deque(maxlen=limit)  # tuples ordered as COLUMNS, timestamp in epoch ms
+        self.version = 0  # bumped whenever the closed bars change
+        self.rewrites = 0  # bumped when bars already stored are replaced or backfilled in between
+        self._frame = None
+        self._frame_version = -1
+
+    def __len__(self):
+        return len(self.bars)
+
+    @property
+    def ready(self):
+        return len(self.bars) > 0
+
+    @property
+    def last_open_time(self):
+        return self.bars[-1][0] if self.bars else None
+
+    def has_gap(self, open_time: int):
+        last = self.last_open_time
+        return last is not None and open_time > last + self.interval_ms
+
+    def append(self, bar: tuple):
+        last = self.last_open_time
+        if last is not None and bar[0] <= last:
+            if bar[0] == last:
+                self.bars[-1] = bar
+                self.version += 1
+                self.rewrites += 1
+            return
+        self.bars.append(bar)
+        self.version += 1
+
+    def merge(self, bars):
+        """Merge backfilled bars, keeping the latest copy of each open time."""
+        if not bars:
+            return
+        merged = {bar[0]: bar for bar in self.bars}
+        for bar in bars:
+            merged[bar[0]] = bar
+        self.bars = deque((merged[t] for t in sorted(merged)), maxlen=self.limit)
+        self.version += 1
+        self.rewrites += 1
+
+    @staticmethod
+    def bar_from_rest(k):
+        return (int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]),
+                int(k[6]), float(k[7]), int(k[8]), float(k[9]), float(k[10]))
+
+    @staticmethod
+    def bar_from_ws(k):
+        """From a decoded MessageDecoder Kline (fields already typed)."""
+        return (k.open_time, k.open, k.high, k.low, k.close, k.volume,
+                k.close_time, k.quote_volume, k.trades, k.taker_buy_base, k.taker_buy_quote)
+
+    def to_frame(self):
+        """DataFrame in the layout of the old developedCandlesticks; rebuilt once per closed bar."""
+        if self._frame_version != self.version:
+            frame = pd.DataFrame(list(self.bars), columns=self.COLUMNS)
+            frame['timestamp'] = pd.to_datetime(frame['timestamp'], unit='ms')
+            self._frame = frame
+            self._frame_version = self.version
+        # callers add feature columns, so never hand out the cached frame itself
+        return self._frame.copy()
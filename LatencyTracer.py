@@ -0,0 +1,188 @@
+import csv
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
+perf_counter_ns = time.perf_counter_ns
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of nanosecond durations.
+
+    Values below 2 * 2**sub_bucket_bits are counted exactly; above that every power of
+    two is split into 2**sub_bucket_bits linear buckets, so any recorded value is off by
+    less than 1 / 2**sub_bucket_bits (0.8% by default) whatever its magnitude. Recording
+    is a few integer operations; percentiles walk the bucket counts.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 7, max_value_ns: int = 3_600 * 10**9):
+        self.bits = sub_bucket_bits
+        self.sub = 1 << sub_bucket_bits
+        self.max_value = max_value_ns
+        self.counts = [0] * (self._index(max_value_ns) + 1)  # plain list: scalar += is cheaper than on numpy
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value: int):
+        if value < 2 * self.sub:
+            return value
+        shift = value.bit_length() - self.bits - 1
+        return shift * self.sub + (value >> shift)
+
+    def _value(self, index: int):
+        """Middle of the bucket at index."""
+        if index < 2 * self.sub:
+            return float(index)
+        shift = index // self.sub - 1
+        low = (index - shift * self.sub) << shift
+        return low + ((1 << shift) - 1) / 2
+
+    def record(self, value_ns: int):
+        value_ns = min(max(int(value_ns), 0), self.max_value)
+        self.counts[self._index(value_ns)] += 1
+        self.total += 1
+        self.sum += value_ns
+        if self.min is None or value_ns < self.min:
+            self.min = value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+
+    def percentiles(self, qs=(50, 90, 99, 99.9)):
+        if not self.total:
+            return {q: None for q in qs}
+        cumulative = np.cumsum(np.array(self.counts, dtype=np.int64))
+        out = {}
+        for q in qs:
+            rank = max(1, int(np.ceil(q / 100 * self.total)))
+            index = int(np.searchsorted(cumulative, rank))
+            out[q] = min(self._value(index), self.max)
+        return out
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.total = self.sum = self.max = 0
+        self.min = None
+
+
+class LatencyTracer:
+    """Per-stage latency histograms for the tick-to-trade path.
+
+    Stages time themselves with perf_counter_ns:
+        start = perf_counter_ns(); ...; tracer.since("decision.decide_order", start)
+    A duration that spans two places (order ack -> fill seen) is begun under a key and
+    ended later. With enabled = False every call returns immediately.
+    """
+
+    QUANTILES = (50, 90, 99, 99.9)
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.histograms = {}
+        self._open = {}
+        self.started = time.time()
+
+    def record(self, stage: str, duration_ns: int):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram()
+        histogram.record(duration_ns)
+
+    def since(self, stage: str, start_ns: int):
+        """Record perf_counter_ns() - start_ns under stage."""
+        if self.enabled:
+            self.record(stage, perf_counter_ns() - start_ns)
+
+    def begin(self, key, start_ns: int = None):
+        if self.enabled:
+            if len(self._open) > 10_000:  # keys that never ended, e.g. orders cancelled unfilled
+                self._open.clear()
+            self._open[key] = perf_counter_ns() if start_ns is None else start_ns
+
+    def end(self, stage: str, key):
+        if self.enabled:
+            start_ns = self._open.pop(key, None)
+            if start_ns is not None:
+                self.record(stage, perf_counter_ns() - start_ns)
+
+    def summary(self):
+        """{stage: {count, mean_us, min_us, p50_us, ..., max_us}}"""
+        rows = {}
+        for stage in sorted(self.histograms):
+            h = self.histograms[stage]
+            if not h.total:
+                continue
+            row = {"count": h.total, "mean_us": h.sum / h.total / 1e3, "min_us": h.min / 1e3}
+            for q, value in h.percentiles(self.QUANTILES).items():
+                row[f"p{q:g}_us"] = value / 1e3
+            row["max_us"] = h.max / 1e3
+            rows[stage] = row
+        return rows
+
+    def dump(self, path=None):
+        """Log the percentile table; also write it as CSV when path is given."""
+        rows = self.summary()
+        if not rows:
+            logger.info("⏱️ No latency samples yet")
+            return rows
+        columns = list(next(iter(rows.values())))
+        width = max(len(stage) for stage in rows)
+        lines = [f"⏱️ Latency (us) over {time.time() - self.started:.0f}s",
+                 "   " + "stage".ljust(width) + "".join(f"{c.replace('_us', ''):>11s}" for c in columns)]
+        for stage, row in rows.items():
+            cells = "".join(f"{row[c]:11d}" if c == "count" else f"{row[c]:11.1f}" for c in columns)
+            lines.append("   " + stage.ljust(width) + cells)
+        logger.info("\n".join(lines))  # one record, so the table stays together
+        if path:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["stage"] + columns)
+                for stage, row in rows.items():
+                    writer.writerow([stage] + [row[c] for c in columns])
+        return rows
+
+    def reset(self):
+        self.histograms = {}
+        self._open = {}
+        self.started = time.time()
+
+
+# Shared by every module on the trading path
+tracer = LatencyTracer()
+
+
+def accuracy_check(n: int = 200_000, seed: int = 3):
+    """Histogram percentiles against numpy's exact ones on lognormal latencies, plus record cost."""
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(mean=11, sigma=1.5, size=n).astype(np.int64)  # ~60us median, long tail
+    h = LatencyHistogram()
+    started = perf_counter_ns()
+    for v in values.tolist():
+        h.record(v)
+    record_ns = (perf_counter_ns() - started) / n
+    worst = 0.0
+    for q, value in h.percentiles((50, 90, 99, 99.9)).items():
+        exact = float(np.percentile(values, q, method="inverted_cdf"))
+        error = abs(value - exact) / exact
+        worst = max(worst, error)
+        print(f"  p{q:<5g} histogram {value / 1e3:10.2f} us  exact {exact / 1e3:10.2f} us  error {error:.3%}")
+    print(f"  record {record_ns:.0f} ns per value, {len(h.counts)} buckets")
+    return worst
+
+
+if __name__ == "__main__":
+    # python LatencyTracer.py [samples]
+    print("Histogram accuracy check")
+    worst_error = accuracy_check(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
+    print("  ok" if worst_error < 0.01 else "  ❌ error above 1%")
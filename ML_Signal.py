@@ -13,6 +13,11 @@ from sklearn.linear_model import SGDClassifier
 from sklearn.preprocessing import StandardScaler
 from binance import AsyncClient #from binance.async_client import AsyncClient # use this if install with the latest library
 from DataRetriever import *
+from FeatureEngine import IncrementalFeatureEngine
+from LatencyTracer import tracer, perf_counter_ns
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
 
 
 class Signal:
@@ -41,6 +46,8 @@ class Signal:
         self.VWAP_PERIOD = 15
         self.ENTROPY_WINDOW = 10
         self.ML_MIN_BARS = 90
+        self.BUY_PROB = 0.7   # ML probability hurdles for generating a signal
+        self.SELL_PROB = 0.3
 
         #ML model parameters
             # SGDClassifier from grid search/backtest
@@ -75,6 +82,9 @@ class Signal:
         # data gateway coonection
         self.MARKETDATA = MARKETDATA
 
+        # rolling feature state, advanced once per closed bar
+        self.features = IncrementalFeatureEngine(self.ENTROPY_WINDOW, self.VWAP_PERIOD, self.ADX_WINDOW)
+
 
     #### ML inputes into ML
     def calculate_entropy(self, series):
@@ -114,15 +124,12 @@ class Signal:
 
 
     def get_feature_df(self):
-        n = max(self.ML_MIN_BARS + self.ADX_WINDOW + 10, 200)
-        df = self.MARKETDATA.developedCandlesticks
-        df['entropy'] = self.calculate_entropy(df['close'])
-        df['vwap'] = self.calculate_vwap(df)
-        df['ofi'] = self.calculate_ofi(df)
-        df['vwap_dev'] = df['close'] - df['vwap']
-        df['adx'] = self.calculate_adx(df)
-        df['weekday'] = df['timestamp'].dt.day_name()
-        return df.dropna().reset_index(drop=True)
+        # only bars closed since the last call are processed; the result is shared, do not modify it
+        start = perf_counter_ns()
+        self.features.sync(self.MARKETDATA.kline_store)
+        frame = self.features.to_frame()
+        tracer.since("signal.features", start)
+        return frame
 
 
     #### final signal output
@@ -134,19 +141,19 @@ class Signal:
         if self.CIRCUIT_BREAKER_ACTIVATED:
             if self.SKIP_TRADE_COUNT < self.CIRCUIT_BREAKER_SKIP_NO_TRADES:
                 self.SKIP_TRADE_COUNT = self.SKIP_TRADE_COUNT + 1
-                print(self.SKIP_TRADE_COUNT)
+                logger.debug("skipped trades %s", self.SKIP_TRADE_COUNT)
                 return "NO_ACTION"
             else:
                 self.SKIP_TRADE_COUNT=0
                 self.CIRCUIT_BREAKER_ACTIVATED = False
-                print("Trade resumed")
+                logger.info("Trade resumed")
 
         #check soft circuit_breaker
         if self.circuit_breaker(df):
             self.CIRCUIT_BREAKER_ACTIVATED = True
-            print(f"circuit breaker activated, skip {self.CIRCUIT_BREAKER_SKIP_NO_TRADES} trade")
+            logger.info(f"circuit breaker activated, skip {self.CIRCUIT_BREAKER_SKIP_NO_TRADES} trade")
             self.SKIP_TRADE_COUNT = self.SKIP_TRADE_COUNT + 1
-            print(self.SKIP_TRADE_COUNT)
+            logger.debug("skipped trades %s", self.SKIP_TRADE_COUNT)
             return "NO_ACTION"
 
         hour = latest['timestamp'].hour
@@ -155,12 +162,10 @@ class Signal:
         if latest['weekday'] in self.EXCLUDE_WEEKDAYS:
             return "Day" #0
         if latest['adx'] <= self.ADX_THRESHOLD:
-            print(latest['adx'] )
+            logger.debug("adx %s", latest['adx'])
             return "ADX" #0
         if not self.ml_trained:
-            print(len(df))
-            print(self.ML_MIN_BARS)
-            print(self.ml_trained)
+            logger.debug("feature rows %s, ML_MIN_BARS %s, trained %s", len(df), self.ML_MIN_BARS, self.ml_trained)
             if len(df) >= self.ML_MIN_BARS + 1:
                 closes = df['close'].tail(self.ML_MIN_BARS + 1).reset_index(drop=True)
                 y_init = (closes.shift(-1)[:-1] > closes[:-1]).astype(int)
@@ -168,7 +173,7 @@ class Signal:
                 self.scaler.fit(X_init)
                 self.sgd.partial_fit(self.scaler.transform(X_init), y_init[:len(X_init)], classes=[0, 1])
                 self.ml_trained = True
-                print(self.ml_trained)
+                logger.debug("trained %s", self.ml_trained)
             return "ML" #0
         X_now = df[self.FEATURES].iloc[[-1]]
         X_scaled = self.scaler.transform(X_now)
@@ -179,9 +184,9 @@ class Signal:
             X_past_scaled = self.scaler.transform(X_past)
             self.sgd.partial_fit(X_past_scaled, [realized])
         self.ml_history.append(df['close'].iloc[-1])
-        if prob > 0.7:    ### ML probably hurdle for generating signal.
+        if prob > self.BUY_PROB:    ### ML probably hurdle for generating signal.
             return "BUY"
-        elif prob < 0.3:
+        elif prob < self.SELL_PROB:
             return "SELL"
         else:
             return "NO_ACTION"
@@ -195,7 +200,7 @@ class Signal:
         end_price = df['close'].iloc[-1]
         drop = (start_price - end_price) / start_price
         if drop >= self.CIRCUIT_BREAKER_DROP:
-            print(f"[CIRCUIT BREAKER] BTC dropped {drop*100:.2f}% in last {self.CIRCUIT_BREAKER_LOOKBACK} bars. No new trades.")
+            logger.warning(f"[CIRCUIT BREAKER] BTC dropped {drop*100:.2f}% in last {self.CIRCUIT_BREAKER_LOOKBACK} bars. No new trades.")
             return True  # Block trades
         return False
 
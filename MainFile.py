@@ -6,7 +6,14 @@ from PositionAfterCare import *
 from TelegramAlerting import TelegramBot
 from DecisionEngine import *
 from RiskEngine import *
-import copy
+from UserDataStream import UserDataStream
+from RequestScheduler import RequestScheduler
+from MarketDataBus import MarketDataBus
+from BarCloseScheduler import BarCloseScheduler
+from LatencyTracer import tracer
+from StructuredLogger import get_logger, setup_logging
+
+logger = get_logger(__name__)
 from datetime import datetime
 import datetime
 
@@ -30,13 +37,17 @@ def get_credential():
 async def append_storage_loop(collector, storage):
     while True:
         try:
-            storage.append_candlesticks(copy.deepcopy(collector.candlesticks))
+            storage.append_candlesticks(collector.candlesticks.view())
         except Exception as e:
-            print(f"[Storage Append Error] {e}")
+            logger.error(f"[Storage Append Error] {e}")
         await asyncio.sleep(1)
 
 
-SYMBOL = "BTCUSDT"
+SYMBOLS = ["BTCUSDT"]  # all streamed over one combined websocket
+SYMBOL = SYMBOLS[0]  # traded symbol
+LOG_LEVELS = {"ExecutionModule": "INFO", "ML_Signal": "INFO"}  # per-module levels, e.g. "OrderGateWay": "DEBUG"
+PUBLISH_MARKET_BUS = True  # share candles/book/account with worker processes via MarketDataBus.attach(symbol)
+market = None
 storage = CandlestickDataStorage()
 riskMgr = None
 collector = None
@@ -45,9 +56,11 @@ status = {
     "totalMarginBalance": 0.0,
     "availableBalance": 0.0,
     "var_value": 0.0,
+    "es_value": 0.0,
     "unrealisedPnL": 0.0,
     "realisedPnL": 0.0,
-    "openOrders": []
+    "openOrders": [],
+    "barCloseToOrderMs": None
 }
 execution = None
 telegram_bot = None
@@ -55,7 +68,7 @@ loop = None
 
 
 async def save_all_to_csv_temp():
-    print("💾 [Temp Save] Writing data to CSV...")
+    logger.info("💾 [Temp Save] Writing data to CSV...")
 
     try:
         if hasattr(riskMgr, "_save_to_csv"):
@@ -65,12 +78,14 @@ async def save_all_to_csv_temp():
             await riskMgr.orderMgr.write_to_csv()
 
         if storage:
-            storage.write_to_csv()
+            storage.write_to_archive()
 
-        print("✅ Temp Save Completed.")
+        tracer.dump("Latency/latency.csv")
+
+        logger.info("✅ Temp Save Completed.")
 
     except Exception as e:
-        print(f"❌ Temp Save Failed: {e}")
+        logger.error(f"❌ Temp Save Failed: {e}")
 
 def trigger_square_off():
     try:
@@ -82,35 +97,54 @@ def trigger_square_off():
                 if telegram_bot:
                     await telegram_bot.send_text_message("🛑 Manual square-off was triggered from UI.")
             else:
-                print("⚠️ Execution module not available.")
+                logger.warning("⚠️ Execution module not available.")
 
         future = asyncio.run_coroutine_threadsafe(_square_off_and_alert(), loop)
-        print("🛑 Square-off + alert submitted to event loop.")
+        logger.info("🛑 Square-off + alert submitted to event loop.")
         return future
 
     except Exception as e:
-        print(f"❌ Failed to trigger square off: {e}")
+        logger.error(f"❌ Failed to trigger square off: {e}")
 
 
 async def main():
+    #Queue-backed logging: JSON lines in Logs/trading.jsonl, console text from a writer thread
+    setup_logging(levels=LOG_LEVELS)
+
     api_key, api_secret = get_credential()
 
     #Initialize collector and await its start
-    global collector
-    collector = BinanceTestnetDataCollector(SYMBOL, api_key, api_secret)
-    await collector.start()
+    global market, collector
+    market = MultiSymbolDataCollector(SYMBOLS, api_key, api_secret)
+    await market.start()
+    collector = market[SYMBOL]
+    if PUBLISH_MARKET_BUS:
+        for c in market:
+            c.bus = MarketDataBus(c.symbol, capacity=c.candle_limit)
+            c.bus.publish_candles(c.candlesticks)
+            c.bus.publish_book(c.order_book)
+            c.bus.publish_account(c.account_snapshot())
     await asyncio.sleep(5)
 
     #Append candlesticks into storage to prepare data
     asyncio.create_task(append_storage_loop(collector, storage))
 
+    #Initialize REST scheduler shared by market data polling and order gateway
+    scheduler = RequestScheduler(market.client)
+    market.scheduler = scheduler
+
     #Initialize OrderGateWay
-    gateway = BinanceOrderGateway(client=collector.client, symbol=collector.symbol)
+    gateway = BinanceOrderGateway(client=collector.client, symbol=collector.symbol, scheduler=scheduler)
 
     #Initialize OrderManager and get it started at background
     orderMgr = OrderTracker(gateway=gateway, MARKETDATA=collector)
     await orderMgr.start()
 
+    #Initialize user data stream (fills, balances, positions pushed by the exchange)
+    user_stream = UserDataStream(client=market.client, collectors=list(market))
+    user_stream.attach_order_tracker(orderMgr)
+    await user_stream.start()
+
     #Initialize Execution Module
     global execution
     execution = OrderExecution(gateway=gateway, MARKETDATA=collector, orderMgr=orderMgr)
@@ -135,6 +169,30 @@ async def main():
     #Initialize DecisionMaker
     DecisionMK = Decisionmaker(MARKETDATA=collector,riskMgr=riskMgr)
 
+    #Signal -> decision -> order, run by the kline close event of each bar
+    async def on_bar_close(bar, received_ns):
+        Decision=DecisionMK.decide_order(signal=ML_signalSubject.get_signal())
+
+        signal = None
+        quantity = None
+
+        if Decision:
+            signal = Decision['side']
+            quantity = Decision['quantity']
+            # the append loop may not have stored the closed bar yet: store it, then tag it by open time
+            storage.append_candlesticks(collector.candlesticks.view())
+            storage.update_signal(signal=signal, open_time=bar[0])
+
+        #Trading execution
+        if signal in ["BUY", "SELL"]:
+            if not await execution.execute_order(SYMBOL, signal, quantity=quantity, started_ns=received_ns):
+                return False
+            storage.update_signal(trade="T", open_time=bar[0])
+            return True
+        return False
+
+    bar_scheduler = BarCloseScheduler(collector, on_bar_close)
+
     async def update_status_loop():
         while True:
             try:
@@ -142,12 +200,14 @@ async def main():
                 status["totalMarginBalance"] = collector.totalMarginBalance
                 status["availableBalance"] = collector.availableBalance
                 status["var_value"] = riskMgr.latest_var_value
+                status["es_value"] = riskMgr.latest_es_value
                 status["unrealisedPnL"] = riskMgr.unrealised_pnl_closing
                 status["realisedPnL"] = riskMgr.realised_pnl_today
                 status["openOrders"] = collector.open_orders
+                status["barCloseToOrderMs"] = bar_scheduler.close_to_order_ms()
 
             except Exception as e:
-                print(f"[Status Update Error] {e}")
+                logger.error(f"[Status Update Error] {e}")
 
             await asyncio.sleep(1)
 
@@ -156,46 +216,10 @@ async def main():
     global loop
     loop = asyncio.get_event_loop()
 
-    #Start Trading
-    while True:
-
-        #While loop's execution is controlled by waiting time. it makes the execution time (from start to start) being 1m
-
-        start_time = datetime.datetime.utcnow().replace(second=0, microsecond=0)
-
-        try:
-
-            #storage.append_candlesticks(copy.deepcopy(collector.candlesticks))
-
-            #start getting signals and quantity
-            Decision=DecisionMK.decide_order(signal=ML_signalSubject.get_signal())
-
-            signal = None
-            quantity = None
+    #Start Trading: no wall-clock sleep, each closed bar triggers the pipeline
+    await bar_scheduler.start()
 
-            if Decision:
-                signal = Decision['side']
-                quantity = Decision['quantity']
-                storage.update_signal(signal=signal)
-
-            #Trading execution
-            if signal in ["BUY", "SELL"]:
-                asyncio.create_task(execution.execute_order(SYMBOL, signal, quantity=quantity))
-                storage.update_signal(trade="T")
-
-            # End of loop: compute remaining time until next full minute
-            now = datetime.datetime.utcnow()
-            elapsed = (now - start_time).total_seconds()
-            wait_seconds = max(0.5, 60.0 - elapsed)
-            if wait_seconds <=0: wait_seconds = 0
-            await asyncio.sleep(wait_seconds)
-
-        except Exception as e:
-            print(f"[Main Loop Error] {e}")
-
-        await asyncio.sleep(1)
-
-__all__ = ["main", "storage","riskMgr","collector","execution","telegram_bot","confirm_and_trigger_square_off"]
+__all__ = ["main", "storage","riskMgr","collector","execution","telegram_bot","confirm_and_trigger_square_off","dump_latency"]
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -205,7 +229,7 @@ if __name__ == "__main__":
 def confirm_and_trigger_square_off():
     global loop
     if loop is None:
-        print("❌ Event loop not available.")
+        logger.error("❌ Event loop not available.")
         return
 
     async def _square_off_and_alert():
@@ -214,19 +238,24 @@ def confirm_and_trigger_square_off():
             if telegram_bot:
                 await telegram_bot.send_text_message("🛑 Manual square-off was triggered from UI.")
         else:
-            print("⚠️ Execution module not available.")
+            logger.warning("⚠️ Execution module not available.")
 
     asyncio.run_coroutine_threadsafe(_square_off_and_alert(), loop)
 
 
+def dump_latency(path="Latency/latency.csv"):
+    # Stage percentiles from the tracer; safe to call from the UI thread (reads counters only)
+    return tracer.dump(path)
+
+
 async def send_test_warning_alert():
     try:
         await telegram_bot.send_text_message("⚠️ This is a test warning alert.")
     except Exception as e:
-        print(f"❌ Failed to send warning alert: {e}")
+        logger.error(f"❌ Failed to send warning alert: {e}")
 
 async def send_test_critical_alert():
     try:
         await telegram_bot.send_critical_alert("🚨 Critical alert! Please acknowledge.")
     except Exception as e:
-        print(f"❌ Failed to send critical alert: {e}")
\ No newline at end of file
+        logger.error(f"❌ Failed to send critical alert: {e}")
\ No newline at end of file
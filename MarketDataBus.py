@@ -0,0 +1,270 @@
+import multiprocessing as mp
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from CandleRingBuffer import CandleRingBuffer
+
+MAGIC = 0x4D44425553  # "MDBUS"
+SECTIONS = ("candles", "book", "account")
+BOOK_FIELDS = ("best_bid", "bid_qty", "best_ask", "ask_qty", "event_time", "last_update_id")
+ACCOUNT_FIELDS = ("generation", "totalMarginBalance", "availableBalance", "cash_balance", "positions",
+                  "entryPrice", "unRealizedProfit", "side", "initial_margin", "maint_margin", "current_price")
+SIDES = {"LONG": 1.0, "SHORT": -1.0, None: 0.0}
+HEADER_SLOTS = 8  # magic, capacity, then one sequence counter per section
+
+
+def segment_name(symbol: str):
+    return f"mdbus_{symbol.lower()}"
+
+
+def _attach_segment(name: str):
+    """Map an existing segment without letting this process's resource tracker own it.
+
+    Before 3.13 every SharedMemory(name=...) registers with the tracker, which unlinks
+    the segment when this process exits, under the writer and any other readers.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class MarketDataBus:
+    """Candles, top of book and account snapshot of one collector in a shared-memory segment.
+
+    One writer (the collector's event loop) and any number of reader processes. Each section
+    has a sequence counter: the writer makes it odd, writes, then makes it even again; a reader
+    copies the section and retries if the counter was odd or moved meanwhile (a seqlock), so
+    readers never block the writer and never see a half-written section. Relies on aligned
+    8-byte stores not being reordered, which holds on x86-64 (TSO) and with the GIL's barriers.
+
+    Writer: bus = MarketDataBus("BTCUSDT", create=True); collector.bus = bus
+    Reader: bus = MarketDataBus.attach("BTCUSDT"); bus.read_candles()
+    """
+
+    def __init__(self, symbol: str, capacity: int = 200, create: bool = True):
+        self.symbol = symbol.upper()
+        self.name = segment_name(symbol)
+        self.owner = create
+        if create:
+            size = self._size(capacity)
+            try:
+                self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+            except FileExistsError:
+                # left behind by a process that did not shut down cleanly
+                stale = shared_memory.SharedMemory(name=self.name)
+                stale.close()
+                stale.unlink()
+                self._shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+            self._map(capacity)
+            self._header[:] = 0
+            self._header[1] = capacity
+            self._header[0] = MAGIC
+        else:
+            self._shm = _attach_segment(self.name)
+            header = np.ndarray(HEADER_SLOTS, dtype=np.int64, buffer=self._shm.buf)
+            if header[0] != MAGIC:
+                del header
+                self._shm.close()
+                raise ValueError(f"{self.name} is not a market data bus segment")
+            capacity = int(header[1])
+            del header
+            self._map(capacity)
+        self.capacity = capacity
+
+    @classmethod
+    def attach(cls, symbol: str):
+        """Map the segment published by the collector process, for reading."""
+        return cls(symbol, create=False)
+
+    @staticmethod
+    def _size(capacity):
+        return 8 * (HEADER_SLOTS + 2 + len(CandleRingBuffer.FIELDS) * capacity
+                    + len(BOOK_FIELDS) + len(ACCOUNT_FIELDS))
+
+    def _map(self, capacity):
+        buf, offset = self._shm.buf, 0
+
+        def take(count, dtype):
+            nonlocal offset
+            view = np.ndarray(count, dtype=dtype, buffer=buf, offset=offset)
+            offset += 8 * count
+            return view
+
+        self._header = take(HEADER_SLOTS, np.int64)
+        self._seq = self._header[2:2 + len(SECTIONS)]
+        self._candle_meta = take(2, np.int64)  # bar count, ring buffer version
+        self._candles = {
+            field: take(capacity, np.int64 if field in CandleRingBuffer.TIME_FIELDS else np.float64)
+            for field in CandleRingBuffer.FIELDS
+        }
+        self._book = take(len(BOOK_FIELDS), np.float64)
+        self._account = take(len(ACCOUNT_FIELDS), np.float64)
+
+    # ---- writer ------------------------------------------------------------------
+    def _begin(self, section: int):
+        self._seq[section] += 1  # odd: write in progress
+
+    def _end(self, section: int):
+        self._seq[section] += 1
+
+    def publish_candles(self, ring: CandleRingBuffer):
+        if ring.version == self._candle_meta[1] and self._seq[0]:
+            return
+        bars = ring.view()
+        n = min(len(ring), self.capacity)
+        self._begin(0)
+        for field, column in self._candles.items():
+            column[:n] = bars[field][-n:] if n else column[:0]
+        self._candle_meta[0] = n
+        self._candle_meta[1] = ring.version
+        self._end(0)
+
+    def publish_book(self, book):
+        bid, ask = book.bids.best(), book.asks.best()
+        if bid is None or ask is None:
+            return
+        self._begin(1)
+        values = self._book
+        values[0], values[1] = bid
+        values[2], values[3] = ask
+        values[4] = book.event_time or 0
+        values[5] = book.last_update_id or 0
+        self._end(1)
+
+    def publish_account(self, snapshot: dict):
+        self._begin(2)
+        for i, field in enumerate(ACCOUNT_FIELDS):
+            value = snapshot.get(field)
+            self._account[i] = SIDES.get(value, 0.0) if field == "side" else float(value or 0.0)
+        self._end(2)
+
+    # ---- reader ------------------------------------------------------------------
+    def sequence(self, section: str):
+        """Current counter of a section; unchanged means nothing new to read."""
+        return int(self._seq[SECTIONS.index(section)])
+
+    def _read(self, section: int, copy, timeout: float = 1.0):
+        deadline, spins = None, 0
+        while True:
+            before = int(self._seq[section])
+            if not before & 1:
+                data = copy()
+                if int(self._seq[section]) == before:
+                    return data, before
+            spins += 1
+            if spins % 100 == 0:
+                deadline = deadline or time.monotonic() + timeout
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{self.name}: writer stuck in section {SECTIONS[section]}")
+                time.sleep(0)
+
+    def read_candles(self):
+        """Copies of the buffered bars (oldest first, CandleRingBuffer.FIELDS) plus version/seq."""
+        def copy():
+            n = int(self._candle_meta[0])
+            bars = {field: column[:n].copy() for field, column in self._candles.items()}
+            bars["version"] = int(self._candle_meta[1])
+            return bars
+        bars, seq = self._read(0, copy)
+        bars["seq"] = seq
+        return bars
+
+    def read_book(self):
+        values, seq = self._read(1, self._book.copy)
+        book = dict(zip(BOOK_FIELDS, values.tolist()))
+        book["event_time"] = int(book["event_time"])
+        book["last_update_id"] = int(book["last_update_id"])
+        book["seq"] = seq
+        return book
+
+    def read_account(self):
+        """Same keys as BinanceTestnetDataCollector.account_snapshot()."""
+        values, seq = self._read(2, self._account.copy)
+        snapshot = dict(zip(ACCOUNT_FIELDS, values.tolist()))
+        snapshot["generation"] = int(snapshot["generation"])
+        snapshot["side"] = {1.0: "LONG", -1.0: "SHORT"}.get(snapshot["side"])
+        snapshot["seq"] = seq
+        return snapshot
+
+    def close(self):
+        # the numpy views pin the buffer, drop them before closing
+        self._header = self._seq = self._candle_meta = self._book = self._account = None
+        self._candles = {}
+        self._shm.close()
+        if self.owner:
+            # a reader sharing our resource tracker (a forked child, or attach() in this
+            # process) dropped the registration; restore it so unlink's unregister matches
+            resource_tracker.register(self._shm._name, "shared_memory")
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                resource_tracker.unregister(self._shm._name, "shared_memory")
+
+
+# ---- demo / torn-read check --------------------------------------------------
+def _reader(symbol, stop, results):
+    bus = MarketDataBus.attach(symbol)
+    reads = torn = 0
+    started = time.perf_counter()
+    while not stop.is_set():
+        book = bus.read_book()
+        # the writer keeps ask = bid + 1 and ask_qty = bid_qty, so a torn copy shows up here
+        if book["seq"] and (book["best_ask"] != book["best_bid"] + 1 or book["ask_qty"] != book["bid_qty"]):
+            torn += 1
+        bars = bus.read_candles()
+        if len(bars["close"]) and not (bars["close"] == bars["open"]).all():
+            torn += 1
+        reads += 1
+    elapsed = time.perf_counter() - started
+    results.put((reads, torn, elapsed / max(reads, 1) * 1e6))
+    bus.close()
+
+
+def check_torn_reads(seconds: float = 2.0, symbol: str = "TESTBUS"):
+    """Writer in this process, a reader process checking invariants on every copy."""
+    from OrderBook import LocalOrderBook
+
+    bus = MarketDataBus(symbol, capacity=200, create=True)
+    ring, book = CandleRingBuffer(200), LocalOrderBook(symbol)
+    book.load_snapshot({"lastUpdateId": 1, "bids": [], "asks": []})
+    stop, results = mp.Event(), mp.Queue()
+    reader = mp.Process(target=_reader, args=(symbol, stop, results))
+    reader.start()
+
+    writes, t = 0, 1_750_000_000_000
+    write_time = 0.0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        price = 100_000.0 + writes % 1000
+        book.bids.clear()
+        book.asks.clear()
+        book.bids.set(price, writes + 1)
+        book.asks.set(price + 1, writes + 1)
+        book.event_time = t
+        ring.update(t + (writes // 100) * 60_000, price, price, price, price, 1.0, t + 59_999)
+        started = time.perf_counter()
+        bus.publish_book(book)
+        bus.publish_candles(ring)
+        bus.publish_account({"generation": writes, "side": "LONG", "positions": 0.01})
+        write_time += time.perf_counter() - started
+        writes += 1
+
+    stop.set()
+    reads, torn, read_us = results.get(timeout=10)
+    reader.join()
+    bus.close()
+    print(f"  writes {writes}  ({write_time / writes * 1e6:.1f} us for book+candles+account)")
+    print(f"  reads  {reads}  ({read_us:.1f} us per book+candles read)  torn {torn}")
+    return torn == 0
+
+
+if __name__ == "__main__":
+    # python MarketDataBus.py [seconds]
+    print("Seqlock check, one writer and one reader process")
+    ok = check_torn_reads(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0)
+    print("  ok" if ok else "  ❌ torn reads seen")
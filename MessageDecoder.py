@@ -0,0 +1,245 @@
+import json
+import random
+import sys
+import time
+from typing import NamedTuple
+
+try:
+    import msgspec
+except ImportError:  # optional fast path
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # optional fast path
+    orjson = None
+
+
+# Typed messages handed to the websocket handlers. Prices/quantities arrive as
+# strings on the wire and are converted to float once, here.
+class DepthUpdate(NamedTuple):
+    event_time: int
+    first_update_id: int
+    final_update_id: int
+    prev_final_update_id: int
+    bids: list
+    asks: list
+
+
+class Kline(NamedTuple):
+    open_time: int
+    close_time: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    quote_volume: float
+    trades: int
+    taker_buy_base: float
+    taker_buy_quote: float
+    closed: bool
+
+
+class KlineEvent(NamedTuple):
+    event_time: int
+    symbol: str
+    kline: Kline
+
+
+class JsonDecoder:
+    """Fallback decoder: orjson or stdlib json, then explicit float() conversion."""
+
+    def __init__(self, loads=None):
+        if loads is None:
+            loads = orjson.loads if orjson is not None else json.loads
+        self.loads = loads
+        self.name = "orjson" if loads is getattr(orjson, "loads", None) else "json"
+
+    def decode(self, raw):
+        return self.loads(raw)
+
+    def decode_depth(self, raw):
+        return self.depth_from_dict(self.loads(raw))
+
+    def decode_kline(self, raw):
+        return self.kline_from_dict(self.loads(raw))
+
+    def decode_stream(self, raw):
+        """Combined-stream envelope {"stream": ..., "data": ...} -> (stream name, typed payload)."""
+        envelope = self.loads(raw)
+        stream, data = envelope["stream"], envelope["data"]
+        if "@depth" in stream:
+            return stream, self.depth_from_dict(data)
+        if "@kline" in stream:
+            return stream, self.kline_from_dict(data)
+        return stream, data
+
+    @staticmethod
+    def depth_from_dict(d):
+        return DepthUpdate(
+            d.get("E"), d["U"], d["u"], d.get("pu"),
+            [(float(px), float(qty)) for px, qty in d.get("b", [])],
+            [(float(px), float(qty)) for px, qty in d.get("a", [])],
+        )
+
+    @staticmethod
+    def kline_from_dict(d):
+        k = d["k"]
+        return KlineEvent(d.get("E"), d.get("s"), Kline(
+            int(k["t"]), int(k["T"]), float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]),
+            float(k["v"]), float(k["q"]), int(k["n"]), float(k["V"]), float(k["Q"]), bool(k["x"])
+        ))
+
+
+if msgspec is not None:
+    class _DepthUpdateStruct(msgspec.Struct):
+        event_time: int = msgspec.field(name="E")
+        first_update_id: int = msgspec.field(name="U")
+        final_update_id: int = msgspec.field(name="u")
+        bids: list[tuple[float, float]] = msgspec.field(name="b")
+        asks: list[tuple[float, float]] = msgspec.field(name="a")
+        prev_final_update_id: int = msgspec.field(name="pu", default=None)
+
+    class _KlineStruct(msgspec.Struct):
+        open_time: int = msgspec.field(name="t")
+        close_time: int = msgspec.field(name="T")
+        open: float = msgspec.field(name="o")
+        high: float = msgspec.field(name="h")
+        low: float = msgspec.field(name="l")
+        close: float = msgspec.field(name="c")
+        volume: float = msgspec.field(name="v")
+        quote_volume: float = msgspec.field(name="q")
+        trades: int = msgspec.field(name="n")
+        taker_buy_base: float = msgspec.field(name="V")
+        taker_buy_quote: float = msgspec.field(name="Q")
+        closed: bool = msgspec.field(name="x")
+
+    class _KlineEventStruct(msgspec.Struct):
+        event_time: int = msgspec.field(name="E")
+        symbol: str = msgspec.field(name="s")
+        kline: _KlineStruct = msgspec.field(name="k")
+
+    class _StreamEnvelope(msgspec.Struct):
+        stream: str
+        data: msgspec.Raw
+
+
+class MsgspecDecoder:
+    """Decodes straight into typed Structs; strict=False parses numeric strings as floats."""
+
+    name = "msgspec"
+
+    def __init__(self):
+        if msgspec is None:
+            raise ImportError("msgspec is not installed")
+        self._any = msgspec.json.Decoder()
+        self._depth = msgspec.json.Decoder(_DepthUpdateStruct, strict=False)
+        self._kline = msgspec.json.Decoder(_KlineEventStruct, strict=False)
+        self._envelope = msgspec.json.Decoder(_StreamEnvelope)
+
+    def decode(self, raw):
+        return self._any.decode(raw)
+
+    def decode_depth(self, raw):
+        return self._depth.decode(raw)
+
+    def decode_kline(self, raw):
+        return self._kline.decode(raw)
+
+    def decode_stream(self, raw):
+        # data stays raw until the stream name tells us which Struct to decode into
+        envelope = self._envelope.decode(raw)
+        stream = envelope.stream
+        if "@depth" in stream:
+            return stream, self._depth.decode(envelope.data)
+        if "@kline" in stream:
+            return stream, self._kline.decode(envelope.data)
+        return stream, self._any.decode(envelope.data)
+
+    @staticmethod
+    def depth_from_dict(d):
+        return JsonDecoder.depth_from_dict(d)
+
+    @staticmethod
+    def kline_from_dict(d):
+        return JsonDecoder.kline_from_dict(d)
+
+
+def get_decoder(preferred: str = None):
+    """Fastest available decoder: msgspec, then orjson, then stdlib json."""
+    if preferred in (None, "msgspec") and msgspec is not None:
+        return MsgspecDecoder()
+    if preferred in (None, "msgspec", "orjson") and orjson is not None:
+        return JsonDecoder(orjson.loads)
+    return JsonDecoder(json.loads)
+
+
+def _synthetic_messages(n=2000, levels=20):
+    """Depth/kline payloads shaped like the live futures streams, for when no recording is given."""
+    rng = random.Random(42)
+    messages, update_id, price = [], 1_000_000, 100_000.0
+    for i in range(n):
+        price += rng.uniform(-5, 5)
+        if i % 10 == 9:
+            messages.append(json.dumps({
+                "e": "kline", "E": 1_750_000_000_000 + i * 100, "s": "BTCUSDT",
+                "k": {"t": 1_750_000_000_000, "T": 1_750_000_059_999, "s": "BTCUSDT", "i": "1m",
+                      "f": 1, "L": 2, "o": f"{price:.1f}", "c": f"{price + 1:.1f}", "h": f"{price + 3:.1f}",
+                      "l": f"{price - 3:.1f}", "v": "12.345", "n": 321, "x": False, "q": "1234567.89",
+                      "V": "6.789", "Q": "678901.23", "B": "0"}}))
+        else:
+            first = update_id + 1
+            update_id += rng.randint(1, 30)
+            messages.append(json.dumps({
+                "e": "depthUpdate", "E": 1_750_000_000_000 + i * 100, "T": 1_750_000_000_000 + i * 100,
+                "s": "BTCUSDT", "U": first, "u": update_id, "pu": first - 1,
+                "b": [[f"{price - j * 0.1:.1f}", f"{rng.uniform(0, 5):.3f}"] for j in range(levels)],
+                "a": [[f"{price + j * 0.1:.1f}", f"{rng.uniform(0, 5):.3f}"] for j in range(levels)]}))
+    return messages
+
+
+def benchmark(messages, repeat=5):
+    """Decode cost per message for each available decoder (best of `repeat` passes).
+
+    Combined-stream envelopes ({"stream", "data"}, as recorded by MultiSymbolDataCollector)
+    are timed through decode_stream, bare payloads through decode_depth / decode_kline.
+    """
+    decoders = [JsonDecoder(json.loads)]
+    if orjson is not None:
+        decoders.append(JsonDecoder(orjson.loads))
+    if msgspec is not None:
+        decoders.append(MsgspecDecoder())
+
+    encoded = [m.encode() if isinstance(m, str) else m for m in messages]
+    kinds = ["stream" if b'"stream"' in m[:20] else "kline" if b'"kline"' in m[:40] else "depth" for m in encoded]
+    results = {}
+    for decoder in decoders:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for raw, kind in zip(encoded, kinds):
+                if kind == "depth":
+                    decoder.decode_depth(raw)
+                elif kind == "stream":
+                    decoder.decode_stream(raw)
+                else:
+                    decoder.decode_kline(raw)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[decoder.name] = best / len(encoded) * 1e6
+    return results
+
+
+if __name__ == "__main__":
+    # python MessageDecoder.py [recorded_messages.txt]  (one raw websocket message per line, bare or combined-stream)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            msgs = [line.rstrip(b"\n") for line in f if line.strip()]
+        print(f"Benchmarking {len(msgs)} recorded messages from {sys.argv[1]}")
+    else:
+        msgs = _synthetic_messages()
+        print(f"Benchmarking {len(msgs)} synthetic messages (pass a recording for real traffic)")
+
+    for name, us in benchmark(msgs).items():
+        print(f"  {name:8s} {us:8.2f} µs/msg")
@@ -0,0 +1,173 @@
+import bisect
+
+
+class BookSide:
+    """One side of the book: a sorted price-key list plus a key -> qty dict.
+
+    Keys are ordered so the best level is always at the end of the list (bids by
+    price, asks by negated price). Finding a level is a binary search; adding or
+    removing one shifts the list behind it, O(n) in the worst case, but near the top
+    of book, where most updates land, that moves only a few entries.
+    """
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self._keys = []
+        self._qty = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def clear(self):
+        self._keys.clear()
+        self._qty.clear()
+
+    def _key(self, price: float):
+        return price if self.is_bid else -price
+
+    def _price(self, key: float):
+        return key if self.is_bid else -key
+
+    def set(self, price: float, qty: float):
+        """Absolute update for one level; qty == 0 removes it. Quantity changes of an existing level are O(1)."""
+        key = self._key(price)
+        if qty == 0:
+            if self._qty.pop(key, None) is not None:
+                del self._keys[bisect.bisect_left(self._keys, key)]
+            return
+        if key not in self._qty:
+            bisect.insort(self._keys, key)
+        self._qty[key] = qty
+
+    def best(self):
+        if not self._keys:
+            return None
+        key = self._keys[-1]
+        return self._price(key), self._qty[key]
+
+    def levels(self, depth: int = None):
+        """(price, qty) pairs, best first."""
+        keys = self._keys if depth is None else self._keys[-depth:]
+        return [(self._price(k), self._qty[k]) for k in reversed(keys)]
+
+    def walk(self, quantity: float):
+        """Average fill price and filled qty for a market order sweeping this side."""
+        cost, filled = 0.0, 0.0
+        for key in reversed(self._keys):
+            px, sz = self._price(key), self._qty[key]
+            take = min(sz, quantity - filled)
+            cost += take * px
+            filled += take
+            if filled >= quantity:
+                break
+        return (cost / filled if filled else None), filled
+
+
+class LocalOrderBook:
+    """Full local book maintained from the futures diff-depth stream.
+
+    Sync rules (Binance USD-M futures):
+      1. buffer stream events until a REST snapshot (lastUpdateId) is loaded
+      2. drop events with u < lastUpdateId
+      3. the first applied event must satisfy U <= lastUpdateId <= u
+      4. afterwards every event's pu must equal the previous event's u, else resync
+    """
+
+    def __init__(self, symbol: str, max_buffer: int = 1000):
+        self.symbol = symbol.upper()
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        self.max_buffer = max_buffer
+        self.last_update_id = None
+        self.event_time = None
+        self.synced = False
+        self._awaiting_first = True
+        self._buffer = []
+
+    def reset(self, pending=()):
+        """Drop the book; `pending` diff events stay buffered for the next snapshot."""
+        self.bids.clear()
+        self.asks.clear()
+        self.last_update_id = None
+        self.synced = False
+        self._awaiting_first = True
+        self._buffer = list(pending)
+
+    def load_snapshot(self, snapshot: dict):
+        """Apply a REST depth snapshot, then replay any buffered diff events."""
+        self.bids.clear()
+        self.asks.clear()
+        for px, qty in snapshot.get("bids", []):
+            self.bids.set(float(px), float(qty))
+        for px, qty in snapshot.get("asks", []):
+            self.asks.set(float(px), float(qty))
+        self.last_update_id = int(snapshot["lastUpdateId"])
+        self.event_time = snapshot.get("E")
+        self._awaiting_first = True
+        self.synced = True
+
+        buffered, self._buffer = self._buffer, []
+        for i, event in enumerate(buffered):
+            if not self.apply_diff(*event):
+                # the failing event is buffered again by reset(); keep the ones after it too,
+                # so the next snapshot can line up with them instead of with the live stream only
+                self._buffer.extend(buffered[i + 1:])
+                return False
+        return True
+
+    def apply_diff(self, first_id: int, final_id: int, prev_final_id: int, bids, asks, event_time=None):
+        """Apply one diff event with pre-parsed (price, qty) floats.
+
+        Returns False when the book is out of sync and needs a fresh snapshot.
+        """
+        if not self.synced:
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.pop(0)
+            self._buffer.append((first_id, final_id, prev_final_id, bids, asks, event_time))
+            return True
+
+        if final_id < self.last_update_id:
+            return True
+
+        if self._awaiting_first:
+            in_sync = first_id <= self.last_update_id <= final_id
+        else:
+            in_sync = prev_final_id == self.last_update_id
+        if not in_sync:
+            self.reset([(first_id, final_id, prev_final_id, bids, asks, event_time)])
+            return False
+        self._awaiting_first = False
+
+        for px, qty in bids:
+            self.bids.set(px, qty)
+        for px, qty in asks:
+            self.asks.set(px, qty)
+        self.last_update_id = final_id
+        self.event_time = event_time
+        return True
+
+    def best_bid(self):
+        best = self.bids.best()
+        return best[0] if best else None
+
+    def best_ask(self):
+        best = self.asks.best()
+        return best[0] if best else None
+
+    def mid_price(self):
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+
+    def walk(self, side: str, quantity: float):
+        """Expected average price for a market order: BUY sweeps asks, SELL sweeps bids."""
+        book_side = self.asks if side.upper() == "BUY" else self.bids
+        return book_side.walk(quantity)
+
+    def depth_snapshot(self, depth: int = 5):
+        return {
+            "bids": self.bids.levels(depth),
+            "asks": self.asks.levels(depth),
+            "timestamp": self.event_time
+        }
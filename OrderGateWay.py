@@ -1,118 +1,282 @@
+import asyncio
 from binance import AsyncClient
+from RequestScheduler import RequestScheduler, PRIORITY_ORDER, PRIORITY_QUERY
+from LatencyTracer import tracer, perf_counter_ns
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
+# Conditional types live on the algo endpoint (/fapi/v1/algoOrder): the response and the
+# ALGO_UPDATE events carry algoId / clientAlgoId / algoStatus instead of orderId / status
+CONDITIONAL_TYPES = ("STOP", "STOP_MARKET", "TAKE_PROFIT", "TAKE_PROFIT_MARKET", "TRAILING_STOP_MARKET")
+ALGO_PARAMS = {"stopPrice": "triggerPrice", "activationPrice": "activatePrice", "newClientOrderId": "clientAlgoId"}
+ALGO_LIVE_STATUSES = ("NEW", "TRIGGERING")
+ALGO_EXECUTED_STATUSES = ("TRIGGERED", "FINISHED")
 
 class BinanceOrderGateway:
-    def __init__(self, client: AsyncClient, symbol: str):
+    def __init__(self, client: AsyncClient, symbol: str, scheduler: RequestScheduler = None):
         self.client = client
         self.symbol = symbol.upper()
+        # Shared with the collector so orders and polls draw on one weight budget
+        self.scheduler = scheduler or RequestScheduler(client)
+
+    async def _submit(self, endpoint, call, weight=1, priority=PRIORITY_QUERY, orders=0):
+        return await self.scheduler.run(endpoint, call, weight=weight, priority=priority, orders=orders)
 
     async def place_order(self, side: str, order_type: str = "MARKET", quantity: float = 0.01,
                           price: float = None, stop_price: float = None, callback_rate: float = None,
-                          reduce_only: bool = False):
+                          reduce_only: bool = False, close_position: bool = False, client_order_id: str = None):
         try:
-            order_type = order_type.upper()
-            side = side.upper()
-
-            if order_type == "MARKET":
-                params = {
-                    "symbol": self.symbol,
-                    "side": side,
-                    "type": "MARKET",
-                    "quantity": quantity
-                }
-
-            elif order_type == "LIMIT":
-                if price is None:
-                    raise ValueError("Price is required for LIMIT order")
-                params = {
-                    "symbol": self.symbol,
-                    "side": side,
-                    "type": "LIMIT",
-                    "timeInForce": "GTC",
-                    "quantity": quantity,
-                    "price": str(price)
-                }
-                print (params)
-            elif order_type == "STOP_MARKET":
-                if stop_price is None:
-                    raise ValueError("stop_price is required for STOP_MARKET order")
-                params = {
-                    "symbol": self.symbol,
-                    "side": side,
-                    "type": "STOP_MARKET",
-                    "stopPrice": str(stop_price),
-                    "quantity": quantity
-                }
-
-            elif order_type == "STOP":  # stop-limit
-                if price is None or stop_price is None:
-                    raise ValueError("Both price and stop_price are required for STOP order")
-                params = {
-                    "symbol": self.symbol,
-                    "side": side,
-                    "type": "STOP",
-                    "timeInForce": "GTC",
-                    "quantity": quantity,
-                    "price": str(price),
-                    "stopPrice": str(stop_price)
-                }
-
-            elif order_type == "TRAILING_STOP_MARKET":
-                if callback_rate is None:
-                    raise ValueError("callback_rate is required for TRAILING_STOP_MARKET order")
-                params = {
-                    "symbol": self.symbol,
-                    "side": side,
-                    "type": "TRAILING_STOP_MARKET",
-                    "quantity": quantity,
-                    "callbackRate": str(callback_rate)
-                }
-                if stop_price is not None:
-                    params["activationPrice"] = str(stop_price)
-
-            else:
-                raise ValueError(f"Unsupported order type: {order_type}")
-
-            if reduce_only:
-                params["reduceOnly"] = True
-
-            return await self.client.futures_create_order(**params)
+            params = self._build_order_params(side, order_type, quantity, price, stop_price,
+                                              callback_rate, reduce_only, close_position, client_order_id)
+            if params["type"] in CONDITIONAL_TYPES:
+                # returns the algo order; client_order_id becomes its clientAlgoId
+                return await self._place_algo(params)
+            start = perf_counter_ns()
+            response = await self._submit("order", lambda: self.client.futures_create_order(**params),
+                                          priority=PRIORITY_ORDER, orders=1)
+            # send -> ack, including any wait for rate-limit budget
+            tracer.since("gateway.place_order", start)
+            if response and "orderId" in response:
+                tracer.begin(("fill", response["orderId"]))
+            return response
+
+        except Exception as e:
+            logger.error("❌ Failed to place order: %s", e)
+
+    def _build_order_params(self, side: str, order_type: str = "MARKET", quantity: float = 0.01,
+                            price: float = None, stop_price: float = None, callback_rate: float = None,
+                            reduce_only: bool = False, close_position: bool = False, client_order_id: str = None):
+        order_type = order_type.upper()
+        side = side.upper()
+
+        if order_type == "MARKET":
+            params = {
+                "symbol": self.symbol,
+                "side": side,
+                "type": "MARKET",
+                "quantity": quantity
+            }
+
+        elif order_type == "LIMIT":
+            if price is None:
+                raise ValueError("Price is required for LIMIT order")
+            params = {
+                "symbol": self.symbol,
+                "side": side,
+                "type": "LIMIT",
+                "timeInForce": "GTC",
+                "quantity": quantity,
+                "price": str(price)
+            }
+            logger.debug("order params %s", params)
+        elif order_type in ("STOP_MARKET", "TAKE_PROFIT_MARKET"):
+            if stop_price is None:
+                raise ValueError(f"stop_price is required for {order_type} order")
+            params = {
+                "symbol": self.symbol,
+                "side": side,
+                "type": order_type,
+                "stopPrice": str(stop_price),
+                "quantity": quantity
+            }
+            if close_position:
+                # closes whatever position is open when triggered; quantity and reduceOnly are not allowed
+                del params["quantity"]
+                params["closePosition"] = True
+
+        elif order_type == "STOP":  # stop-limit
+            if price is None or stop_price is None:
+                raise ValueError("Both price and stop_price are required for STOP order")
+            params = {
+                "symbol": self.symbol,
+                "side": side,
+                "type": "STOP",
+                "timeInForce": "GTC",
+                "quantity": quantity,
+                "price": str(price),
+                "stopPrice": str(stop_price)
+            }
+
+        elif order_type == "TRAILING_STOP_MARKET":
+            if callback_rate is None:
+                raise ValueError("callback_rate is required for TRAILING_STOP_MARKET order")
+            params = {
+                "symbol": self.symbol,
+                "side": side,
+                "type": "TRAILING_STOP_MARKET",
+                "quantity": quantity,
+                "callbackRate": str(callback_rate)
+            }
+            if stop_price is not None:
+                params["activationPrice"] = str(stop_price)
+
+        else:
+            raise ValueError(f"Unsupported order type: {order_type}")
+
+        if reduce_only and not close_position:
+            params["reduceOnly"] = True
+        if client_order_id:
+            params["newClientOrderId"] = client_order_id
+        return params
+
+    @staticmethod
+    def _algo_params(params: dict):
+        """/fapi/v1/order params -> /fapi/v1/algoOrder params."""
+        algo = {"algoType": "CONDITIONAL"}
+        for key, value in params.items():
+            algo[ALGO_PARAMS.get(key, key)] = str(value).lower() if isinstance(value, bool) else value
+        return algo
 
+    async def _place_algo(self, params: dict):
+        algo_params = self._algo_params(params)
+        start = perf_counter_ns()
+        response = await self._submit("algoOrder", lambda: self.client.futures_create_algo_order(**algo_params),
+                                      priority=PRIORITY_ORDER, orders=1)
+        tracer.since("gateway.place_algo_order", start)
+        return response
+
+    async def _place_algo_result(self, params: dict):
+        """_place_algo with place_orders_batch's result mapping."""
+        try:
+            response = await self._place_algo(params)
         except Exception as e:
-            print("❌ Failed to place order:", str(e))
+            logger.error("❌ Failed to place %s order: %s", params["type"], e)
+            return {"code": getattr(e, "code", None), "msg": str(e)}
+        if isinstance(response, dict) and ("algoId" in response or "code" in response):
+            return response
+        return {"code": None, "msg": str(response)}
+
+    async def place_orders_batch(self, orders: list):
+        """Place several orders via batchOrders (up to 5 per request).
+
+        `orders` is a list of place_order keyword dicts. Returns one entry per input,
+        in order: the exchange order dict, or {"code", "msg"} if that order was rejected.
+        batchOrders does not take conditional types; those are placed concurrently on the
+        algo endpoint and their entry is the algo order dict (algoId).
+        """
+        results = []
+        for start in range(0, len(orders), 5):
+            chunk = orders[start:start + 5]
+            batch, slots, conditional = [], [], []
+            chunk_results = [None] * len(chunk)
+            for i, order in enumerate(chunk):
+                try:
+                    params = self._build_order_params(**order)
+                except ValueError as e:
+                    chunk_results[i] = {"code": None, "msg": str(e)}
+                    continue
+                if params["type"] in CONDITIONAL_TYPES:
+                    conditional.append((i, params))
+                    continue
+                # batchOrders is sent as a JSON array of strings
+                batch.append({k: (str(v).lower() if isinstance(v, bool) else str(v)) for k, v in params.items()})
+                slots.append(i)
+
+            if batch:
+                try:
+                    response = await self._submit("batchOrders",
+                                                  lambda: self.client.futures_place_batch_order(batchOrders=batch),
+                                                  weight=5, priority=PRIORITY_ORDER, orders=len(batch))
+                except Exception as e:
+                    logger.error("❌ Failed to place batch orders: %s", e)
+                    response = [{"code": None, "msg": str(e)}] * len(batch)
+                if not isinstance(response, list) or len(response) != len(batch):
+                    # a request-level error comes back as one {"code", "msg"} dict, not one entry per order
+                    logger.error("❌ Unexpected batch order response: %s", response)
+                    error = response if isinstance(response, dict) and "code" in response else {"code": None, "msg": str(response)}
+                    response = [error] * len(batch)
+                for slot, result in zip(slots, response):
+                    if isinstance(result, dict) and "orderId" in result:
+                        tracer.begin(("fill", result["orderId"]))
+                    elif not (isinstance(result, dict) and "code" in result):
+                        result = {"code": None, "msg": str(result)}
+                    chunk_results[slot] = result
+
+            if conditional:
+                placed = await asyncio.gather(*(self._place_algo_result(params) for _, params in conditional))
+                for (slot, _), result in zip(conditional, placed):
+                    chunk_results[slot] = result
+
+            results.extend(chunk_results)
+        return results
+
+    async def cancel_orders_batch(self, order_ids: list):
+        """Cancel several orders in one round trip per 10 ids. Same result mapping as place_orders_batch."""
+        results = []
+        for start in range(0, len(order_ids), 10):
+            chunk = [int(order_id) for order_id in order_ids[start:start + 10]]
+            try:
+                # a plain list: the client encodes orderidlist itself, so the signature matches what is sent
+                response = await self._submit("cancelBatchOrders", lambda: self.client.futures_cancel_orders(
+                    symbol=self.symbol, orderidlist=chunk), priority=PRIORITY_ORDER)
+            except Exception as e:
+                logger.error(f"❌ Failed to cancel orders {chunk}: %s", e)
+                response = [{"code": None, "msg": str(e)}] * len(chunk)
+            if not isinstance(response, list) or len(response) != len(chunk):
+                logger.error("❌ Unexpected batch cancel response: %s", response)
+                error = response if isinstance(response, dict) and "code" in response else {"code": None, "msg": str(response)}
+                response = [error] * len(chunk)
+            results.extend(result if isinstance(result, dict) and ("orderId" in result or "code" in result)
+                           else {"code": None, "msg": str(result)} for result in response)
+        return results
+
+    async def cancel_algo_orders(self, algo_ids: list):
+        """Cancel conditional orders by algoId, concurrently (the algo endpoint has no batch cancel).
+
+        Returns one entry per id: the exchange response, or {"code", "msg"} if that cancel failed.
+        """
+        async def cancel(algo_id):
+            try:
+                return await self._submit("cancelAlgoOrder", lambda: self.client.futures_cancel_algo_order(algoId=algo_id),
+                                          priority=PRIORITY_ORDER)
+            except Exception as e:
+                logger.error(f"❌ Failed to cancel algo order {algo_id}: %s", e)
+                return {"code": getattr(e, "code", None), "msg": str(e)}
+        return list(await asyncio.gather(*(cancel(int(algo_id)) for algo_id in algo_ids)))
 
     async def cancel_all_orders(self):
         try:
-            return await self.client.futures_cancel_all_open_orders(symbol=self.symbol)
+            return await self._submit("allOpenOrders", lambda: self.client.futures_cancel_all_open_orders(symbol=self.symbol),
+                                      priority=PRIORITY_ORDER)
         except Exception as e:
-            print("❌ Failed to cancel orders:", str(e))
+            logger.error("❌ Failed to cancel orders: %s", e)
 
     async def get_open_orders(self):
         try:
-            return await self.client.futures_get_open_orders(symbol=self.symbol)
+            return await self._submit("openOrders", lambda: self.client.futures_get_open_orders(symbol=self.symbol))
+        except Exception as e:
+            logger.error("❌ Failed to get open orders: %s", e)
+
+    async def get_open_algo_orders(self):
+        """Open conditional orders of the symbol; None if the request failed."""
+        try:
+            return await self._submit("openAlgoOrders", lambda: self.client.futures_get_open_algo_orders(symbol=self.symbol))
         except Exception as e:
-            print("❌ Failed to get open orders:", str(e))
+            logger.error("❌ Failed to get open algo orders: %s", e)
 
     async def get_order_status(self, order_id: int):
         try:
-            return await self.client.futures_get_order(symbol=self.symbol, orderId=order_id)
+            return await self._submit("getOrder", lambda: self.client.futures_get_order(symbol=self.symbol, orderId=order_id))
         except Exception as e:
-            print(f"❌ Failed to get status for order {order_id}:", str(e))
+            logger.error(f"❌ Failed to get status for order {order_id}: %s", e)
 
     async def cancel_order(self, order_id: int):
         try:
-            return await self.client.futures_cancel_order(symbol=self.symbol, orderId=order_id)
+            return await self._submit("cancelOrder", lambda: self.client.futures_cancel_order(symbol=self.symbol, orderId=order_id),
+                                      priority=PRIORITY_ORDER)
         except Exception as e:
-            print(f"❌ Failed to cancel order {order_id}:", str(e))
+            logger.error(f"❌ Failed to cancel order {order_id}: %s", e)
 
 
     async def get_income_history(self, limit: int = 100, income_type: str = "REALIZED_PNL"):
 
         try:
-            return await self.client.futures_income_history(
+            return await self._submit("income", lambda: self.client.futures_income_history(
                 symbol=self.symbol,
                 limit=limit,
                 incomeType=income_type
-            )
+            ), weight=30)
         except Exception as e:
-            print(f"❌ Failed to get income history:", str(e))
+            logger.error(f"❌ Failed to get income history: %s", e)
             return []
@@ -0,0 +1,100 @@
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from OrderStore import COLUMNS
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
+
+class OrderJournal:
+    """Append-only JSON-lines log of order state changes next to the orders.csv snapshot.
+
+    Every change is one line holding the full order record; the last line per orderId wins.
+    Lines are buffered and written + fsynced by flush(), so a crash loses at most one
+    flush interval. compact() folds the journal into the CSV snapshot and truncates it.
+    """
+
+    def __init__(self, snapshot_path, journal_path=None, compact_every: int = 10_000):
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = Path(journal_path) if journal_path else self.snapshot_path.with_suffix(".journal.jsonl")
+        self.compact_every = compact_every  # journal lines before a compaction is due
+        self._pending = []
+        self._lines = self._count_lines()
+        self._file = None
+
+    def _count_lines(self):
+        if not self.journal_path.exists():
+            return 0
+        with open(self.journal_path, "rb") as f:
+            return sum(1 for _ in f)
+
+    @property
+    def compaction_due(self):
+        return self._lines >= self.compact_every
+
+    def record(self, fields: dict):
+        self._pending.append(json.dumps(fields, default=str))
+
+    def flush(self):
+        """Write the buffered lines and fsync; cost is proportional to the changes only."""
+        if not self._pending:
+            return
+        lines, self._pending = self._pending, []
+        if self._file is None:
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+        self._file.write("\n".join(lines) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._lines += len(lines)
+
+    def _read_journal(self):
+        rows = []
+        if not self.journal_path.exists():
+            return rows
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # a torn last line from a crash mid-write
+                    logger.warning(f"⚠️ Skipping unreadable journal line: {line[:80]!r}")
+        return rows
+
+    def load(self):
+        """Snapshot plus journal tail, latest state per orderId."""
+        frames = []
+        if self.snapshot_path.exists():
+            frames.append(pd.read_csv(self.snapshot_path))
+        tail = self._read_journal()
+        if tail:
+            frames.append(pd.DataFrame(tail, columns=COLUMNS))
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        combined = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        # rows without an orderId cannot be told apart, so they are all kept
+        latest = ~combined.duplicated(subset=["orderId"], keep="last") | combined["orderId"].isna()
+        return combined[latest].reset_index(drop=True)
+
+    def compact(self):
+        """Fold the journal into the snapshot (written atomically), then truncate the journal."""
+        self.flush()
+        combined = self.load()
+        tmp_path = self.snapshot_path.with_suffix(".csv.tmp")
+        combined.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.snapshot_path)
+        # replaying the journal twice is harmless, so a crash before this point loses nothing
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        open(self.journal_path, "w").close()
+        self._lines = 0
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
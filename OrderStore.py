@@ -0,0 +1,131 @@
+import itertools
+
+import pandas as pd
+
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
+COLUMNS = [
+    "orderId", "symbol", "side", "positionSide", "type", "status",
+    "origQty", "executedQty", "price", "avgPrice",
+    "realizedPnl", "updateTime", "order_date"
+]
+FLOAT_COLUMNS = {"origQty", "executedQty", "price", "avgPrice", "realizedPnl"}
+INT_COLUMNS = {"orderId", "updateTime"}
+
+
+def cast(col, value):
+    """Exchange responses carry numbers as strings; store them typed."""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if value == "" and (col in FLOAT_COLUMNS or col in INT_COLUMNS):
+        return None
+    try:
+        if col in FLOAT_COLUMNS:
+            return float(value)
+        if col in INT_COLUMNS:
+            return int(float(value))
+    except (TypeError, ValueError) as e:
+        logger.warning(f"⚠️ Cast failed for {col}: {value} | Error: {e}")
+    return value
+
+
+def missing_id(order_id):
+    """True for an order without an orderId: None, or NaN / blank after a CSV or journal round trip."""
+    return order_id is None or order_id == "" or bool(pd.isna(order_id))
+
+
+class OrderRecord:
+    __slots__ = tuple(COLUMNS)
+
+    def __init__(self, fields: dict):
+        for col in COLUMNS:
+            setattr(self, col, cast(col, fields.get(col)))
+
+    def values(self):
+        return tuple(getattr(self, col) for col in COLUMNS)
+
+    def to_dict(self):
+        return {col: getattr(self, col) for col in COLUMNS}
+
+
+class OrderStore:
+    """Orders keyed by orderId, with a secondary index on status.
+
+    Insert, update and lookup are O(1); a DataFrame is only built on demand (to_frame).
+    """
+
+    def __init__(self):
+        self._orders = {}
+        self._by_status = {}
+        self._anonymous = itertools.count()
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __iter__(self):
+        return iter(list(self._orders.values()))
+
+    def __contains__(self, order_id):
+        return self._key(order_id) in self._orders
+
+    def _key(self, order_id):
+        if missing_id(order_id):
+            return ("no-id", next(self._anonymous))
+        return int(order_id)
+
+    def _index(self, key, record):
+        self._by_status.setdefault(record.status, {})[key] = None
+
+    def _unindex(self, key, record):
+        keys = self._by_status.get(record.status)
+        if keys is not None:
+            keys.pop(key, None)
+
+    def get(self, order_id):
+        return self._orders.get(self._key(order_id)) if not missing_id(order_id) else None
+
+    def put(self, fields: dict):
+        """Insert or replace an order (the newest copy moves to the end, like the old concat)."""
+        key = self._key(fields.get("orderId"))
+        old = self._orders.pop(key, None)
+        if old is not None:
+            self._unindex(key, old)
+        record = OrderRecord(fields)
+        self._orders[key] = record
+        self._index(key, record)
+        return record
+
+    def update(self, order_id, fields: dict):
+        """Update only the given columns of an existing order."""
+        key = self._key(order_id)
+        record = self._orders.get(key)
+        if record is None:
+            return None
+        self._unindex(key, record)
+        for col, value in fields.items():
+            if col in OrderRecord.__slots__:
+                setattr(record, col, cast(col, value))
+        self._index(key, record)
+        return record
+
+    def remove(self, order_id):
+        key = self._key(order_id)
+        record = self._orders.pop(key, None)
+        if record is not None:
+            self._unindex(key, record)
+        return record
+
+    def with_status(self, *statuses):
+        return [self._orders[k] for s in statuses for k in list(self._by_status.get(s, ()))]
+
+    def to_frame(self):
+        return pd.DataFrame([r.values() for r in self._orders.values()], columns=COLUMNS)
+
+    @classmethod
+    def from_frame(cls, df):
+        store = cls()
+        for row in df.to_dict(orient="records"):
+            store.put(row)
+        return store
@@ -0,0 +1,195 @@
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from Backtester import Backtester, load_candles, _synthetic_candles
+from FeatureEngine import WEEKDAYS
+
+# Values tried for each Signal attribute; alpha / l1_ratio go to Signal.sgd
+DEFAULT_GRID = {
+    "ADX_THRESHOLD": [5, 10, 15, 20],
+    "VWAP_PERIOD": [10, 15, 20],
+    "ENTROPY_WINDOW": [5, 10, 20],
+    "BUY_PROB": [0.6, 0.7, 0.8],
+    "SELL_PROB": [0.2, 0.3, 0.4],
+    "alpha": [1e-4, 1e-3, 1e-2],
+    "l1_ratio": [0.15, 0.5],
+}
+FEATURE_PARAMS = ("ENTROPY_WINDOW", "VWAP_PERIOD")  # the only ones that change the feature matrix
+SGD_PARAMS = ("alpha", "l1_ratio")
+FEATURE_COLUMNS = ["bar", "close", "ofi", "entropy", "vwap_dev", "adx", "hour", "weekday"]
+
+
+def expand_grid(grid: dict):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def feature_key(params: dict):
+    return "features_" + "_".join(f"{params[k]}" for k in FEATURE_PARAMS)
+
+
+class SharedArrays:
+    """numpy arrays published once in multiprocessing.shared_memory; workers map them by name, no pickling."""
+
+    def __init__(self):
+        self.segments = []
+        self.specs = {}
+
+    def publish(self, key: str, array: np.ndarray):
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        self.segments.append(shm)
+        self.specs[key] = (shm.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for shm in self.segments:
+            shm.close()
+            shm.unlink()
+        self.segments, self.specs = [], {}
+
+    @staticmethod
+    def attach(specs: dict):
+        """Map published arrays read-only; returns (arrays, segments) - keep the segments alive."""
+        arrays, segments = {}, []
+        for key, (name, shape, dtype) in specs.items():
+            # pool workers share the parent's resource tracker, which unlinks only when the parent does
+            shm = shared_memory.SharedMemory(name=name)
+            view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            view.flags.writeable = False
+            arrays[key] = view
+            segments.append(shm)
+        return arrays, segments
+
+
+def build_feature_matrix(backtester: Backtester, candles: pd.DataFrame, params: dict):
+    """FEATURE_COLUMNS matrix (dropna'd rows) for one ENTROPY_WINDOW / VWAP_PERIOD pair."""
+    for key in FEATURE_PARAMS:
+        setattr(backtester.signal, key, params[key])
+    feats = backtester.features(candles)
+    return np.column_stack([
+        feats["bar"].to_numpy(dtype=float), feats["close"].to_numpy(dtype=float),
+        feats["ofi"].to_numpy(dtype=float), feats["entropy"].to_numpy(dtype=float),
+        feats["vwap_dev"].to_numpy(dtype=float), feats["adx"].to_numpy(dtype=float),
+        feats["timestamp"].dt.hour.to_numpy(dtype=float),
+        feats["weekday"].map(WEEKDAYS.index).to_numpy(dtype=float),
+    ])
+
+
+# ---- worker side -------------------------------------------------------------
+_worker = {}
+
+
+def _init_worker(specs):
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)  # one core per worker; BLAS threads would fight the pool
+    except ImportError:
+        pass
+    arrays, segments = SharedArrays.attach(specs)
+    _worker.update(arrays=arrays, segments=segments, backtester=Backtester())
+
+
+def _run_one(params: dict):
+    arrays, bt = _worker["arrays"], _worker["backtester"]
+    signal = bt.signal
+    for key, value in params.items():
+        if key in SGD_PARAMS:
+            signal.sgd.set_params(**{key: value})
+        else:
+            setattr(signal, key, value)
+
+    m = arrays[feature_key(params)]
+    col = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+    blocked = m[:, col["adx"]] <= signal.ADX_THRESHOLD
+    if signal.TRADE_HOURS_UTC:
+        blocked |= ~np.isin(m[:, col["hour"]], signal.TRADE_HOURS_UTC)
+    if signal.EXCLUDE_WEEKDAYS:
+        blocked |= np.isin(m[:, col["weekday"]], [WEEKDAYS.index(d) for d in signal.EXCLUDE_WEEKDAYS])
+
+    started = time.perf_counter()
+    raw = m[:, [col[f] for f in signal.FEATURES]]
+    signals, probs = bt.signals_from_arrays(m[:, col["close"]], raw, blocked)
+    ohlc = arrays["ohlc"]
+    trades = bt.simulate(ohlc[:, 0], ohlc[:, 1], ohlc[:, 2], ohlc[:, 3], arrays["timestamp"],
+                         m[:, col["bar"]].astype(np.int64), signals, probs)
+    stats = bt.summary(trades, len(ohlc), time.perf_counter() - started)
+    exits = stats.pop("exits", {})
+    return {**params, **stats, **{f"exits_{k}": v for k, v in exits.items()}}
+
+
+# ---- driver ------------------------------------------------------------------
+def run_sweep(candles: pd.DataFrame, grid: dict = None, workers: int = None, metric: str = "return_pct",
+              out_path="SweepResults/sweep_results.csv"):
+    """Backtest every grid combination in a process pool and write the ranked results table."""
+    grid = grid or DEFAULT_GRID
+    tasks = expand_grid(grid)
+    workers = workers or os.cpu_count()
+    started = time.perf_counter()
+
+    shared = SharedArrays()
+    try:
+        shared.publish("ohlc", candles[["open", "high", "low", "close"]].to_numpy(dtype=float))
+        shared.publish("timestamp", candles["timestamp"].to_numpy(dtype="datetime64[ns]"))
+        builder = Backtester()
+        for params in {feature_key(t): t for t in tasks}.values():
+            shared.publish(feature_key(params), build_feature_matrix(builder, candles, params))
+        prepared = time.perf_counter()
+
+        chunksize = max(1, len(tasks) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.specs,)) as pool:
+            rows = list(pool.map(_run_one, tasks, chunksize=chunksize))
+    finally:
+        shared.close()
+
+    results = pd.DataFrame(rows)
+    if metric in results:
+        results = results.sort_values([metric, "trades"], ascending=[False, False], na_position="last")
+    results.insert(0, "rank", range(1, len(results) + 1))
+    if out_path:
+        out_path = Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        results.to_csv(out_path, index=False)
+
+    elapsed = time.perf_counter() - started
+    print(f"📊 {len(tasks)} runs on {workers} workers in {elapsed:.1f}s "
+          f"(features {prepared - started:.1f}s, {len(tasks) / max(elapsed - (prepared - started), 1e-9):.1f} runs/s)")
+    return results.reset_index(drop=True)
+
+
+def scaling_check(candles, grid, worker_counts=(1, 2, 4, 8, 16, 32)):
+    """Runs/s per worker count, to confirm the pool scales with cores."""
+    rates = {}
+    for workers in worker_counts:
+        if workers > os.cpu_count():
+            break
+        started = time.perf_counter()
+        run_sweep(candles, grid, workers=workers, out_path=None)
+        rates[workers] = len(expand_grid(grid)) / (time.perf_counter() - started)
+    base = rates.get(1)
+    for workers, rate in rates.items():
+        speedup = f" (x{rate / base:.1f})" if base else ""
+        print(f"  {workers:3d} workers {rate:8.2f} runs/s{speedup}")
+    return rates
+
+
+if __name__ == "__main__":
+    # python ParameterSweep.py [Candles/Candles.csv | Candles/archive | synthetic] [workers] [scaling]
+    source = sys.argv[1] if len(sys.argv) > 1 else "Candles/Candles.csv"
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    data = _synthetic_candles(60 * 24 * 30) if source == "synthetic" else load_candles(source)
+    print(f"Sweeping {len(expand_grid(DEFAULT_GRID))} combinations over {len(data)} bars from {source}")
+    if len(sys.argv) > 3 and sys.argv[3] == "scaling":
+        small = dict(DEFAULT_GRID, alpha=[1e-3], l1_ratio=[0.15], SELL_PROB=[0.3])
+        scaling_check(data, small)
+    else:
+        ranked = run_sweep(data, workers=n_workers)
+        print(ranked.head(10).to_string(index=False))
@@ -7,6 +7,12 @@ import asyncio
 from datetime import datetime, timezone
 import datetime
 from CandlestickSignalStorageAndTrade import *
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
+AFTERCARE_PREFIX = "ac-"  # clientAlgoId prefix of the exit (algo) orders placed by PositionAfterCare
+AFTERCARE_LEGS = {"stop": "STOP_MARKET", "take_profit": "TAKE_PROFIT_MARKET", "trailing": "TRAILING_STOP_MARKET"}
 
 class PositionAfterCare:
 
@@ -22,14 +28,171 @@ class PositionAfterCare:
         self.TRAIL_START_ROI = 4.0  #4.0
         self.TRAIL_GIVEBACK = 1.25  #1.25
         self.SYMBOL = 'BTCUSDT'
+        # 'exchange': SL / TP / trailing rest on the exchange as reduce-only orders and the loop only verifies;
+        # 'local': the loop checks ROI every CHECK_INTERVAL and closes with a MARKET order
+        self.EXIT_MODE = 'exchange'
+        self.CHECK_INTERVAL = 5  # seconds
+        self.VERIFY_SLACK_ROI = 1.0  # ROI points past the SL / TP level before an exchange exit counts as missed
+        self.MAX_PLACE_ATTEMPTS = 3  # placement rounds per position; past that only the verification remains
+        self.resident_orders = {}  # leg -> latest algo order dict
+        self._resident_key = None  # (side, quantity, entry price) the resident orders were placed for
+        self._place_attempts = 0
 
     async def start(self):
-        print("[PositionAfterCare] Monitoring started.")
+        logger.info(f"[PositionAfterCare] Monitoring started ({self.EXIT_MODE} exits).")
+        if self.EXIT_MODE == 'exchange':
+            self.MARKETDATA.add_algo_order_listener(self._on_algo_order_event)
         asyncio.create_task(self.monitor_sl_tp_trailing())
 
+    def exit_levels(self, entry_price: float, side: str):
+        """The ROI rules as exchange trigger prices for a position entered at entry_price.
+
+        ROI is on margin, so a price move is ROI / LEVERAGE. The trailing callbackRate (in %)
+        is clamped to the exchange's 0.1 - 5 range, which widens a small TRAIL_GIVEBACK.
+        """
+        sign = 1 if side == 'LONG' else -1
+        return {
+            'stop': round(entry_price * (1 - sign * self.STOP_LOSS_PCT), 1),
+            'take_profit': round(entry_price * (1 + sign * self.TAKE_PROFIT_PCT), 1),
+            'trailing': round(entry_price * (1 + sign * self.TRAIL_START_ROI / 100 / self.LEVERAGE), 1),
+            'callback_rate': round(min(max(self.TRAIL_GIVEBACK / self.LEVERAGE, 0.1), 5.0), 1),
+        }
+
+    def _on_algo_order_event(self, order):
+        if not str(order.get('clientAlgoId') or '').startswith(AFTERCARE_PREFIX):
+            return
+        for leg, placed in self.resident_orders.items():
+            if placed.get('algoId') == order['algoId']:
+                self.resident_orders[leg] = order
+                if order['algoStatus'] in ALGO_EXECUTED_STATUSES and placed.get('algoStatus') not in ALGO_EXECUTED_STATUSES:
+                    logger.info(f"[EXCHANGE EXIT] {leg} triggered at {order.get('triggerPrice')}")
+                    self.storage.update_signal(aftercare="C")
+
+    async def _open_resident_orders(self):
+        """Live exit orders on the exchange, ours or left by a previous run; None if the query failed."""
+        orders = await self.gateway.get_open_algo_orders()
+        if orders is None:
+            return None
+        return [o for o in orders if o.get('symbol') == self.SYMBOL
+                and str(o.get('clientAlgoId') or '').startswith(AFTERCARE_PREFIX)
+                and o.get('algoStatus', 'NEW') in ALGO_LIVE_STATUSES]
+
+    async def _cancel_resident_orders(self):
+        """Cancel every live exit order; False if the exchange could not be asked which are live."""
+        open_orders = await self._open_resident_orders()
+        if open_orders is None:
+            return False
+        if open_orders:
+            await self.gateway.cancel_algo_orders([o['algoId'] for o in open_orders])
+        self.resident_orders = {}
+        return True
+
+    def _leg_of(self, order, close_side, levels):
+        """The leg a live exit order serves at the current levels, or None."""
+        for leg, order_type in AFTERCARE_LEGS.items():
+            price = order.get('activatePrice') if leg == 'trailing' else order.get('triggerPrice')
+            if order.get('orderType') == order_type and order.get('side') == close_side \
+                    and float(price or 0) == levels[leg]:
+                return leg
+        return None
+
+    async def _place_resident_orders(self, side: str, quantity: float, entry_price: float, legs):
+        levels = self.exit_levels(entry_price, side)
+        if levels['callback_rate'] != round(self.TRAIL_GIVEBACK / self.LEVERAGE, 1):
+            logger.warning(f"[PositionAfterCare] Trailing callback {self.TRAIL_GIVEBACK / self.LEVERAGE:.3f}% "
+                           f"clamped to {levels['callback_rate']}% (ROI giveback "
+                           f"{levels['callback_rate'] * self.LEVERAGE:.2f}% instead of {self.TRAIL_GIVEBACK}%)")
+        close_side = 'SELL' if side == 'LONG' else 'BUY'
+        stamp = int(time.time() * 1000)
+        # conditional orders go one by one to the algo endpoint; batchOrders does not take them
+        results = await asyncio.gather(*(
+            self.gateway.place_order(side=close_side, order_type=AFTERCARE_LEGS[leg], quantity=quantity,
+                                     stop_price=levels[leg],
+                                     callback_rate=levels['callback_rate'] if leg == 'trailing' else None,
+                                     reduce_only=True, client_order_id=f"{AFTERCARE_PREFIX}{leg}-{stamp}")
+            for leg in legs
+        ))
+        for leg, result in zip(legs, results):
+            if result and 'algoId' in result:
+                self.resident_orders[leg] = {'algoStatus': 'NEW', **result}  # accepted means live
+            else:
+                logger.error(f"❌ [PositionAfterCare] {leg} order rejected: {result}")
+
+    async def _exchange_step(self):
+        """Keep the resident exit orders in line with the position, then verify they did their job."""
+        quantity = round(abs(float(self.MARKETDATA.positions or 0)), 3)
+        if not quantity:
+            if self._resident_key is not None or self.resident_orders:
+                if not await self._cancel_resident_orders():
+                    return  # tried again on the next step
+            self._resident_key = None
+            self.current_trade = None
+            return
+
+        side, entry_price = self.MARKETDATA.side, float(self.MARKETDATA.entryPrice or 0)
+        if side is None or entry_price <= 0:
+            return
+        key = (side, quantity, entry_price)
+        if key != self._resident_key:
+            # a new or resized position: reduce-only quantities and levels both change
+            if not await self._cancel_resident_orders():
+                return
+            self._resident_key = key
+            self._place_attempts = 0
+            missing = list(AFTERCARE_LEGS)
+        else:
+            missing = [leg for leg in AFTERCARE_LEGS
+                       if self.resident_orders.get(leg, {}).get('algoStatus') not in ALGO_LIVE_STATUSES]
+            executed = any(o.get('algoStatus') in ALGO_EXECUTED_STATUSES for o in self.resident_orders.values())
+            if missing and not executed and self._place_attempts < self.MAX_PLACE_ATTEMPTS:
+                # ask the exchange before placing again: a leg may be live although our view of it is not
+                open_orders = await self._open_resident_orders()
+                if open_orders is None:
+                    missing = []
+                else:
+                    close_side = 'SELL' if side == 'LONG' else 'BUY'
+                    levels = self.exit_levels(entry_price, side)
+                    for order in open_orders:
+                        leg = self._leg_of(order, close_side, levels)
+                        if leg in missing:
+                            self.resident_orders[leg] = order
+                            missing.remove(leg)
+            else:
+                missing = []
+
+        if missing:
+            self._place_attempts += 1
+            await self._place_resident_orders(side, quantity, entry_price, missing)
+            if self._place_attempts == self.MAX_PLACE_ATTEMPTS and \
+                    any(self.resident_orders.get(leg, {}).get('algoStatus') not in ALGO_LIVE_STATUSES for leg in missing):
+                logger.error(f"❌ [PositionAfterCare] Exit orders still missing after {self._place_attempts} attempts, "
+                             f"relying on the ROI verification below")
+
+        # Verification only: a position still open well past the SL / TP level means the exit did not fire
+        margin = quantity * entry_price / self.LEVERAGE
+        roi = float(self.MARKETDATA.unRealizedProfit or 0) / margin * 100
+        sl_roi = -(self.STOP_LOSS_PCT * 100 * self.LEVERAGE)
+        tp_roi = self.TAKE_PROFIT_PCT * 100 * self.LEVERAGE
+        missed = ('stop' if roi <= sl_roi - self.VERIFY_SLACK_ROI
+                  else 'take_profit' if roi >= tp_roi + self.VERIFY_SLACK_ROI else None)
+        if missed is not None:
+            logger.warning(f"⚠️ [PositionAfterCare] ROI={roi:.2f}% is past the {missed} level but the position "
+                           f"is still open, closing with a MARKET order")
+            await self.execution.execute_order(symbol=self.SYMBOL, side='SELL' if side == 'LONG' else 'BUY',
+                                               quantity=quantity, exec_type="MARKET")
+            self.storage.update_signal(aftercare="C")
+
     #### Risk management - for trailing -> position management.
     async def monitor_sl_tp_trailing(self):
         while True:
+            if self.EXIT_MODE == 'exchange':
+                try:
+                    await self._exchange_step()
+                except Exception as e:
+                    logger.error(f"[PositionAfterCare] Error: {e}")
+                await asyncio.sleep(self.CHECK_INTERVAL)
+                continue
+
             if not self.MARKETDATA.positions:
                 self.current_trade = None
             elif self.current_trade == None:
@@ -54,12 +217,12 @@ class PositionAfterCare:
                     if roi >= self.TRAIL_START_ROI:
                         self.current_trade['trailing_active'] = True
                         self.current_trade['peak_roi'] = roi
-                        print(f"[TRAILING STARTED] Trailing stop activated at ROI={roi:.2f}% (threshold: {self.TRAIL_START_ROI:.2f}%)")
+                        logger.info(f"[TRAILING STARTED] Trailing stop activated at ROI={roi:.2f}% (threshold: {self.TRAIL_START_ROI:.2f}%)")
                 else:
                     if roi > self.current_trade['peak_roi']:
                         self.current_trade['peak_roi'] = roi
                     if roi < self.current_trade['peak_roi'] - self.TRAIL_GIVEBACK:
-                        print(
+                        logger.info(
                             f"[TRAILING STOP] Trailing stop hit! ROI={roi:.2f}% (peak was {self.current_trade['peak_roi']:.2f}%)")
 
                         if side=='LONG':
@@ -79,7 +242,7 @@ class PositionAfterCare:
                 tp_roi = self.TAKE_PROFIT_PCT * 100 * self.LEVERAGE
 
                 if side == 'LONG' and roi <= sl_roi:
-                    print(f"[MONITOR] Closing position due to SL hit: ROI={roi:.2f}%")
+                    logger.info(f"[MONITOR] Closing position due to SL hit: ROI={roi:.2f}%")
                     await self.execution.execute_order(symbol=self.SYMBOL, side="SELL", quantity=abs(qty), exec_type="MARKET")
                     self.storage.update_signal(aftercare="C")
 
@@ -88,7 +251,7 @@ class PositionAfterCare:
                     self.current_trade = None
 
                 elif side == 'LONG' and roi >= tp_roi:
-                    print(f"[MONITOR] Closing position due to TP hit: ROI={roi:.2f}%")
+                    logger.info(f"[MONITOR] Closing position due to TP hit: ROI={roi:.2f}%")
                     await self.execution.execute_order(symbol=self.SYMBOL, side="SELL", quantity=abs(qty), exec_type="MARKET")
                     self.storage.update_signal(aftercare="C")
 
@@ -97,7 +260,7 @@ class PositionAfterCare:
                     self.current_trade = None
 
                 elif side == 'SHORT' and roi <= sl_roi:
-                    print(f"[MONITOR] Closing position due to SL hit: ROI={roi:.2f}%")
+                    logger.info(f"[MONITOR] Closing position due to SL hit: ROI={roi:.2f}%")
                     await self.execution.execute_order(symbol=self.SYMBOL, side="BUY", quantity=abs(qty), exec_type="MARKET")
                     self.storage.update_signal(aftercare="C")
 
@@ -106,11 +269,11 @@ class PositionAfterCare:
                     self.current_trade = None
 
                 elif side == 'SHORT' and roi >= tp_roi:
-                    print(f"[MONITOR] Closing position due to TP hit: ROI={roi:.2f}%")
+                    logger.info(f"[MONITOR] Closing position due to TP hit: ROI={roi:.2f}%")
                     await self.execution.execute_order(symbol=self.SYMBOL, side="BUY", quantity=abs(qty), exec_type="MARKET")
                     self.storage.update_signal(aftercare="C")
 
                     await asyncio.sleep(1)
 
                     self.current_trade = None
-            await asyncio.sleep(5)
\ No newline at end of file
+            await asyncio.sleep(self.CHECK_INTERVAL)
\ No newline at end of file
@@ -0,0 +1,152 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from binance.exceptions import BinanceAPIException
+
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
+# Lower value = served first
+PRIORITY_ORDER = 0   # new orders and cancels: stop-loss / square-off must never queue behind polls
+PRIORITY_QUERY = 1   # order status polls
+PRIORITY_POLL = 2    # background account / market refresh
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, window_seconds: float):
+        self.capacity = capacity
+        self.rate = capacity / window_seconds
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float):
+        self.refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float):
+        self.refill()
+        self.tokens -= amount
+
+    def sync_used(self, used: float):
+        """Align with the exchange's own count (X-MBX-USED-WEIGHT / ORDER-COUNT headers)."""
+        self.refill()
+        self.tokens = min(self.tokens, self.capacity - used)
+
+
+class RequestScheduler:
+    """Central REST budget for the futures API, shared by gateway and collector.
+
+    Token buckets track request weight and order counts, re-synced from the
+    X-MBX-* response headers. Waiting requests are served by priority, and
+    lower-priority requests leave `reserve_fraction` of the weight for orders.
+    """
+
+    def __init__(self, client, weight_limit: int = 2400, order_limit_10s: int = 300,
+                 order_limit_1m: int = 1200, reserve_fraction: float = 0.1):
+        self.client = client
+        self.weight = TokenBucket(weight_limit, 60)
+        self.orders_10s = TokenBucket(order_limit_10s, 10)
+        self.orders_1m = TokenBucket(order_limit_1m, 60)
+        self.reserve = weight_limit * reserve_fraction
+        self.blocked_until = 0.0  # set on 429/418
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+        self.queue_stats = {}  # endpoint -> {count, total_s, max_s}
+
+    async def run(self, endpoint: str, call, weight: int = 1, priority: int = PRIORITY_QUERY, orders: int = 0):
+        """Run `call` (a zero-argument coroutine function) once budget allows."""
+        enqueued = time.perf_counter()
+        await self._acquire(weight, priority, orders)
+        self._record_queue_time(endpoint, time.perf_counter() - enqueued)
+        try:
+            return await call()
+        except BinanceAPIException as e:
+            if e.status_code in (418, 429):
+                self._on_rate_limited(e)
+            raise
+        finally:
+            self._observe_headers()
+
+    def _wait_time(self, weight, priority, orders):
+        wait = max(0.0, self.blocked_until - time.monotonic())
+        needed = weight + (self.reserve if priority > PRIORITY_ORDER else 0)
+        wait = max(wait, self.weight.time_until(needed))
+        if orders:
+            wait = max(wait, self.orders_10s.time_until(orders), self.orders_1m.time_until(orders))
+        return wait
+
+    async def _acquire(self, weight, priority, orders):
+        entry = [priority, next(self._seq), weight, orders]
+        heapq.heappush(self._waiting, entry)
+        try:
+            async with self._cond:
+                while True:
+                    wait = self._wait_time(weight, priority, orders)
+                    if self._waiting[0] is entry and wait <= 0:
+                        heapq.heappop(self._waiting)
+                        self.weight.consume(weight)
+                        if orders:
+                            self.orders_10s.consume(orders)
+                            self.orders_1m.consume(orders)
+                        self._cond.notify_all()
+                        return
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout=max(wait, 0.01))
+                    except asyncio.TimeoutError:
+                        pass
+        except asyncio.CancelledError:
+            if entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+            raise
+
+    def _observe_headers(self):
+        response = getattr(self.client, "response", None)
+        if response is None:
+            return
+        headers = response.headers
+        # header names are case-insensitive in aiohttp; values are the exchange's counts so far
+        used = headers.get("X-MBX-USED-WEIGHT-1M") or headers.get("X-MBX-USED-WEIGHT")
+        if used is not None:
+            self.weight.sync_used(float(used))
+        count_10s = headers.get("X-MBX-ORDER-COUNT-10S")
+        if count_10s is not None:
+            self.orders_10s.sync_used(float(count_10s))
+        count_1m = headers.get("X-MBX-ORDER-COUNT-1M")
+        if count_1m is not None:
+            self.orders_1m.sync_used(float(count_1m))
+
+    def _on_rate_limited(self, e):
+        retry_after = None
+        response = getattr(e, "response", None) or getattr(self.client, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+        backoff = float(retry_after) if retry_after else (60.0 if e.status_code == 429 else 120.0)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + backoff)
+        logger.warning(f"⛔ Rate limited ({e.status_code}), pausing REST for {backoff:.0f}s")
+
+    def _record_queue_time(self, endpoint, seconds):
+        stats = self.queue_stats.setdefault(endpoint, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+        stats["count"] += 1
+        stats["total_s"] += seconds
+        stats["max_s"] = max(stats["max_s"], seconds)
+
+    def metrics(self):
+        """Per-endpoint queue time: count, mean and max in milliseconds."""
+        return {
+            endpoint: {
+                "count": s["count"],
+                "avg_queue_ms": round(1000 * s["total_s"] / s["count"], 3) if s["count"] else 0.0,
+                "max_queue_ms": round(1000 * s["max_s"], 3),
+            }
+            for endpoint, s in self.queue_stats.items()
+        }
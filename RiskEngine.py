@@ -2,10 +2,64 @@ import pandas as pd
 import numpy as np
 import os
 import asyncio
+import math
+import time
+from collections import deque
 from datetime import datetime, timezone
 import datetime
 from pathlib import Path
 from CandlestickSignalStorageAndTrade import *
+from LatencyTracer import tracer, perf_counter_ns
+from OrderGateWay import ALGO_LIVE_STATUSES, ALGO_EXECUTED_STATUSES
+from RiskModels import RiskModelEngine
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
+DAY_MS = 86_400_000
+PROTECTION_PREFIX = "rm-"  # clientAlgoId prefix of the protective (algo) orders placed by RiskManager
+PROTECTION_LEGS = {"stop": "STOP_MARKET", "take_profit": "TAKE_PROFIT_MARKET"}
+
+
+class DailyReturnWindow:
+    """Log returns of the last `size` closed daily bars, in time order.
+
+    Daily bars close once a day, so the history is fetched once and then only extended
+    on the UTC day roll. The VaR models read the window as an array (RiskModels).
+    """
+
+    def __init__(self, size: int = 365):
+        self.size = size
+        self.returns = deque()  # chronological
+        self.last_open_time = None
+        self.last_close = None
+
+    def __len__(self):
+        return len(self.returns)
+
+    def roll_due(self, now_ms: int):
+        """True once the day after the last cached bar has closed."""
+        return self.last_open_time is None or now_ms >= self.last_open_time + 2 * DAY_MS
+
+    def extend(self, klines, now_ms: int):
+        """Add the closed bars newer than the cached ones; returns how many were added."""
+        added = 0
+        for k in klines:
+            open_time, close_time = int(k[0]), int(k[6])
+            if close_time >= now_ms or (self.last_open_time is not None and open_time <= self.last_open_time):
+                continue  # the developing bar, or one already cached
+            close = round(float(k[4]), 1)
+            if self.last_close is not None:
+                self._push(math.log(close / self.last_close))
+            self.last_open_time, self.last_close = open_time, close
+            added += 1
+        return added
+
+    def _push(self, r: float):
+        self.returns.append(r)
+        if len(self.returns) > self.size:
+            self.returns.popleft()
+
 
 class RiskManager:
     def __init__(self, MARKETDATA, execution, orderMgr, telegram_bot, gateway, symbol, storage, leverage=50, storage_path='RiskHistory/risk_data.csv'):
@@ -19,23 +73,27 @@ class RiskManager:
         self.leverage = leverage
         self.storage_path = Path(storage_path)
 
-        # Ensure directory and header
-        self.storage_path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.storage_path.exists():
-            header_df = pd.DataFrame(columns=[
-                'date', 'type', 'var_pct', 'var_value', 'realised_pnl', 'unrealised_pnl'
-            ])
-            header_df.to_csv(self.storage_path, index=False)
-
         # Centralized configuration parameters
         self.config = {
-            'stop_loss_sleep': 2,  # seconds
-            'var_sleep': 30,  # seconds
+            'protection_reconcile_sleep': 30,  # seconds; the protective orders otherwise only react to events
+            'protection_max_attempts': 3,  # placement rounds per position before giving up and alerting
+            'var_sleep': 1,  # seconds; only the position-dependent part is recomputed
+            'var_window_days': 365,  # daily returns in the historical VaR window
+            'var_models': ('historical', 'ewma', 'fhs', 'monte_carlo'),  # all reported in risk_data.csv
+            'var_horizons': ('1m', '1h', '1d'),
+            'var_model': 'historical',  # model and horizon behind latest_var_value
+            'var_horizon': '1d',
+            'var_alpha': 0.01,  # 99% VaR / ES
+            'mc_paths': 100_000,
             'realised_pnl_sleep': 30,  # seconds
             'unrealised_pnl_sleep': 30,  # seconds
             'monitor_day_sleep': 60,  # seconds
-            'margin_monitor_sleep': 5,  # seconds
-            'stop_loss_buffer': 0.05,  # 5% stop loss buffer
+            'margin_monitor_sleep': 5,  # seconds; REST-based check, only when no book update came meanwhile
+            'margin_alert_cooldown': 300,  # seconds before an unchanged WARNING/CRITICAL is alerted again
+            'margin_hysteresis': 0.02,  # the ratio must clear a threshold by this much to step down a level
+            'square_off_retry': 5,  # seconds between square-off attempts while still critical
+            'stop_loss_buffer': 0.05,  # stop 5% from the entry price
+            'take_profit_buffer': 0.05,  # wide backstop take-profit; PositionAfterCare handles the tight exits
             'margin_warning_threshold': 0.2,  # 20% warning
             'margin_critical_threshold': 0.05,  # 5% trigger square-off
             'pre_trade_threshold': 0.3 # 30% available margin threshold for execution trade
@@ -48,8 +106,39 @@ class RiskManager:
         self.last_saved_date = None
         self.stop_loss_order_id = None
         self.stop_loss_active = False
+        self.protection_state = 'FLAT'  # FLAT / PLACING / PROTECTED / TRIGGERED / FAILED
+        self.protection_orders = {}  # leg -> latest algo order dict of the live protective order
+        self.protection_calls = 0  # REST calls made for protective orders
+        self._protection_target = None  # (side, {leg: stop price}) the live legs were placed for
+        self._protection_attempts = 0  # placement rounds for the current target
+        self._protection_swept = False  # orders left by a previous run were cleared while flat
+        self._protection_position = None
+        self._protection_wake = asyncio.Event()
         self.latest_var_pct = 0
         self.latest_var_value = 0
+        self.latest_es_value = 0
+        self.margin_ratio_latest = None
+        self.margin_level = 'OK'  # OK / WARNING / CRITICAL
+        self._margin_alert_at = 0.0
+        self._last_margin_check = 0.0
+        self._square_off_task = None
+        self._square_off_at = 0.0
+        self._alert_tasks = set()
+        self.daily_returns = DailyReturnWindow(self.config['var_window_days'])
+        self.risk_models = RiskModelEngine(self.config['var_models'], self.config['var_horizons'],
+                                           alpha=self.config['var_alpha'],
+                                           model_kwargs={'monte_carlo': {'paths': self.config['mc_paths']}})
+        self.model_results = {}  # (model, horizon) -> {'long'/'short': (var, es)} as unleveraged returns
+        self._model_inputs = None
+        self.risk_metrics = {column: 0.0 for column in self._metric_columns()}
+
+        # Ensure directory and header
+        self.storage_path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.storage_path.exists():
+            header_df = pd.DataFrame(columns=[
+                'date', 'type', 'var_pct', 'var_value', 'realised_pnl', 'unrealised_pnl', *self.risk_metrics
+            ])
+            header_df.to_csv(self.storage_path, index=False)
 
         self._load_latest()
 
@@ -69,13 +158,19 @@ class RiskManager:
             self.last_saved_date = datetime.datetime.now(timezone.utc).date()
 
 
-    def pre_trade_check(self, side, quantity):
+    def pre_trade_check(self, side, quantity, snapshot=None):
+        start = perf_counter_ns()
         try:
-            # Current account and price data
-            total_margin_balance = float(self.MARKETDATA.totalMarginBalance)
-            available_margin = float(self.MARKETDATA.availableBalance)
-            mark_price = float(self.MARKETDATA.current_price)
-            current_position = float(self.MARKETDATA.positions)
+            # Current account and price data, all from one collector snapshot
+            if snapshot is None:
+                snapshot = self.MARKETDATA.account_snapshot()
+            elif snapshot['generation'] != self.MARKETDATA.snapshot_generation:
+                logger.warning(f"[pre_trade_check] Using snapshot generation {snapshot['generation']}, "
+                               f"collector is at {self.MARKETDATA.snapshot_generation}")
+            total_margin_balance = float(snapshot['totalMarginBalance'])
+            available_margin = float(snapshot['availableBalance'])
+            mark_price = float(snapshot['current_price'])
+            current_position = float(snapshot['positions'])
 
             # Order value (margin impact estimate)
             order_value = float(quantity) * mark_price / self.leverage
@@ -103,168 +198,342 @@ class RiskManager:
             return ratio >= self.config['pre_trade_threshold']
 
         except Exception as e:
-            print(f"[pre_trade_check] Error: {e}")
+            logger.error(f"[pre_trade_check] Error: {e}")
             return False
+        finally:
+            tracer.since("risk.pre_trade_check", start)
+
+    def margin_ratio(self, mark_price: float = None):
+        """Available / total margin with the position marked to mark_price.
+
+        Rebuilt from the wallet balance, position and entry price, so it moves with every
+        book update instead of the 1 Hz REST figures; falls back to those without a price.
+        Open-order margin is not included.
+        """
+        md = self.MARKETDATA
+        wallet = float(md.cash_balance or 0)
+        if mark_price is None or wallet <= 0:
+            total_asset = float(md.totalMarginBalance or 0)
+            return float(md.availableBalance) / total_asset if total_asset else None
+        position = float(md.positions or 0)
+        equity = wallet + position * (mark_price - float(md.entryPrice or 0))
+        if equity <= 0:
+            return 0.0
+        initial_margin = abs(position) * mark_price / self.leverage
+        return (equity - initial_margin) / equity
+
+    def _margin_level(self, ratio: float):
+        critical = self.config['margin_critical_threshold']
+        warning = self.config['margin_warning_threshold']
+        hysteresis = self.config['margin_hysteresis']
+        if ratio < critical or (self.margin_level == 'CRITICAL' and ratio < critical + hysteresis):
+            return 'CRITICAL'
+        if ratio < warning or (self.margin_level != 'OK' and ratio < warning + hysteresis):
+            return 'WARNING'
+        return 'OK'
+
+    def _on_book_update(self, book):
+        start = perf_counter_ns()
+        mid = book.mid_price()
+        if mid is not None:
+            self._check_margin(self.margin_ratio(mid), start)
+        tracer.since("risk.margin_check", start)
+
+    def _check_margin(self, ratio, start_ns: int):
+        if ratio is None:
+            return
+        self._last_margin_check = time.monotonic()
+        self.margin_ratio_latest = ratio
+        level = self._margin_level(ratio)
+        if level == 'CRITICAL':
+            self._trigger_square_off(start_ns)
+        self._alert_margin(level, ratio)
+        self.margin_level = level
+
+    def _trigger_square_off(self, start_ns: int):
+        if self._square_off_task is not None and not self._square_off_task.done():
+            return
+        if time.monotonic() - self._square_off_at < self.config['square_off_retry']:
+            return
+        self._square_off_at = time.monotonic()
+        self._square_off_task = asyncio.create_task(self._square_off(start_ns))
+
+    async def _square_off(self, start_ns: int):
+        tracer.since("risk.margin_to_square_off", start_ns)
+        try:
+            await self.execution.square_off()
+            self.storage.update_signal(risk="R")
+        except Exception as e:
+            logger.error(f"[square_off] Error: {e}")
+
+    def _alert_margin(self, level: str, ratio: float):
+        """One message per level change; an unchanged WARNING/CRITICAL is repeated only after the cooldown."""
+        now = time.monotonic()
+        if level == self.margin_level and (level == 'OK' or now - self._margin_alert_at < self.config['margin_alert_cooldown']):
+            return
+        if level == 'CRITICAL':
+            text = (f"\U0001F6A8 CRITICAL: Margin available {ratio:.1%} "
+                    f"(<{self.config['margin_critical_threshold']:.0%}). Triggering square-off!")
+        elif level == 'WARNING':
+            text = (f"⚠️ WARNING: Margin available {ratio:.1%} "
+                    f"(<{self.config['margin_warning_threshold']:.0%} of total assets).")
+        else:
+            text = f"✅ Margin back to normal: {ratio:.1%} available."
+        logger.warning(text)
+        self._margin_alert_at = now
+        task = asyncio.create_task(self.telegram_bot.send_text_message(text))
+        self._alert_tasks.add(task)
+        task.add_done_callback(self._alert_tasks.discard)
 
     async def monitor_margin_level(self):
+        """Margin is checked on every book update; this loop only covers a silent depth stream."""
+        self.MARKETDATA.add_book_listener(self._on_book_update)
         while True:
             try:
-                total_asset = float(self.MARKETDATA.totalMarginBalance)
-                available_margin = float(self.MARKETDATA.availableBalance)
-
-                if total_asset == 0:
-                    await asyncio.sleep(self.config['margin_monitor_sleep'])
-                    continue
-
-                ratio = available_margin / total_asset
-
-                if ratio < self.config['margin_critical_threshold']:
-                    await self.telegram_bot.send_text_message("\U0001F6A8 CRITICAL: Margin available <5%. Triggering square-off!")
-                    await self.execution.square_off()
-                    self.storage.update_signal(risk="R")
-                elif ratio < self.config['margin_warning_threshold']:
-                    await self.telegram_bot.send_text_message("⚠️ WARNING: Margin available <20% of total assets.")
-
+                if time.monotonic() - self._last_margin_check >= self.config['margin_monitor_sleep']:
+                    self._check_margin(self.margin_ratio(), perf_counter_ns())
             except Exception as e:
-                print(f"[monitor_margin_level] Error: {e}")
+                logger.error(f"[monitor_margin_level] Error: {e}")
 
             await asyncio.sleep(self.config['margin_monitor_sleep'])
 
     async def maintain_stop_loss(self):
+        """Keeps a closePosition stop-loss and take-profit on the exchange for the open position.
+
+        The legs are conditional (algo) orders, tracked by algoId. Prices come from the entry
+        price, so the legs are placed once per position and only replaced when the side or
+        entry price changes. The loop sleeps until an algo order or position event arrives;
+        a slow timer covers missed events.
+        """
+        self.MARKETDATA.add_algo_order_listener(self._on_algo_order_event)
+        self.MARKETDATA.add_position_listener(self._on_position_event)
         while True:
             try:
-                position = self.MARKETDATA.positions
-                MktPrice = self.MARKETDATA.current_price
-                open_orders = [o for o in self.MARKETDATA.open_orders if o.get("symbol") == self.symbol]
-                stop_orders = [o for o in open_orders if o['type'] == 'STOP_MARKET']
-
-                if not position or position == 0:
-                    # No position – cancel all SL orders
-                    for o in stop_orders:
-                        await self.gateway.cancel_order(o['orderId'])
-                    self.stop_loss_active = False
-                    await asyncio.sleep(self.config['stop_loss_sleep'])
-                    continue
-
-                pos_qty = round(abs(position), 3)
-                pos_side = 'LONG' if float(position) > 0 else 'SHORT'
-                expected_side = 'SELL' if pos_side == 'LONG' else 'BUY'
-                expected_price = round(
-                    MktPrice * (1 - self.config['stop_loss_buffer'] if pos_side == 'LONG'
-                                else 1 + self.config['stop_loss_buffer']),
-                    1
-                )
-
-                # Identify the first valid stop order
-                valid_stop = None
-                for o in stop_orders:
-                    if round(float(o['origQty']), 3) == pos_qty and o['side'] == expected_side:
-                        valid_stop = o
-                        break  # use the first match
-
-                if valid_stop:
-                    # Cancel other redundant STOP_MARKET orders
-                    for o in stop_orders:
-                        if o['orderId'] != valid_stop['orderId']:
-                            await self.gateway.cancel_order(o['orderId'])
-
-                    await asyncio.sleep(2)
-
-                    # Check execution status
-                    if valid_stop.get('status') == 'FILLED':
-                        self.storage.update_signal(risk="R")
-                        await self.telegram_bot.send_text_message("\U0001F6A8 Stop loss executed!")
-                        self.stop_loss_active = False
-                    else:
-                        self.stop_loss_order_id = valid_stop['orderId']
-                        self.stop_loss_active = True
-                else:
-                    # No valid SL – cancel all and place fresh one
-                    for o in stop_orders:
-                        await self.gateway.cancel_order(o['orderId'])
-
-                    await asyncio.sleep(2)
-
-                    stop_order = await self.gateway.place_order(
-                        side=expected_side,
-                        quantity=pos_qty,
-                        stop_price=expected_price,
-                        order_type='STOP_MARKET'
-                    )
-
-                    # ✅ Append to Order Manager
-                    if stop_order:
-                        await self.orderMgr.append_order(stop_order)
-
-                    valid_stop = stop_order
-
-                    await asyncio.sleep(2)
-
-                    if stop_order and 'orderId' in stop_order:
-                        self.stop_loss_order_id = stop_order['orderId']
-                        self.stop_loss_active = True
-                    else:
-                        print("❌ Failed to place stop loss order.")
-                        self.stop_loss_active = False
-
+                await self._sync_protection()
             except Exception as e:
-                print(f"[ERROR] maintain_stop_loss: {e}")
-                self.stop_loss_active = False
+                logger.error(f"[ERROR] maintain_stop_loss: {e}")
+            try:
+                await asyncio.wait_for(self._protection_wake.wait(), self.config['protection_reconcile_sleep'])
+            except asyncio.TimeoutError:
+                pass
+            self._protection_wake.clear()
+
+    def _on_algo_order_event(self, order):
+        if str(order.get('clientAlgoId') or '').startswith(PROTECTION_PREFIX):
+            for leg, placed in self.protection_orders.items():
+                if placed.get('algoId') == order['algoId']:
+                    self.protection_orders[leg] = order
+            self._protection_wake.set()
+
+    def _on_position_event(self):
+        position = (self.MARKETDATA.positions, self.MARKETDATA.entryPrice)
+        if position != self._protection_position:
+            self._protection_position = position
+            self._protection_wake.set()
+
+    def _protection_targets(self, side, entry):
+        sl, tp = self.config['stop_loss_buffer'], self.config['take_profit_buffer']
+        if side == 'LONG':
+            return {'stop': round(entry * (1 - sl), 1), 'take_profit': round(entry * (1 + tp), 1)}
+        return {'stop': round(entry * (1 + sl), 1), 'take_profit': round(entry * (1 - tp), 1)}
+
+    def _set_protection_state(self, state):
+        if state != self.protection_state:
+            logger.info(f"🛡️ Protection {self.protection_state} -> {state} ({self.protection_calls} REST calls so far)")
+            self.protection_state = state
+        stop = self.protection_orders.get('stop')
+        self.stop_loss_active = stop is not None and stop.get('algoStatus') in ALGO_LIVE_STATUSES
+        self.stop_loss_order_id = stop['algoId'] if self.stop_loss_active else None
+
+    async def _open_protection_orders(self):
+        """Live protective orders on the exchange, ours or left by a previous run; None if the query failed."""
+        orders = await self.gateway.get_open_algo_orders()
+        self.protection_calls += 1
+        if orders is None:
+            return None
+        return [o for o in orders if o.get('symbol') == self.symbol
+                and str(o.get('clientAlgoId') or '').startswith(PROTECTION_PREFIX)
+                and o.get('algoStatus', 'NEW') in ALGO_LIVE_STATUSES]
+
+    async def _handle_executed_legs(self):
+        for leg, order in list(self.protection_orders.items()):
+            if order.get('algoStatus') not in ALGO_EXECUTED_STATUSES:
+                continue
+            del self.protection_orders[leg]
+            self._set_protection_state('TRIGGERED')
+            if leg == 'stop':
+                self.storage.update_signal(risk="R")
+                await self.telegram_bot.send_text_message("\U0001F6A8 Stop loss executed!")
+            else:
+                await self.telegram_bot.send_text_message("✅ Take profit executed!")
+
+    async def _sync_protection(self):
+        await self._handle_executed_legs()
+        position = float(self.MARKETDATA.positions or 0)
+        entry = float(self.MARKETDATA.entryPrice or 0)
+
+        if position == 0:
+            if self.protection_state != 'FLAT' or not self._protection_swept:
+                # closePosition orders outlive the position, so clear them once flat
+                leftover = await self._open_protection_orders()
+                if leftover is None:
+                    return  # tried again on the next event or timer
+                if leftover:
+                    await self._cancel_orders([o['algoId'] for o in leftover])
+                self._protection_swept = True
+            self.protection_orders = {}
+            self._protection_target = None
+            self._protection_attempts = 0
+            self._set_protection_state('FLAT')
+            return
+        if entry <= 0:
+            return
+
+        side = 'LONG' if position > 0 else 'SHORT'
+        target = (side, self._protection_targets(side, entry))
+        if target == self._protection_target and self.protection_state in ('TRIGGERED', 'FAILED'):
+            # TRIGGERED: the position update that follows clears or replaces the rest;
+            # FAILED: already alerted, wait for the next position
+            return
+        if target != self._protection_target:
+            self._protection_target = target
+            self._protection_attempts = 0
+
+        missing = [leg for leg in PROTECTION_LEGS
+                   if self.protection_orders.get(leg, {}).get('algoStatus') not in ALGO_LIVE_STATUSES]
+        if not missing:
+            self._set_protection_state('PROTECTED')
+            return
+        if self._protection_attempts >= self.config['protection_max_attempts']:
+            self._set_protection_state('FAILED')
+            logger.error(f"❌ Giving up on protective {', '.join(missing)} after {self._protection_attempts} attempts.")
+            await self.telegram_bot.send_text_message(
+                f"\U0001F6A8 Protective {', '.join(missing)} order could not be placed, position is unprotected!")
+            return
+
+        # Ask the exchange before placing: a leg may be live although our view of it is not
+        # (lost acknowledgement, missed event, previous run)
+        open_orders = await self._open_protection_orders()
+        if open_orders is None:
+            logger.warning("⚠️ Open algo orders unavailable, protective orders not placed this round.")
+            return
+        # Keep legs already at the right price, cancel the rest first,
+        # as the exchange allows one closePosition stop / take-profit per direction
+        close_side = 'SELL' if side == 'LONG' else 'BUY'
+        keep, stale = {}, []
+        for order in open_orders:
+            leg = next((leg for leg, order_type in PROTECTION_LEGS.items()
+                        if order.get('orderType') == order_type and order.get('side') == close_side
+                        and float(order.get('triggerPrice') or 0) == target[1][leg] and leg not in keep), None)
+            if leg is None:
+                stale.append(order['algoId'])
+            else:
+                keep[leg] = order
+        if stale:
+            await self._cancel_orders(stale)
+        self.protection_orders = keep
+
+        missing = [leg for leg in PROTECTION_LEGS if leg not in keep]
+        if missing:
+            self._set_protection_state('PLACING')
+            self._protection_attempts += 1
+            await self._place_protection(side, target[1], missing)
+        protected = all(self.protection_orders.get(leg, {}).get('algoStatus') in ALGO_LIVE_STATUSES
+                        for leg in PROTECTION_LEGS)
+        self._set_protection_state('PROTECTED' if protected else 'PLACING')
+
+    async def _place_protection(self, side, prices, legs):
+        close_side = 'SELL' if side == 'LONG' else 'BUY'
+        stamp = int(time.time() * 1000)
+        results = await asyncio.gather(*(
+            self.gateway.place_order(side=close_side, order_type=PROTECTION_LEGS[leg], stop_price=prices[leg],
+                                     close_position=True, client_order_id=f"{PROTECTION_PREFIX}{leg}-{stamp}")
+            for leg in legs
+        ))
+        self.protection_calls += len(legs)
+        for leg, result in zip(legs, results):
+            if result and 'algoId' in result:
+                self.protection_orders[leg] = {'algoStatus': 'NEW', **result}  # accepted means live
+            else:
+                logger.error(f"❌ Failed to place {leg} order at {prices[leg]} "
+                             f"(attempt {self._protection_attempts}): {result}")
+
+    async def _cancel_orders(self, algo_ids):
+        await self.gateway.cancel_algo_orders(algo_ids)
+        self.protection_calls += len(algo_ids)
+
+    async def _refresh_daily_returns(self):
+        """Fetch the daily history once, then only the bars closed since, after each UTC day roll."""
+        window = self.daily_returns
+        now_ms = int(time.time() * 1000)
+        if not window.roll_due(now_ms):
+            return
+        if window.last_open_time is None:
+            # one extra bar for the first return, one for the developing bar that is skipped
+            candles = await self.MARKETDATA.get_ad_hoc_candlesticks(self.symbol, interval='1d',
+                                                                    limit=window.size + 2)
+        else:
+            candles = await self.MARKETDATA.get_ad_hoc_candlesticks(self.symbol, interval='1d', limit=10,
+                                                                    start_time=window.last_open_time + DAY_MS)
+        added = window.extend(candles or [], now_ms)
+        if added:
+            logger.info(f"📈 VaR history: {added} new daily bar(s), {len(window)} returns")
+
+    def _metric_columns(self):
+        return [f'{kind}_{model}_{horizon}' for model in self.config['var_models']
+                for horizon in self.config['var_horizons'] for kind in ('var', 'es')]
+
+    def _return_series(self):
+        closes = np.fromiter((bar[4] for bar in self.MARKETDATA.kline_store.bars), dtype=float)
+        return {
+            '1m': np.diff(np.log(closes)) if len(closes) > 1 else closes[:0],
+            '1d': np.fromiter(self.daily_returns.returns, dtype=float),
+        }
 
-            await asyncio.sleep(self.config['stop_loss_sleep'])
+    async def _refresh_models(self):
+        """Re-run the risk models when a 1m or daily bar closed; the Monte Carlo runs off the event loop."""
+        inputs = (self.MARKETDATA.kline_store.version, self.daily_returns.last_open_time)
+        if inputs == self._model_inputs:
+            return
+        self.model_results = await asyncio.to_thread(self.risk_models.evaluate, self._return_series())
+        self._model_inputs = inputs
+
+    def _update_var(self):
+        """Position- and margin-dependent part of the VaR; the return quantiles come from the cache."""
+        position = float(self.MARKETDATA.positions)
+        margin_balance = float(self.MARKETDATA.totalMarginBalance)
+        available_margin = float(self.MARKETDATA.availableBalance)
+
+        # Compute initial margin used
+        initial_margin = margin_balance - available_margin
+
+        if not self.model_results:
+            return
+
+        # Leveraged loss fraction of the margin for the side held; ES for a short uses the right tail
+        side = 'long' if position > 0 else 'short' if position < 0 else None
+        for (model, horizon), tails in self.model_results.items():
+            var_ret, es_ret = tails[side] if side else (0.0, 0.0)
+            self.risk_metrics[f'var_{model}_{horizon}'] = var_ret * self.leverage * initial_margin
+            self.risk_metrics[f'es_{model}_{horizon}'] = es_ret * self.leverage * initial_margin
+
+        selected = self.model_results.get((self.config['var_model'], self.config['var_horizon']))
+        if selected is None:
+            return
+        var_ret, es_ret = selected[side] if side else (0.0, 0.0)
+        self.latest_var_pct = var_ret * self.leverage
+        # Value VaR based on initial margin used
+        self.latest_var_value = self.latest_var_pct * initial_margin
+        self.latest_es_value = es_ret * self.leverage * initial_margin
 
     async def calculate_var(self):
         while True:
-            # Retrieve candlestick data
-            candles = await self.MARKETDATA.get_ad_hoc_candlesticks(self.symbol, interval='1d', limit=366)
-            columns = [
-                'open_time', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_asset_volume', 'number_of_trades',
-                'taker_buy_base_vol', 'taker_buy_quote_vol', 'ignore'
-            ]
-            prices = pd.DataFrame(candles, columns=columns)
-
-            # Convert relevant columns
-            float_columns = ['open', 'high', 'low', 'close']
-            volume_columns = ['volume', 'quote_asset_volume', 'taker_buy_base_vol', 'taker_buy_quote_vol']
-
-            for col in float_columns:
-                prices[col] = pd.to_numeric(prices[col], errors='coerce').round(1)  # prices: 1 decimal
-
-            for col in volume_columns:
-                prices[col] = pd.to_numeric(prices[col], errors='coerce').round(3)  # volumes: 3 decimals
-
-            # Calculate log returns
-            prices['returns'] = np.log(prices['close'] / prices['close'].shift(1))
-            daily_returns = prices['returns'].dropna()
-
-            # Retrieve market values
-            position = float(self.MARKETDATA.positions)
-            price = float(self.MARKETDATA.current_price)
-            margin_balance = float(self.MARKETDATA.totalMarginBalance)
-            available_margin = float(self.MARKETDATA.availableBalance)
-
-            # Compute initial margin used
-            initial_margin = margin_balance - available_margin
-
-            # Compute VaR based on position direction
-            pct_1 = np.percentile(daily_returns, 1)
-            pct_99 = np.percentile(daily_returns, 99)
-
-            if position > 0:  # Long
-                var_pct = pct_1 * self.leverage
-            elif position < 0:  # Short
-                var_pct = pct_99 * self.leverage * -1
-            else:
-                var_pct = 0.0
-
-            # Value VaR based on initial margin used
-            var_value = var_pct * initial_margin
-
-            # Save results
-            self.latest_var_pct = var_pct
-            self.latest_var_value = var_value
-
+            try:
+                await self._refresh_daily_returns()
+                await self._refresh_models()
+                self._update_var()
+            except Exception as e:
+                logger.error(f"[calculate_var] Error: {e}")
             await asyncio.sleep(self.config['var_sleep'])
 
 
@@ -278,7 +547,7 @@ class RiskManager:
                     filtered = orders[orders['status'].isin(relevant_status)]
                     self.realised_pnl_today = filtered['realizedPnl'].astype(float).sum()
             except Exception as e:
-                print(f"[compute_realised_pnl] Error: {e}")
+                logger.error(f"[compute_realised_pnl] Error: {e}")
             await asyncio.sleep(self.config['realised_pnl_sleep'])
 
     async def compute_unrealised_pnl(self):
@@ -296,7 +565,8 @@ class RiskManager:
             'var_pct': self.latest_var_pct,
             'var_value': self.latest_var_value,
             'realised_pnl': self.realised_pnl_today,
-            'unrealised_pnl': self.unrealised_pnl_closing
+            'unrealised_pnl': self.unrealised_pnl_closing,
+            **self.risk_metrics
         }])
 
         self.storage_path.parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,233 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Logger name -> level; anything not listed follows the root level
+DEFAULT_LEVELS = {
+    "DataRetriever": "INFO",
+    "OrderGateWay": "INFO",
+    "ExecutionModule": "INFO",
+    "order_manager": "INFO",
+    "DecisionEngine": "INFO",
+    "RequestScheduler": "INFO",
+    "UserDataStream": "INFO",
+    "BarCloseScheduler": "INFO",
+}
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def get_logger(name: str):
+    """Module logger; use log.debug("x %s", value) so disabled levels skip formatting entirely."""
+    return logging.getLogger(name)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, plus any extra={...} fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most `burst` records per (logger, message template) every `interval` seconds.
+
+    The first record after a quiet period carries suppressed=<count dropped meanwhile>.
+    It keys on record.msg (the unformatted template), so "Waiting for %s" with changing
+    arguments is still one message.
+    """
+
+    def __init__(self, interval: float = 10.0, burst: int = 1):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._windows = {}  # key -> [window start, emitted, suppressed]
+
+    def filter(self, record):
+        if record.levelno >= logging.CRITICAL:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else repr(record.msg))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window is not None else 0
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            if len(self._windows) > 10_000:
+                self._windows = {k: w for k, w in self._windows.items() if now - w[0] < self.interval}
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the writer falls behind, records are counted and dropped.
+
+    Uses a lock-free SimpleQueue with a size check rather than a bounded queue.Queue,
+    whose put takes a lock and a condition variable on every record.
+    """
+
+    def __init__(self, log_queue, max_size: int = 100_000):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only this handler sees the record, so format the message in place instead of
+        # copying the record; the JSON/console formatting itself runs on the writer thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class _ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (+{suppressed} similar suppressed)" if suppressed else text
+
+
+def _skip_unused_record_fields():
+    # no formatter prints caller, thread or process info (logging cookbook, "Optimization")
+    logging._srcfile = None
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+
+
+_state = {"listener": None, "handler": None}
+_lock = threading.Lock()
+
+
+def setup_logging(level="INFO", levels: dict = None, path="Logs/trading.jsonl", console: bool = True,
+                  rate_interval: float = 10.0, rate_burst: int = 1, max_queue: int = 100_000):
+    """Route every logger through a bounded queue to a background writer thread.
+
+    Callers only format the message and enqueue it; file and console I/O happen on the
+    listener thread. Output: JSON lines at `path` (rotated at 50 MB) and, optionally,
+    plain text on stdout. Safe to call again to change levels.
+    """
+    with _lock:
+        _skip_unused_record_fields()
+        root = logging.getLogger()
+        root.setLevel(level)
+        for name, name_level in {**DEFAULT_LEVELS, **(levels or {})}.items():
+            logging.getLogger(name).setLevel(name_level)
+        if _state["listener"] is not None:
+            return _state["listener"]
+
+        handlers = []
+        if path:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=50 * 1024 * 1024, backupCount=5,
+                                                                encoding="utf-8")
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        if console:
+            stream_handler = logging.StreamHandler(sys.stdout)
+            stream_handler.setFormatter(_ConsoleFormatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s",
+                                                          datefmt="%H:%M:%S"))
+            handlers.append(stream_handler)
+
+        log_queue = queue.SimpleQueue()
+        handler = _DroppingQueueHandler(log_queue, max_queue)
+        handler.addFilter(RateLimitFilter(rate_interval, rate_burst))
+        for existing in root.handlers[:]:
+            root.removeHandler(existing)
+        root.addHandler(handler)
+
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _state.update(listener=listener, handler=handler)
+        atexit.register(shutdown_logging)
+        return listener
+
+
+def shutdown_logging():
+    """Flush the queue and stop the writer thread."""
+    with _lock:
+        listener, handler = _state["listener"], _state["handler"]
+        if listener is None:
+            return
+        listener.stop()
+        logging.getLogger().removeHandler(handler)
+        if handler.dropped:
+            print(f"⚠️ {handler.dropped} log records dropped, writer could not keep up")
+        _state.update(listener=None, handler=None)
+
+
+def overhead_check(n: int = 200_000):
+    """ns per call on the calling thread: disabled debug, enqueueing an info record, print().
+
+    Plus the writer thread's cost per record (JSON formatting), which no longer runs on the caller.
+    """
+    _skip_unused_record_fields()
+    results = {}
+    log = get_logger("overhead_check")
+    log.setLevel(logging.INFO)
+    started = time.perf_counter_ns()
+    for i in range(n):
+        log.debug("order %s params %s", i, {"side": "BUY"})
+    results["disabled debug"] = (time.perf_counter_ns() - started) / n
+
+    # a private queue with no listener, so only the caller's side is timed
+    m = n // 10
+    isolated = logging.getLogger("overhead_check.enqueue")
+    isolated.propagate = False
+    handler = _DroppingQueueHandler(queue.SimpleQueue(), m)
+    handler.addFilter(RateLimitFilter(interval=0.0))
+    isolated.addHandler(handler)
+    started = time.perf_counter_ns()
+    for i in range(m):
+        isolated.info("order %s accepted", i, extra={"order_id": i})
+    results["info enqueue"] = (time.perf_counter_ns() - started) / m
+
+    formatter, records = JsonFormatter(), [handler.queue.get_nowait() for _ in range(m)]
+    started = time.perf_counter_ns()
+    for record in records:
+        formatter.format(record)
+    results["writer json"] = (time.perf_counter_ns() - started) / m
+
+    started = time.perf_counter_ns()
+    for i in range(m):
+        print(f"order {i} accepted")
+    results["print"] = (time.perf_counter_ns() - started) / m
+    return results
+
+
+if __name__ == "__main__":
+    # python StructuredLogger.py > /dev/null  (results go to stderr)
+    for name, ns in overhead_check().items():
+        print(f"  {name:16s} {ns:8.0f} ns/call", file=sys.stderr)
@@ -6,6 +6,10 @@ from io import BytesIO
 import matplotlib.pyplot as plt
 import pandas as pd
 
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
 
 class TelegramBot:
     def __init__(self, env_path: str = '.env'):
@@ -30,7 +34,10 @@ class TelegramBot:
             return
         url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
         async with self.session.post(url, data={'chat_id': self.chat_id, 'text': text}) as resp:
-            print("✅ Text sent" if resp.status == 200 else f"❌ Text error: {await resp.text()}")
+            if resp.status == 200:
+                logger.info("✅ Text sent")
+            else:
+                logger.error(f"❌ Text error: {await resp.text()}")
 
     async def send_photo(self, image_bytesio):
         if not image_bytesio:
@@ -42,7 +49,10 @@ class TelegramBot:
         data.add_field('chat_id', self.chat_id)
         data.add_field('photo', buffer_copy, filename='chart.jpg', content_type='image/jpeg')
         async with self.session.post(url, data=data) as resp:
-            print("✅ Chart sent" if resp.status == 200 else f"❌ Chart error: {await resp.text()}")
+            if resp.status == 200:
+                logger.info("✅ Chart sent")
+            else:
+                logger.error(f"❌ Chart error: {await resp.text()}")
 
     async def send_file(self, df):
         if not isinstance(df, pd.DataFrame):
@@ -55,7 +65,10 @@ class TelegramBot:
         data.add_field('chat_id', self.chat_id)
         data.add_field('document', buffer, filename='table.csv', content_type='text/csv')
         async with self.session.post(url, data=data) as resp:
-            print("✅ Table sent" if resp.status == 200 else f"❌ Table error: {await resp.text()}")
+            if resp.status == 200:
+                logger.info("✅ Table sent")
+            else:
+                logger.error(f"❌ Table error: {await resp.text()}")
 
     async def send_text_message_with_button(self, text):
         url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
@@ -65,7 +78,10 @@ class TelegramBot:
             'reply_markup': '{"inline_keyboard": [[{"text": "Acknowledge", "callback_data": "ack"}]]}'
         }
         async with self.session.post(url, data=payload) as resp:
-            print("✅ Button sent" if resp.status == 200 else f"❌ Button error: {await resp.text()}")
+            if resp.status == 200:
+                logger.info("✅ Button sent")
+            else:
+                logger.error(f"❌ Button error: {await resp.text()}")
 
     async def clear_pending_updates(self):
         url = f"https://api.telegram.org/bot{self.bot_token}/getUpdates"
@@ -74,9 +90,9 @@ class TelegramBot:
                 updates = (await resp.json()).get("result", [])
                 if updates:
                     self.last_update_id = updates[-1]['update_id']
-                    print(f"🔁 Cleared {len(updates)} old updates.")
+                    logger.info(f"🔁 Cleared {len(updates)} old updates.")
             else:
-                print(f"❌ Failed to clear updates: {await resp.text()}")
+                logger.error(f"❌ Failed to clear updates: {await resp.text()}")
 
     async def check_for_acknowledgement(self):
         url = f"https://api.telegram.org/bot{self.bot_token}/getUpdates"
@@ -92,7 +108,7 @@ class TelegramBot:
                         await self.send_text_message("✅ Critical alert acknowledged.")
                         self.stop_critical.set()
             else:
-                print(f"❌ Update check failed: {await resp.text()}")
+                logger.error(f"❌ Update check failed: {await resp.text()}")
 
     async def _poll_ack_loop(self):
         while not self.stop_critical.is_set():
@@ -0,0 +1,168 @@
+import asyncio
+
+import websockets
+from binance import AsyncClient
+
+from MessageDecoder import get_decoder
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
+
+
+class UserDataStream:
+    """Futures user-data stream (listenKey).
+
+    ACCOUNT_UPDATE and ORDER_TRADE_UPDATE events are applied to the collectors and
+    order trackers as they arrive; ALGO_UPDATE (conditional orders) goes to the collectors.
+    While the stream is connected the collectors' user_stream_active flag is set, and
+    REST polling drops to a slow reconciliation.
+    """
+
+    def __init__(self, client: AsyncClient, collectors, ws_base: str = "wss://stream.binancefuture.com/ws/",
+                 keepalive_interval: int = 30 * 60):
+        self.client = client
+        self.collectors = {c.symbol: c for c in collectors}
+        self.order_trackers = []
+        self.ws_base = ws_base
+        self.keepalive_interval = keepalive_interval  # listenKey expires after 60 minutes without a keepalive
+        self.decoder = get_decoder()
+        self.listen_key = None
+        self.connected = False
+        self.last_event_time = None
+        self._ws = None
+
+    def attach_order_tracker(self, tracker):
+        self.order_trackers.append(tracker)
+
+    async def start(self):
+        asyncio.create_task(self._run_forever())
+        asyncio.create_task(self._keepalive_loop())
+
+    def _set_active(self, active: bool):
+        self.connected = active
+        for collector in self.collectors.values():
+            collector.user_stream_active = active
+
+    async def _run_forever(self):
+        while True:
+            try:
+                self.listen_key = await self.client.futures_stream_get_listen_key()
+                async with websockets.connect(self.ws_base + self.listen_key) as ws:
+                    self._ws = ws
+                    self._set_active(True)
+                    logger.info("✅ User data stream connected")
+                    async for msg in ws:
+                        await self._handle(self.decoder.decode(msg))
+            except Exception as e:
+                logger.error(f"❌ User data stream error: {e}")
+            finally:
+                self._ws = None
+                self._set_active(False)
+            # REST reconciliation covers the gap until we are back
+            await asyncio.sleep(1)
+
+    async def _keepalive_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            if not self.listen_key:
+                continue
+            try:
+                await self.client.futures_stream_keepalive(listenKey=self.listen_key)
+            except Exception as e:
+                logger.error(f"❌ listenKey keepalive failed, reconnecting: {e}")
+                await self._reconnect()
+
+    async def _reconnect(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def _handle(self, data):
+        event = data.get("e")
+        self.last_event_time = data.get("E")
+        if event == "ACCOUNT_UPDATE":
+            self._apply_account_update(data.get("a", {}))
+        elif event == "ORDER_TRADE_UPDATE":
+            await self._apply_order_update(data.get("o", {}))
+        elif event == "ALGO_UPDATE":
+            self._apply_algo_update(data.get("o", {}))
+        elif event == "listenKeyExpired":
+            logger.warning("⚠️ listenKey expired, reconnecting user data stream")
+            await self._reconnect()
+
+    def _apply_account_update(self, account):
+        for balance in account.get("B", []):
+            if balance.get("a") == "USDT":
+                for collector in self.collectors.values():
+                    collector.cash_balance = float(balance["wb"])
+
+        for position in account.get("P", []):
+            collector = self.collectors.get(position.get("s"))
+            if collector is None or position.get("ps", "BOTH") != "BOTH":
+                continue
+            collector._apply_stream_position(
+                amount=float(position["pa"]),
+                entry_price=float(position["ep"]),
+                unrealized_profit=float(position["up"])
+            )
+
+    async def _apply_order_update(self, o):
+        order = self.order_from_event(o)
+
+        collector = self.collectors.get(order["symbol"])
+        if collector is not None:
+            collector._apply_stream_order(order)
+
+        realized = float(o.get("rp", 0) or 0)
+        for tracker in self.order_trackers:
+            if tracker.gateway is None or tracker.gateway.symbol == order["symbol"]:
+                await tracker.apply_order_update(dict(order), realized_pnl=realized)
+
+    def _apply_algo_update(self, o):
+        order = self.algo_order_from_event(o)
+        collector = self.collectors.get(order["symbol"])
+        if collector is not None:
+            collector._apply_stream_algo_order(order)
+
+    @staticmethod
+    def order_from_event(o):
+        """ORDER_TRADE_UPDATE payload -> dict with the REST order field names."""
+        return {
+            "orderId": o["i"],
+            "symbol": o["s"],
+            "clientOrderId": o.get("c"),
+            "side": o["S"],
+            "positionSide": o.get("ps"),
+            "type": o["o"],
+            "origType": o.get("ot"),
+            "status": o["X"],
+            "origQty": float(o["q"]),
+            "executedQty": float(o["z"]),
+            "price": float(o["p"]),
+            "avgPrice": float(o["ap"]),
+            "stopPrice": float(o.get("sp", 0) or 0),
+            "reduceOnly": o.get("R", False),
+            "closePosition": o.get("cp", False),
+            "updateTime": o["T"],
+        }
+
+    @staticmethod
+    def algo_order_from_event(o):
+        """ALGO_UPDATE payload -> dict with the REST algo order field names."""
+        return {
+            "algoId": o["aid"],
+            "clientAlgoId": o.get("caid"),
+            "algoType": o.get("at"),
+            "orderType": o["o"],
+            "symbol": o["s"],
+            "side": o["S"],
+            "positionSide": o.get("ps"),
+            "algoStatus": o["X"],
+            "quantity": float(o.get("q", 0) or 0),
+            "triggerPrice": float(o.get("tp", 0) or 0),
+            "price": float(o.get("p", 0) or 0),
+            "reduceOnly": o.get("R", False),
+            "closePosition": o.get("cp", False),
+            "actualOrderId": o.get("ai"),
+            "triggerTime": o.get("tt"),
+            "rejectReason": o.get("rm"),
+        }
@@ -109,6 +109,13 @@ def update_open_orders():
                 condition = f">= {stop_price}"
             elif side == "SELL":
                 condition = f"<= {stop_price}"
+        elif order.get("type") == "TAKE_PROFIT_MARKET":
+            side = order.get("side")
+            stop_price = order.get("stopPrice") or order.get("price")
+            if side == "BUY":
+                condition = f"<= {stop_price}"
+            elif side == "SELL":
+                condition = f">= {stop_price}"
 
         open_orders_tree.insert("", tk.END, values=(
             order.get("orderId"), order.get("symbol"), order.get("side"),
@@ -187,10 +194,12 @@ btn_warning = tk.Button(frame_test, text="Send Warning Alert", command=send_warn
 btn_warning.pack(pady=20, padx=10)
 btn_critical = tk.Button(frame_test, text="Send Critical Alert", command=send_critical_alert, bg="red", fg="white")
 btn_critical.pack(pady=10, padx=10)
+btn_latency = tk.Button(frame_test, text="Dump Latency", command=lambda: MainFile.dump_latency())
+btn_latency.pack(pady=10, padx=10)
 
 frame_status = tk.Frame(frame_chart)
 frame_status.pack(side=tk.TOP, fill=tk.X)
-for key in ["position", "totalMarginBalance", "availableBalance", "var_value", "unrealisedPnL", "realisedPnL"]:
+for key in ["position", "totalMarginBalance", "availableBalance", "var_value", "es_value", "unrealisedPnL", "realisedPnL"]:
     lbl = tk.Label(frame_status, text=f"{key}: 0.000", font=("Arial", 10))
     lbl.pack(side=tk.LEFT, padx=10)
     status_labels[key] = lbl
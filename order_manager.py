@@ -7,6 +7,12 @@ from pathlib import Path
 from asyncio import Lock
 from OrderGateWay import *
 from DataRetriever import *
+from OrderStore import COLUMNS, OrderStore
+from OrderJournal import OrderJournal
+from LatencyTracer import tracer
+from StructuredLogger import get_logger
+
+logger = get_logger(__name__)
 
 class OrderTracker:
     def __init__(self, gateway: BinanceOrderGateway, MARKETDATA: BinanceTestnetDataCollector, csv_path: str='OrderHistory/orders.csv'):
@@ -15,97 +21,133 @@ class OrderTracker:
         self.gateway=gateway
         self.MARKETDATA=MARKETDATA
         self.lock = Lock()
-        self.order_tracker = pd.DataFrame(columns=[
-            "orderId", "symbol", "side", "positionSide", "type", "status",
-            "origQty", "executedQty", "price", "avgPrice",
-            "realizedPnl", "updateTime", "order_date"
-            ])
+        self.store = OrderStore()
+        self.journal = OrderJournal(self.csv_path)  # orders.csv is the compacted snapshot
+        self.journal_flush_interval = 1  # seconds; a crash loses at most this much order history
         self.pre_qty = self.MARKETDATA.positions or 0.0
         self.pre_price = self.MARKETDATA.entryPrice or 0.0
+        self.reconcile_interval = 60  # seconds between REST status polls while the user data stream is live
+        self._last_reconcile = 0.0
+
+    @property
+    def order_tracker(self):
+        """DataFrame view of the store, built on demand (risk PnL, CSV export)."""
+        return self.store.to_frame()
 
     async def start(self):
         # Load existing data or initialize file with header
-        if self.csv_path.exists():
+        if self.csv_path.exists() or self.journal.journal_path.exists():
             await self.read_from_csv("today_open_only")
         else:
-            self.order_tracker.to_csv(self.csv_path, index=False)
+            self.store.to_frame().to_csv(self.csv_path, index=False)
 
         asyncio.create_task(self._update_orders_loop())
+        asyncio.create_task(self._journal_flush_loop())
         asyncio.create_task(self._end_of_day_scheduler())
-        print("order tracker start")
+        logger.info("order tracker start")
 
     async def append_order(self, order_dict):
         async with self.lock:
-            # 1. Derive order_date from timestamp
-            timestamp_ms = order_dict.get("time") or order_dict.get("updateTime")
-            if timestamp_ms:
-                order_datetime = datetime.fromtimestamp(int(timestamp_ms) / 1000)
-                order_dict["order_date"] = order_datetime.date()
-            else:
-                order_dict["order_date"] = date.today()
+            self._append_unlocked(order_dict)
 
-            # 2. Remove any existing entry with same orderId (if present)
-            if "orderId" in order_dict:
-                self.order_tracker = self.order_tracker[self.order_tracker["orderId"] != order_dict["orderId"]]
+    async def apply_order_update(self, order_dict, realized_pnl=0.0):
+        """ORDER_TRADE_UPDATE from the user data stream, mapped to REST field names.
 
-            # 3. (Optional) Validate required fields
-            # required_fields = set(self.order_tracker.columns) - {"order_date"}
-            # if not required_fields.issubset(order_dict):
-            #     raise ValueError(f"Missing required fields: {required_fields - set(order_dict)}")
-
-            # 4. Create row from known schema
-            row = pd.DataFrame([{col: order_dict.get(col, None) for col in self.order_tracker.columns}])
+        realized_pnl is the exchange-reported profit of this trade and is added to the order's total.
+        """
+        async with self.lock:
+            previous = self.store.get(order_dict["orderId"])
+            prev_pnl = (previous.realizedPnl or 0.0) if previous is not None else 0.0
+            order_dict["realizedPnl"] = round(float(prev_pnl) + float(realized_pnl or 0), 3)
+            self._append_unlocked(order_dict)
 
-            # 5. Append to tracker
-            self.order_tracker = pd.concat([self.order_tracker, row], ignore_index=True)
+    async def append_orders(self, results):
+        """Record the per-order results of a batch call; rejected entries ({"code", "msg"}) are reported and skipped."""
+        async with self.lock:
+            for result in results:
+                if result and "orderId" in result:
+                    self._append_unlocked(result)
+                else:
+                    logger.warning(f"⚠️ Batch order rejected: {result}")
+
+    def _append_unlocked(self, order_dict):
+        # 1. Derive order_date from timestamp
+        timestamp_ms = order_dict.get("time") or order_dict.get("updateTime")
+        if timestamp_ms:
+            order_datetime = datetime.fromtimestamp(int(timestamp_ms) / 1000)
+            order_dict["order_date"] = order_datetime.date()
+        else:
+            order_dict["order_date"] = date.today()
+
+        # 2. Insert or replace the entry with the same orderId
+        previous = self.store.get(order_dict.get("orderId"))
+        prev_status = previous.status if previous is not None else None
+        record = self.store.put(order_dict)
+        self.journal.record(record.to_dict())
+        self._trace_fill(record, prev_status)
+
+    @staticmethod
+    def _trace_fill(record, prev_status):
+        """Latency of seeing a fill: gateway ack -> here, and exchange fill time -> here."""
+        if record.status != "FILLED" or prev_status == "FILLED" or record.orderId is None:
+            return
+        tracer.end("tracker.ack_to_fill", ("fill", int(record.orderId)))
+        if record.updateTime:
+            tracer.record("tracker.fill_detect", (time.time() * 1000 - record.updateTime) * 1_000_000)
 
 
     async def get_order_tracker_dict(self):
         async with self.lock:
-            return self.order_tracker.to_dict(orient="records")
+            return [record.to_dict() for record in self.store]
 
     async def _update_orders_loop(self):
         while True:
             await asyncio.sleep(5)
 
             if not self.gateway:
-                print("❌ No gateway available for updating orders.")
+                logger.error("❌ No gateway available for updating orders.")
+                continue
+
+            # Fills arrive over the user data stream; REST polling is only a reconciliation
+            if getattr(self.MARKETDATA, "user_stream_active", False) and \
+                    time.monotonic() - self._last_reconcile < self.reconcile_interval:
                 continue
+            self._last_reconcile = time.monotonic()
 
             async with self.lock:
-                active_status = ["NEW", "PARTIALLY_FILLED"]
-                active_mask = self.order_tracker["status"].isin(active_status)
-                active_orders = self.order_tracker[active_mask]
+                active_orders = self.store.with_status("NEW", "PARTIALLY_FILLED")
 
-                if active_orders.empty:
+                if not active_orders:
                     continue  # ✅ Skip this round if no active orders
 
-                print(f"🔄 Updating {len(active_orders)} active orders...")
+                logger.info(f"🔄 Updating {len(active_orders)} active orders...")
 
                 # ✅ Snapshot current pre-position info
                 pre_qty = self.pre_qty
                 pre_price = self.pre_price
 
-                for idx, row in active_orders.iterrows():
-                    order_id = row["orderId"]
+                for record in active_orders:
+                    order_id = record.orderId
 
                     try:
                         details = await self.gateway.get_order_status(order_id=int(order_id))
                         if details:
 
-                            prev_status = row["status"]
-                            prev_exec_qty = float(row.get("executedQty", 0))
+                            prev_status = record.status
+                            prev_exec_qty = float(record.executedQty or 0)
+                            side = record.side
 
                             # Update only fields present in both gateway result and local columns
-                            for col in self.order_tracker.columns:
-                                if col in details:
-                                    self.order_tracker.at[idx, col] = self._safe_cast(col, details[col])
+                            fields = {col: details[col] for col in COLUMNS if col in details}
 
                             # Also update "order_date" from updateTime if available
                             update_time = details.get("updateTime") or details.get("time")
                             if update_time:
                                 dt = datetime.fromtimestamp(int(update_time) / 1000)
-                                self.order_tracker.at[idx, "order_date"] = dt.date()
+                                fields["order_date"] = dt.date()
+                            updated = self.store.update(order_id, fields)
+                            self.journal.record(updated.to_dict())
+                            self._trace_fill(updated, prev_status)
 
                             # ✅ Compute realized PnL if transitioned to filled/cancelled or partially filled
                             new_status = details.get("status")
@@ -116,9 +158,9 @@ class OrderTracker:
                             if prev_status in ["NEW", "PARTIALLY_FILLED"] and new_status in ["FILLED", "CANCELED", "PARTIALLY_FILLED"] and exec_qty > prev_exec_qty:
                                 delta_qty = exec_qty - prev_exec_qty
 
-                                if row["side"] == "SELL":
+                                if side == "SELL":
                                     side_factor = 1
-                                elif row["side"] == "BUY":
+                                elif side == "BUY":
                                     side_factor = -1
                                 else:
                                     side_factor = 0
@@ -127,68 +169,63 @@ class OrderTracker:
                                 open_qty = max(0, delta_qty - abs(pre_qty))
                                 pnl = (price - pre_price) * closing_qty * side_factor
 
-                                self.order_tracker.at[idx, "realizedPnl"] = round(pnl, 3)
+                                self.journal.record(self.store.update(order_id, {"realizedPnl": round(pnl, 3)}).to_dict())
 
                     except Exception as e:
-                        print(f"❌ Failed to update order {order_id}: {e}")
+                        logger.error(f"❌ Failed to update order {order_id}: {e}")
 
                 self.pre_qty = self.MARKETDATA.positions or 0.0
                 self.pre_price = self.MARKETDATA.entryPrice or 0.0
 
 
     async def write_to_csv(self):
-        print("writing to csv - order manager")
+        """Make every recorded order change durable; appends to the journal instead of rewriting orders.csv."""
+        logger.debug("writing to csv - order manager")
         async with self.lock:
-            new_data = self.order_tracker.copy()
-            if self.csv_path.exists():
-                existing = pd.read_csv(self.csv_path)
-                combined = pd.concat([existing, new_data], ignore_index=True)
-                combined.drop_duplicates(subset=["orderId"], keep="last", inplace=True)
-            else:
-                combined = new_data
-            combined.to_csv(self.csv_path, index=False)
+            self._flush_journal()
+
+    def _flush_journal(self):
+        self.journal.flush()
+        if self.journal.compaction_due:
+            self.journal.compact()
 
     async def read_from_csv(self, mode="today_open_only"):
-        if not self.csv_path.exists():
+        df = self.journal.load()  # snapshot + journal tail
+        if df.empty:
             return
-        df = pd.read_csv(self.csv_path)
         df["order_date"] = pd.to_datetime(df["order_date"]).dt.date
         today = date.today()
         if mode == "today_open_only":
             open_status = ["NEW", "PARTIALLY_FILLED"]
             mask = (df["order_date"] == today) | (df["status"].isin(open_status))
             async with self.lock:
-                self.order_tracker = df[mask].copy()
+                self.store = OrderStore.from_frame(df[mask])
         else:
             async with self.lock:
-                self.order_tracker = df.copy()
+                self.store = OrderStore.from_frame(df)
 
     async def end_of_day_save(self):
         async with self.lock:
             today = date.today()
-            order_dates = pd.to_datetime(self.order_tracker["order_date"]).dt.date
-
-            # Step 1: Filter all prior-day orders (open or closed)
-            prior_day_mask = order_dates < today
-            prior_day_orders = self.order_tracker[prior_day_mask]
-
-            # Step 2: Save all prior-day orders to CSV
-            if not prior_day_orders.empty:
-                await self._save_to_csv(prior_day_orders)
-
-            # Step 3: Remove only prior-day closed orders from memory
-            closed_status = ~self.order_tracker["status"].isin(["NEW", "PARTIALLY_FILLED"])
-            remove_mask = prior_day_mask & closed_status
-            self.order_tracker = self.order_tracker[~remove_mask]
-
-    async def _save_to_csv(self, orders_df):
-        if self.csv_path.exists():
-            existing = pd.read_csv(self.csv_path)
-            combined = pd.concat([existing, orders_df], ignore_index=True)
-            combined.drop_duplicates(subset=["orderId"], keep="last", inplace=True)
-        else:
-            combined = orders_df.copy()
-        combined.to_csv(self.csv_path, index=False)
+
+            # Step 1: Fold the day's journal into the orders.csv snapshot
+            self.journal.compact()
+
+            # Step 2: Remove only prior-day closed orders from memory (they are in the snapshot now)
+            for record in self.store:
+                if record.order_date is None or record.status in ("NEW", "PARTIALLY_FILLED"):
+                    continue
+                if pd.to_datetime(record.order_date).date() < today:
+                    self.store.remove(record.orderId)
+
+    async def _journal_flush_loop(self):
+        while True:
+            await asyncio.sleep(self.journal_flush_interval)
+            try:
+                async with self.lock:
+                    self._flush_journal()
+            except Exception as e:
+                logger.error(f"❌ Order journal flush failed: {e}")
 
     async def _end_of_day_scheduler(self):
         while True:
@@ -197,22 +234,6 @@ class OrderTracker:
             await asyncio.sleep((next_run - now).total_seconds())
             await self.end_of_day_save()
 
-    ## miscellaneous function to ensure data type casting fulfills
-    def _safe_cast(self, col, value):
-        dtype = self.order_tracker[col].dtype
-        try:
-            if dtype == 'float64':
-                return float(value)
-            elif dtype == 'int64':
-                return int(float(value))
-            elif 'datetime' in str(dtype):
-                return pd.to_datetime(value, unit='ms', errors='coerce')
-            else:
-                return value
-        except Exception as e:
-            print(f"⚠️ Cast failed for {col}: {value} → {dtype} | Error: {e}")
-            return value
-
 async def main():
     tracker = OrderTracker()
     await tracker.start()